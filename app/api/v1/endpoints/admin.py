@@ -0,0 +1,41 @@
+import asyncio
+import hmac
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from app.core.config import settings
+from app.services import rag_service
+
+logger = logging.getLogger(__name__)
+
+
+def _require_admin_key(x_admin_key: Optional[str] = Header(None)):
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=404, detail="Endpoints de administração desativados (defina ADMIN_API_KEY).")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Chave de administração inválida.")
+
+
+router = APIRouter(dependencies=[Depends(_require_admin_key)])
+
+
+@router.get("/index", summary="Versão do índice em uso")
+async def index_status():
+    return rag_service.get_rag_status().get("index", {})
+
+
+@router.post("/index/reload", summary="Carrega a versão ativa do índice sem reiniciar")
+async def reload_index(force: bool = False):
+    """
+    Carrega a versão apontada por CURRENT em FAISS_INDEX_PATH e troca o índice em uso
+    sem derrubar requisições. Com vários workers, só o worker que atendeu recarrega; os
+    demais trocam pelo watcher (INDEX_WATCH_INTERVAL_SECONDS). `force` recarrega mesmo
+    que a versão não tenha mudado.
+    """
+    logger.info(f"Endpoint /admin/index/reload chamado (force={force}).")
+    result = await asyncio.to_thread(rag_service.reload_index, force)
+    if result.get("error"):
+        raise HTTPException(status_code=result.get("status_code", 500), detail=result["error"])
+    return result
@@ -1,11 +1,35 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request
+from fastapi.responses import StreamingResponse
 from app.services import rag_service
-from app.models_pydantic.chat import ChatRequest, ChatResponse
+from app.models_pydantic.chat import ChatRequest, ChatResponse, BatchChatRequest, BatchChatResponse
+from app.core.config import settings
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+def _raise_for_error(response_data: dict):
+    logger.error(f"Erro retornado pelo rag_service: {response_data['error']}")
+    # Sobrecarga: o cliente deve tentar de novo depois do intervalo indicado
+    if response_data.get("retry_after") is not None:
+        raise HTTPException(
+            status_code=503,
+            detail=response_data["error"],
+            headers={"Retry-After": str(response_data["retry_after"])},
+        )
+    # Status definido pelo próprio serviço (ex.: 404 quando o filtro de autor/livro não casa com nada)
+    if response_data.get("status_code"):
+        raise HTTPException(status_code=response_data["status_code"], detail=response_data["error"])
+    # Em vez de 500 genérico, podemos ser mais específicos se o erro indicar
+    # Por exemplo, se o erro for "Sistema RAG não inicializado", poderia ser um 503 Service Unavailable
+    if "não inicializado" in response_data["error"]:
+         raise HTTPException(status_code=503, detail=response_data["error"])
+    raise HTTPException(status_code=500, detail=response_data["error"])
+
+def _format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @router.post("/ask/", response_model=ChatResponse, summary="Faz uma pergunta à IA")
 async def ask_question(request_body: ChatRequest = Body(..., example={"query": "Qual o segredo para uma vida plena?"})):
     """
@@ -14,16 +38,79 @@ async def ask_question(request_body: ChatRequest = Body(..., example={"query": "
     """
     if not request_body.query or not request_body.query.strip():
         raise HTTPException(status_code=400, detail="A pergunta (query) não pode ser vazia.")
-    
+
     logger.info(f"Endpoint /ask chamado com query: {request_body.query[:100]}")
-    response_data = rag_service.get_answer(request_body.query)
-    
+    response_data = await rag_service.get_answer_async(
+        request_body.query, author_filter=request_body.author_filter, book_filter=request_body.book_filter
+    )
+
+    if response_data.get("error"):
+        _raise_for_error(response_data)
+
+    return ChatResponse(**response_data)
+
+@router.post("/ask/batch", response_model=BatchChatResponse, summary="Faz várias perguntas à IA de uma vez")
+async def ask_questions_batch(request_body: BatchChatRequest = Body(..., example={"queries": [{"query": "O que é marketing?"}, {"query": "Como lançar um produto?"}]})):
+    """
+    Para jobs offline: responde uma lista de perguntas numa só chamada. Os embeddings
+    e a busca FAISS são feitos em lote e as chamadas ao LLM em paralelo. Cada item do
+    resultado traz a resposta ou o seu próprio `error`, na ordem das perguntas.
+    """
+    if not request_body.queries:
+        raise HTTPException(status_code=400, detail="A lista de perguntas (queries) não pode ser vazia.")
+    if len(request_body.queries) > settings.RAG_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo de {settings.RAG_BATCH_MAX_QUERIES} perguntas por lote; recebidas {len(request_body.queries)}.",
+        )
+    empty = [i for i, item in enumerate(request_body.queries) if not item.query or not item.query.strip()]
+    if empty:
+        raise HTTPException(status_code=400, detail=f"Perguntas vazias nas posições {empty}.")
+
+    logger.info(f"Endpoint /ask/batch chamado com {len(request_body.queries)} perguntas")
+    response_data = await rag_service.get_answers_batch([item.model_dump() for item in request_body.queries])
+
     if response_data.get("error"):
-        logger.error(f"Erro retornado pelo rag_service: {response_data['error']}")
-        # Em vez de 500 genérico, podemos ser mais específicos se o erro indicar
-        # Por exemplo, se o erro for "Sistema RAG não inicializado", poderia ser um 503 Service Unavailable
-        if "não inicializado" in response_data["error"]:
-             raise HTTPException(status_code=503, detail=response_data["error"])
-        raise HTTPException(status_code=500, detail=response_data["error"])
-            
-    return ChatResponse(**response_data)
\ No newline at end of file
+        _raise_for_error(response_data)
+
+    return BatchChatResponse(**response_data)
+
+@router.post("/ask/stream", summary="Faz uma pergunta à IA com resposta em streaming (SSE)")
+async def ask_question_stream(request: Request, request_body: ChatRequest = Body(..., example={"query": "Qual o segredo para uma vida plena?"})):
+    """
+    Igual a /ask/, mas responde em Server-Sent Events: o evento `sources` traz os
+    documentos fonte, cada evento `token` traz um trecho da resposta assim que o LLM
+    o produz, e `done` encerra o stream. Erros no meio do stream chegam como `error`.
+    """
+    if not request_body.query or not request_body.query.strip():
+        raise HTTPException(status_code=400, detail="A pergunta (query) não pode ser vazia.")
+
+    logger.info(f"Endpoint /ask/stream chamado com query: {request_body.query[:100]}")
+    events = rag_service.stream_answer(
+        request_body.query, author_filter=request_body.author_filter, book_filter=request_body.book_filter
+    )
+
+    # O primeiro evento é consumido antes de abrir o stream para que erros de
+    # inicialização/sobrecarga ainda possam virar um status HTTP adequado.
+    first_event, first_data = await events.__anext__()
+    if first_event == "error":
+        await events.aclose()
+        _raise_for_error(first_data)
+
+    async def event_source():
+        try:
+            yield _format_sse(first_event, first_data)
+            async for event, data in events:
+                if await request.is_disconnected():
+                    logger.info("Cliente desconectou durante o stream; cancelando chamada ao LLM.")
+                    break
+                yield _format_sse(event, data)
+        finally:
+            # Fecha o gerador do rag_service (e com ele o astream do LLM)
+            await events.aclose()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
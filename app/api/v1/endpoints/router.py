@@ -1,5 +1,6 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import chat
+from app.api.v1.endpoints import admin, chat
 
 api_router = APIRouter()
 api_router.include_router(chat.router, prefix="/chat", tags=["Chat RAG"]) # Tag alterada
+api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
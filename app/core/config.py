@@ -3,10 +3,72 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     OPENROUTER_API_KEY: str = ""
     EMBEDDING_MODEL_NAME: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+    # Se o manifest.json do índice indicar outro modelo: "auto" usa o modelo do índice, "refuse" não carrega o índice
+    EMBEDDING_MODEL_MISMATCH_POLICY: str = "auto"
+    # Backend do SentenceTransformer para o embedding das perguntas: "torch", "onnx" ou "openvino"
+    # (onnx/openvino precisam de: pip install "sentence-transformers[onnx]" / "[openvino]")
+    EMBEDDING_BACKEND: str = "torch"
+    # Arquivo do modelo exportado dentro do repositório do modelo, ex.: "onnx/model_qint8_avx512_vnni.onnx" (int8)
+    EMBEDDING_MODEL_FILE: str = ""
     LLM_MODEL_NAME: str = "deepseek/deepseek-r1:free" # Comece com um modelo confiável
+    LLM_FALLBACK_MODELS: str = "" # Modelos tentados em ordem quando o principal falha (separados por vírgula)
+    LLM_BASE_URL: str = "https://openrouter.ai/api/v1" # API compatível com OpenAI
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 60.0 # Tempo máximo de cada chamada ao LLM
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_TOTAL_TIMEOUT_SECONDS: float = 120.0 # Prazo de uma resposta somando retentativas e modelos de reserva (no streaming, até o 1º trecho; 0 = sem prazo)
+    LLM_MAX_CONNECTIONS: int = 100 # Pool HTTP compartilhado por todos os modelos (por worker)
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_MAX_RETRIES: int = 2 # Retentativas por modelo em 429/5xx/timeout, com backoff exponencial e jitter
+    LLM_RETRY_BACKOFF_SECONDS: float = 0.5 # Base do backoff
+    LLM_RETRY_MAX_BACKOFF_SECONDS: float = 4.0 # Teto de cada espera
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5 # Falhas seguidas que abrem o circuito do modelo
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0 # Tempo com o circuito aberto antes de testar o modelo de novo
     FAISS_INDEX_PATH: str = "faiss_index_multi_author"
+    FAISS_MMAP: bool = True # Abre o index.faiss via mmap (somente leitura), compartilhado entre workers
+    # Parâmetros de busca dos índices aproximados (ignorados pelo índice Flat)
+    FAISS_NPROBE: int = 16 # IVF: listas visitadas por busca
+    FAISS_EF_SEARCH: int = 64 # HNSW: tamanho da fila de candidatos na busca
+
+    # Busca híbrida: candidatos da busca vetorial e da BM25 fundidos por reciprocal rank fusion
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 20 # Candidatos de cada lado antes da fusão
+    RRF_K: int = 60 # Constante do RRF: pontuação = soma de 1 / (RRF_K + posição)
+    # Montagem do contexto enviado ao LLM
+    CONTEXT_MAX_TOKENS: int = 2000 # Orçamento de tokens dos trechos no prompt
+    CONTEXT_MMR_ENABLED: bool = True # Diversifica os trechos (maximal marginal relevance)
+    CONTEXT_MMR_FETCH_K: int = 10 # Candidatos considerados pelo MMR antes de escolher os k trechos
+    CONTEXT_MMR_LAMBDA: float = 0.7 # 1 = só relevância, 0 = só diversidade
+    TOKENIZER_ENCODING: str = "cl100k_base" # Codificação do tiktoken usada na contagem de tokens
     ALLOWED_ORIGINS: str = "http://localhost:3000"
 
+    # Concorrência do pipeline RAG (por worker do uvicorn)
+    RAG_MAX_CONCURRENT_REQUESTS: int = 8 # Requisições processadas ao mesmo tempo
+    RAG_MAX_QUEUED_REQUESTS: int = 32 # Requisições aguardando vaga; além disso responde 503
+    RAG_QUEUE_TIMEOUT_SECONDS: float = 15.0 # Espera máxima na fila antes do 503
+    RAG_RETRY_AFTER_SECONDS: int = 5 # Valor do cabeçalho Retry-After nas respostas 503
+    RAG_RETRIEVAL_WORKERS: int = 4 # Threads para embedding da query e busca FAISS
+    RAG_BATCH_MAX_QUERIES: int = 64 # Perguntas aceitas por chamada a /ask/batch
+    RAG_BATCH_LLM_CONCURRENCY: int = 4 # Chamadas ao LLM em paralelo dentro de um lote
+
+    # Inicialização: modelo e índice carregam em segundo plano depois que a porta abre
+    RAG_INIT_IN_BACKGROUND: bool = True # False: o startup espera a inicialização terminar
+    RAG_WARMUP_ENABLED: bool = True # Pergunta de aquecimento (sem LLM) antes de marcar como pronto
+    RAG_WARMUP_QUERY: str = "Qual o segredo para uma vida plena?"
+
+    # Troca do índice sem reinício: verifica a versão ativa em FAISS_INDEX_PATH (arquivo CURRENT) a cada N s; 0 desliga
+    INDEX_WATCH_INTERVAL_SECONDS: float = 30.0
+    # Chave exigida no cabeçalho X-Admin-Key pelos endpoints /api/v1/admin; vazia desativa esses endpoints
+    ADMIN_API_KEY: str = ""
+
+    # Inclui o bloco `timings` (ms por etapa) nas respostas; as métricas do /metrics independem disso
+    RAG_DEBUG_TIMINGS: bool = False
+
+    # Cache de respostas (exato + semântico)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024 # Acima disso remove a entrada menos usada (LRU)
+    ANSWER_CACHE_TTL_SECONDS: float = 3600.0
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95 # Cosseno mínimo para reaproveitar a resposta de uma pergunta parecida
+
     # Para carregar do arquivo .env
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', extra='ignore')
 
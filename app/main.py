@@ -1,11 +1,13 @@
 # app/main.py
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware  # Middleware CORS
 from contextlib import asynccontextmanager
 from app.api.v1.endpoints.router import api_router
-from app.services.rag_service import initialize_rag_components
+from app.services import rag_service
 from app.core.config import settings
+from app.services.metrics import render_metrics
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -19,14 +21,19 @@ async def lifespan(app: FastAPI):
     logger.info(f"Modelo LLM: {settings.LLM_MODEL_NAME}")
     logger.info(f"Caminho do Índice FAISS: {settings.FAISS_INDEX_PATH}")
     
-    try:
-        initialize_rag_components()
-        logger.info("Inicialização dos componentes RAG solicitada. Verifique os logs do rag_service para o status detalhado.")
-    except Exception as e:
-        logger.critical(f"Falha catastrófica durante a inicialização dos componentes RAG: {e}", exc_info=True)
-    
+    # Modelo, índice e LLM carregam numa thread: a porta abre logo e /health/ready
+    # indica quando o pod pode receber tráfego.
+    init_task = rag_service.start_background_initialization()
+    if not settings.RAG_INIT_IN_BACKGROUND:
+        await init_task
+    logger.info("Inicialização dos componentes RAG iniciada. Acompanhe em /health/ready.")
+
     yield
     logger.info("Aplicação encerrando...")
+    if not init_task.done():
+        # A thread não pode ser interrompida; só deixamos de esperar por ela
+        init_task.cancel()
+    await rag_service.shutdown_rag_components()
 
 app = FastAPI(
     title="IA Multi-Autor RAG API",
@@ -55,6 +62,21 @@ app.include_router(api_router, prefix="/api/v1")
 async def root():
     return {
         "message": "Bem-vindo à API da IA Multi-Autor!",
-        "rag_status": "Inicialização tentada. Verifique os logs do rag_service ou teste o endpoint /api/v1/chat/ask.", # Ajuste o endpoint de teste
+        "rag_status": rag_service.get_rag_status()["state"],
         "docs_url": "/docs"
     }
+
+@app.get("/health/live", tags=["Health"], summary="Liveness: o processo está respondendo")
+async def health_live():
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["Health"], summary="Readiness: modelo, índice e LLM prontos")
+async def health_ready():
+    """200 quando a inicialização (e o aquecimento) terminou; 503 enquanto carrega ou se falhou."""
+    status = rag_service.get_rag_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/metrics", tags=["Root"], summary="Métricas no formato do Prometheus", include_in_schema=False)
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
@@ -3,8 +3,9 @@ from typing import List, Optional, Dict, Any  # Any é usado para permitir difer
 
 class ChatRequest(BaseModel):
     query: str
-    # Opcional: Adicionar um campo para o usuário especificar um autor, se quisermos essa funcionalidade no futuro
-    # author_filter: Optional[str] = None 
+    # Restringem a busca aos trechos de um autor e/ou livro (comparação sem diferenciar maiúsculas)
+    author_filter: Optional[str] = None
+    book_filter: Optional[str] = None
 
 class SourceDocument(BaseModel):
     content: str
@@ -12,7 +13,21 @@ class SourceDocument(BaseModel):
     author: Optional[str] = None
     book_title: Optional[str] = None
 
+class TokenUsage(BaseModel):
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
 class ChatResponse(BaseModel):
     answer: Optional[str] = None
     source_documents: List[SourceDocument] = Field(default_factory=list)
+    usage: Optional[TokenUsage] = None # Ausente quando a resposta vem do cache
+    timings: Optional[Dict[str, float]] = None # ms por etapa; só com RAG_DEBUG_TIMINGS
     error: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    queries: List[ChatRequest]
+
+class BatchChatResponse(BaseModel):
+    results: List[ChatResponse] # Mesma ordem de `queries`; itens com falha trazem `error`
+    timings: Optional[Dict[str, float]] = None # ms por etapa do lote inteiro; só com RAG_DEBUG_TIMINGS
@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza a pergunta para o cache exato: caixa, acentos compostos, pontuação e espaços."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def query_hash(query: str, scope: str = "") -> str:
+    """scope separa respostas da mesma pergunta em contextos diferentes (ex.: filtro por autor)."""
+    return hashlib.sha256(f"{scope}\0{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+
+class _CacheEntry:
+    __slots__ = ("value", "created_at", "vector_id")
+
+    def __init__(self, value, created_at: float, vector_id: Optional[int]):
+        self.value = value
+        self.created_at = created_at
+        self.vector_id = vector_id
+
+
+class SemanticAnswerCache:
+    """
+    Cache de respostas do RAG com dois níveis:
+
+    - exato: hash da pergunta normalizada;
+    - semântico: busca do embedding da pergunta (o mesmo usado na recuperação)
+      num índice FAISS auxiliar de produto interno; vale como acerto quando a
+      similaridade de cosseno é >= `similarity_threshold`.
+
+    As entradas expiram após `ttl_seconds` e, acima de `max_entries`, a menos
+    usada recentemente é removida (LRU) dos dois níveis.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._vector_keys = {}
+        self._vector_index = None
+        self._next_vector_id = 0
+        # Toda consulta passa primeiro pelo nível exato; o semântico só vê os misses dele
+        self.exact_hits = 0
+        self.exact_misses = 0
+        self.semantic_hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._clear_locked()
+            self.invalidations += 1
+
+    def get_exact(self, query: str, scope: str = ""):
+        with self._lock:
+            entry = self._get_live_entry(query_hash(query, scope))
+            if entry is None:
+                self.exact_misses += 1
+                return None
+            self.exact_hits += 1
+            return entry.value
+
+    def get_similar(self, embedding: Sequence[float]):
+        """Busca semântica, para uma pergunta que já falhou em get_exact (o miss foi contado lá)."""
+        with self._lock:
+            if self._vector_index is not None and self._vector_index.ntotal > 0:
+                scores, ids = self._vector_index.search(self._as_unit_vector(embedding), 1)
+                if ids[0][0] != -1 and scores[0][0] >= self.similarity_threshold:
+                    key = self._vector_keys.get(int(ids[0][0]))
+                    entry = self._get_live_entry(key) if key else None
+                    if entry is not None:
+                        self.semantic_hits += 1
+                        return entry.value
+            return None
+
+    def put(self, query: str, embedding: Optional[Sequence[float]], value, scope: str = "") -> None:
+        """Sem embedding, a entrada só é encontrada por get_exact (o índice semântico não tem escopo)."""
+        key = query_hash(query, scope)
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            vector_id = None
+            if embedding is not None:
+                vector = self._as_unit_vector(embedding)
+                if self._vector_index is None:
+                    self._vector_index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                vector_id = self._next_vector_id
+                self._next_vector_id += 1
+                self._vector_index.add_with_ids(vector, np.array([vector_id], dtype=np.int64))
+                self._vector_keys[vector_id] = key
+            self._entries[key] = _CacheEntry(value, time.monotonic(), vector_id)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove_locked(oldest_key)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """misses: consultas que nenhum dos dois níveis respondeu; hit_rate: acertos / consultas."""
+        with self._lock:
+            lookups = self.exact_hits + self.exact_misses
+            return {
+                "entries": len(self._entries),
+                "lookups": lookups,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.exact_misses - self.semantic_hits,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    # --- internos (chamar com o lock adquirido) ---
+
+    def _get_live_entry(self, key: str) -> Optional[_CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove_locked(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.vector_id is not None:
+            self._vector_index.remove_ids(np.array([entry.vector_id], dtype=np.int64))
+            self._vector_keys.pop(entry.vector_id, None)
+
+    def _clear_locked(self) -> None:
+        self._entries.clear()
+        self._vector_keys.clear()
+        self._vector_index = None
+
+    @staticmethod
+    def _as_unit_vector(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1).copy()
+        faiss.normalize_L2(vector)
+        return vector
@@ -0,0 +1,157 @@
+import json
+import mmap
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Arquivos do chunk store, ao lado do index.faiss. A linha i do índice FAISS é o chunk i.
+TEXT_FILENAME = "chunks.bin" # textos dos chunks concatenados em UTF-8
+OFFSETS_FILENAME = "chunks.offsets.npy" # int64[n + 1]: início de cada chunk no chunks.bin
+META_FILENAME = "chunks.meta.npy" # int32[n, 4]: autor, título, PDF de origem (índices nas tabelas) e página
+TABLES_FILENAME = "chunks.json" # tabelas de autores/títulos/PDFs
+
+CHUNK_STORE_FILES = (TEXT_FILENAME, OFFSETS_FILENAME, META_FILENAME, TABLES_FILENAME)
+CHUNK_STORE_FORMAT_VERSION = 1
+
+_AUTHOR, _BOOK_TITLE, _SOURCE, _PAGE = range(4)
+_MISSING = -1
+
+
+def chunk_store_exists(index_path: str) -> bool:
+    return all(os.path.exists(os.path.join(index_path, filename)) for filename in CHUNK_STORE_FILES)
+
+
+class ChunkStore:
+    """
+    Docstore somente leitura, mapeado em memória. Nada é desserializado na carga:
+    o texto e os metadados (author, book_title, page) de um chunk só são lidos
+    quando ele é pedido, e as páginas do arquivo ficam no page cache do sistema,
+    compartilhadas entre os workers.
+    """
+
+    def __init__(self, index_path: str):
+        with open(os.path.join(index_path, TABLES_FILENAME), "r", encoding="utf-8") as f:
+            tables = json.load(f)
+        if tables.get("format_version") != CHUNK_STORE_FORMAT_VERSION:
+            raise ValueError(f"Versão de chunk store não suportada: {tables.get('format_version')}.")
+        self._authors = tables["authors"]
+        self._book_titles = tables["book_titles"]
+        self._sources = tables["sources"]
+        self._offsets = np.load(os.path.join(index_path, OFFSETS_FILENAME), mmap_mode="r")
+        self._meta = np.load(os.path.join(index_path, META_FILENAME), mmap_mode="r")
+        self._rows_by_value = {} # (coluna, valor) -> linhas; preenchido no primeiro filtro
+
+        text_path = os.path.join(index_path, TEXT_FILENAME)
+        self._text_file = open(text_path, "rb")
+        if os.path.getsize(text_path) > 0:
+            self._text = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._text = b"" # mmap não aceita arquivos vazios
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def text(self, row: int) -> str:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return self._text[start:end].decode("utf-8")
+
+    def metadata(self, row: int) -> dict:
+        author, book_title, source, page = (int(value) for value in self._meta[row])
+        return {
+            "author": self._authors[author] if author != _MISSING else None,
+            "book_title": self._book_titles[book_title] if book_title != _MISSING else None,
+            "source_pdf": self._sources[source] if source != _MISSING else None,
+            "page": page if page != _MISSING else None,
+        }
+
+    def source(self, row: int) -> Optional[str]:
+        source = int(self._meta[row, _SOURCE])
+        return self._sources[source] if source != _MISSING else None
+
+    def authors(self) -> List[str]:
+        return list(self._authors)
+
+    def book_titles(self) -> List[str]:
+        return list(self._book_titles)
+
+    def filter_rows(self, author: Optional[str] = None, book_title: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        Linhas (ordenadas) dos chunks do autor e/ou livro, sem diferenciar maiúsculas.
+        None quando não há filtro; array vazio quando nenhum chunk corresponde.
+        Os conjuntos de cada autor/livro são calculados uma vez e reaproveitados.
+        """
+        rows = None
+        for column, table, value in ((_AUTHOR, self._authors, author), (_BOOK_TITLE, self._book_titles, book_title)):
+            if value is None:
+                continue
+            value_rows = self._rows_for_value(column, table, value)
+            rows = value_rows if rows is None else np.intersect1d(rows, value_rows, assume_unique=True)
+        return rows
+
+    def _rows_for_value(self, column: int, table: List[str], value: str) -> np.ndarray:
+        key = (column, value.casefold())
+        rows = self._rows_by_value.get(key)
+        if rows is None:
+            table_ids = [table_id for table_id, name in enumerate(table) if name.casefold() == key[1]]
+            rows = np.flatnonzero(np.isin(self._meta[:, column], table_ids)).astype(np.int64)
+            self._rows_by_value[key] = rows
+        return rows
+
+    def get_document(self, row: int) -> Document:
+        metadata = self.metadata(row)
+        metadata["chunk_row"] = row
+        return Document(page_content=self.text(row), metadata=metadata)
+
+    def get_documents(self, rows: Sequence[int]) -> List[Document]:
+        return [self.get_document(int(row)) for row in rows]
+
+    def close(self) -> None:
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._text_file.close()
+
+    @staticmethod
+    def write(index_path: str, texts: Sequence[str], metadatas: Sequence[dict]) -> None:
+        """Grava o chunk store (cada arquivo via temporário + rename). metadatas[i] usa author/book_title/source_pdf/page."""
+        tables = {"authors": [], "book_titles": [], "sources": []}
+        lookups = {name: {} for name in tables}
+
+        def table_index(table: str, value) -> int:
+            if value is None:
+                return _MISSING
+            lookup = lookups[table]
+            if value not in lookup:
+                lookup[value] = len(tables[table])
+                tables[table].append(value)
+            return lookup[value]
+
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        meta = np.full((len(texts), 4), _MISSING, dtype=np.int32)
+        os.makedirs(index_path, exist_ok=True)
+        text_tmp = os.path.join(index_path, TEXT_FILENAME + ".tmp")
+        with open(text_tmp, "wb") as f:
+            for row, (text, metadata) in enumerate(zip(texts, metadatas)):
+                encoded = text.encode("utf-8")
+                f.write(encoded)
+                offsets[row + 1] = offsets[row] + len(encoded)
+                meta[row, _AUTHOR] = table_index("authors", metadata.get("author"))
+                meta[row, _BOOK_TITLE] = table_index("book_titles", metadata.get("book_title"))
+                meta[row, _SOURCE] = table_index("sources", metadata.get("source_pdf"))
+                page = metadata.get("page")
+                meta[row, _PAGE] = int(page) if page is not None else _MISSING
+
+        offsets_tmp = os.path.join(index_path, OFFSETS_FILENAME + ".tmp")
+        meta_tmp = os.path.join(index_path, META_FILENAME + ".tmp")
+        tables_tmp = os.path.join(index_path, TABLES_FILENAME + ".tmp")
+        with open(offsets_tmp, "wb") as f:
+            np.save(f, offsets)
+        with open(meta_tmp, "wb") as f:
+            np.save(f, meta)
+        with open(tables_tmp, "w", encoding="utf-8") as f:
+            json.dump({"format_version": CHUNK_STORE_FORMAT_VERSION, **tables}, f, ensure_ascii=False)
+
+        for tmp_path, filename in ((text_tmp, TEXT_FILENAME), (offsets_tmp, OFFSETS_FILENAME),
+                                   (meta_tmp, META_FILENAME), (tables_tmp, TABLES_FILENAME)):
+            os.replace(tmp_path, os.path.join(index_path, filename))
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RAGOverloadedError(Exception):
+    """Levantada quando não há vaga nem espaço na fila para uma nova requisição."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RequestLimiter:
+    """
+    Limita o número de requisições RAG em andamento.
+
+    Até `max_concurrent` requisições rodam ao mesmo tempo; as seguintes esperam
+    numa fila de no máximo `max_queued` posições por até `queue_timeout` segundos.
+    Quando a fila está cheia (ou a espera estoura), a requisição é rejeitada com
+    RAGOverloadedError para que o endpoint responda 503 com Retry-After.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: float, retry_after: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._in_flight = 0
+        self._queued = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked() and self._queued >= self.max_queued:
+            raise RAGOverloadedError(
+                "Servidor sobrecarregado: fila de requisições cheia. Tente novamente em instantes.",
+                self.retry_after,
+            )
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise RAGOverloadedError(
+                "Servidor sobrecarregado: tempo de espera na fila esgotado. Tente novamente em instantes.",
+                self.retry_after,
+            )
+        finally:
+            self._queued -= 1
+
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+
+def create_executor(max_workers: int, name: str) -> ThreadPoolExecutor:
+    """Pool de threads limitado para as etapas de CPU (embedding e busca FAISS)."""
+    logger.info(f"Criando pool de threads '{name}' com {max_workers} workers.")
+    return ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=name)
+
+
+async def run_in_executor(executor: Optional[ThreadPoolExecutor], func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, func, *args)
@@ -0,0 +1,151 @@
+import logging
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Estimativa usada quando o tiktoken não consegue carregar a codificação (ex.: sem rede no primeiro uso)
+FALLBACK_CHARS_PER_TOKEN = 4
+# Sobreposição mínima (em caracteres) para considerar que dois chunks vizinhos se repetem
+MIN_MERGE_OVERLAP = 20
+
+
+class TokenCounter:
+    """
+    Conta tokens com o tiktoken. A codificação é carregada no primeiro uso; se falhar,
+    passa a estimar por caracteres (FALLBACK_CHARS_PER_TOKEN) e avisa uma vez.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        logger.warning(f"Não foi possível carregar a codificação '{self.encoding_name}' do tiktoken ({e}); "
+                                       f"estimando {FALLBACK_CHARS_PER_TOKEN} caracteres por token.")
+                    self._loaded = True
+        return self._encoding
+
+    @property
+    def exact(self) -> bool:
+        return self._get_encoding() is not None
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return -(-len(text) // FALLBACK_CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return text[:max_tokens * FALLBACK_CHARS_PER_TOKEN]
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def mmr_select(query_vector: Sequence[float], candidate_vectors: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Maximal marginal relevance: escolhe k candidatos equilibrando similaridade com a
+    query (peso lambda_mult) e diversidade em relação aos já escolhidos (cosseno).
+    Retorna as posições escolhidas, na ordem de escolha.
+    """
+    if len(candidate_vectors) == 0 or k <= 0:
+        return []
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
+
+
+def _overlap_length(previous: str, following: str, max_overlap: int) -> int:
+    """Tamanho do maior sufixo de `previous` que é prefixo de `following` (até max_overlap)."""
+    for length in range(min(len(previous), len(following), max_overlap), MIN_MERGE_OVERLAP - 1, -1):
+        if previous.endswith(following[:length]):
+            return length
+    return 0
+
+
+def merge_adjacent_chunks(docs: Sequence[Document], max_overlap: int) -> List[Document]:
+    """
+    Remove chunks de texto idêntico e junta chunks consecutivos (chunk_row seguido) do
+    mesmo PDF e página, cortando o trecho repetido pela sobreposição do splitter.
+    O resultado mantém a ordem de relevância do primeiro chunk de cada grupo.
+    """
+    seen_texts = set()
+    unique = []
+    for doc in docs:
+        if doc.page_content not in seen_texts:
+            seen_texts.add(doc.page_content)
+            unique.append(doc)
+
+    merged: List[Optional[Document]] = []
+    by_position = {} # (pdf, página, linha final) -> posição em merged
+    ranked = sorted(range(len(unique)), key=lambda i: unique[i].metadata.get("chunk_row", -1))
+    for i in ranked:
+        doc = unique[i]
+        row = doc.metadata.get("chunk_row")
+        key = (doc.metadata.get("source_pdf"), doc.metadata.get("page"))
+        position = by_position.pop((*key, row - 1), None) if row is not None else None
+        if position is not None:
+            previous = merged[position]
+            overlap = _overlap_length(previous.page_content, doc.page_content, max_overlap)
+            separator = "" if overlap else "\n"
+            previous.page_content = previous.page_content + separator + doc.page_content[overlap:]
+            previous.metadata["rank"] = min(previous.metadata["rank"], i)
+        else:
+            position = len(merged)
+            merged.append(Document(page_content=doc.page_content, metadata={**doc.metadata, "rank": i}))
+        if row is not None:
+            by_position[(*key, row)] = position
+
+    merged.sort(key=lambda doc: doc.metadata["rank"])
+    for doc in merged:
+        del doc.metadata["rank"]
+    return merged
+
+
+def fit_to_budget(docs: Sequence[Document], counter: TokenCounter, max_tokens: int,
+                  min_partial_tokens: int = 50) -> List[Document]:
+    """
+    Mantém os documentos (em ordem de relevância) enquanto couberem em max_tokens. O
+    primeiro que não couber é truncado se ainda sobrarem min_partial_tokens; o resto sai.
+    """
+    kept = []
+    remaining = max_tokens
+    for doc in docs:
+        tokens = counter.count(doc.page_content)
+        if tokens <= remaining:
+            kept.append(doc)
+            remaining -= tokens
+            continue
+        if remaining >= min_partial_tokens:
+            kept.append(Document(page_content=counter.truncate(doc.page_content, remaining), metadata=dict(doc.metadata)))
+        break
+    return kept
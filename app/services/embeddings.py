@@ -0,0 +1,43 @@
+"""
+Criação do modelo de embedding com o backend escolhido em EMBEDDING_BACKEND.
+
+O SentenceTransformer (>= 3.2) roda o mesmo modelo em PyTorch, ONNX Runtime ou
+OpenVINO; com ONNX, EMBEDDING_MODEL_FILE escolhe uma variante exportada, por exemplo
+os pesos quantizados em int8 ("onnx/model_qint8_avx512_vnni.onnx"). Os vetores
+continuam compatíveis com o índice construído em PyTorch (mesmo modelo e pooling),
+com diferença numérica pequena; benchmarks/embedding_backend_benchmark.py mede essa
+diferença e a latência de cada backend no nosso corpus.
+"""
+from typing import Optional
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKEND_OPENVINO = "openvino"
+EMBEDDING_BACKENDS = (BACKEND_TORCH, BACKEND_ONNX, BACKEND_OPENVINO)
+
+
+def embedding_model_kwargs(backend: str, model_file: Optional[str] = None) -> dict:
+    """model_kwargs repassados ao SentenceTransformer para o backend escolhido."""
+    backend = (backend or BACKEND_TORCH).lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND inválido: '{backend}'. Use um de: {', '.join(EMBEDDING_BACKENDS)}.")
+    if backend == BACKEND_TORCH:
+        if model_file:
+            raise ValueError("EMBEDDING_MODEL_FILE só se aplica aos backends onnx e openvino.")
+        return {}
+    kwargs = {"backend": backend}
+    if model_file:
+        kwargs["model_kwargs"] = {"file_name": model_file}
+    return kwargs
+
+
+def create_embeddings(model_name: str, normalize_embeddings: bool = False,
+                      backend: str = BACKEND_TORCH, model_file: Optional[str] = None):
+    """HuggingFaceEmbeddings com o backend escolhido (a importação pesada fica aqui dentro)."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=embedding_model_kwargs(backend, model_file),
+        encode_kwargs={"normalize_embeddings": normalize_embeddings},
+    )
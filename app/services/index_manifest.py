@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+
+# Política quando o modelo do manifesto difere de EMBEDDING_MODEL_NAME
+MISMATCH_POLICY_AUTO = "auto" # usa o modelo com que o índice foi construído
+MISMATCH_POLICY_REFUSE = "refuse" # não carrega o índice
+
+
+class IndexManifestError(Exception):
+    """Índice incompatível com a configuração (ou manifesto inválido)."""
+
+
+def manifest_path(index_path: str) -> str:
+    return os.path.join(index_path, MANIFEST_FILENAME)
+
+
+def read_manifest(index_path: str) -> Optional[dict]:
+    path = manifest_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(index_path: str, manifest: dict) -> None:
+    """Grava o manifesto de forma atômica (arquivo temporário + rename)."""
+    path = manifest_path(index_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compute_corpus_hash(files: dict) -> str:
+    """Hash do corpus: nome, hash do conteúdo, autor e título de cada PDF, em ordem."""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        entry = files[name]
+        digest.update(f"{name}\0{entry['sha256']}\0{entry['author']}\0{entry['book_title']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_manifest(embedding_model: str, dimension: int, normalize_embeddings: bool,
+                   chunk_size: int, chunk_overlap: int, files: dict, num_vectors: int,
+                   index_spec: str = "Flat") -> dict:
+    return {
+        "format_version": MANIFEST_FORMAT_VERSION,
+        "embedding_model": embedding_model,
+        "dimension": dimension,
+        "normalize_embeddings": normalize_embeddings,
+        "index_spec": index_spec,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "corpus_hash": compute_corpus_hash(files),
+        "num_vectors": num_vectors,
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "files": files,
+    }
+
+
+def read_faiss_dimension(index_file: str) -> int:
+    """Lê a dimensão dos vetores direto do cabeçalho do index.faiss (fourcc + int32), sem carregar o índice."""
+    with open(index_file, "rb") as f:
+        header = f.read(8)
+    if len(header) < 8:
+        raise IndexManifestError(f"Arquivo de índice FAISS inválido: '{index_file}'.")
+    return struct.unpack("<i", header[4:8])[0]
+
+
+def resolve_embedding_model(index_path: str, index_file: str, configured_model: str, policy: str):
+    """
+    Valida o manifesto do índice antes de carregar o modelo de embedding.
+    Retorna (nome_do_modelo_a_carregar, manifesto). Sem manifesto (índice antigo),
+    mantém o modelo configurado e só avisa.
+    """
+    manifest = read_manifest(index_path)
+    if manifest is None:
+        logger.warning(f"Índice em '{index_path}' não tem {MANIFEST_FILENAME}; não é possível validar o modelo de embedding.")
+        return configured_model, None
+
+    if manifest.get("format_version") != MANIFEST_FORMAT_VERSION:
+        raise IndexManifestError(f"Versão de manifesto não suportada: {manifest.get('format_version')}.")
+
+    index_dimension = read_faiss_dimension(index_file)
+    if index_dimension != manifest["dimension"]:
+        raise IndexManifestError(
+            f"Manifesto declara dimensão {manifest['dimension']}, mas o index.faiss tem dimensão {index_dimension}."
+        )
+
+    index_model = manifest["embedding_model"]
+    if index_model != configured_model:
+        if policy == MISMATCH_POLICY_REFUSE:
+            raise IndexManifestError(
+                f"O índice foi construído com '{index_model}' ({manifest['dimension']} dims), "
+                f"mas EMBEDDING_MODEL_NAME é '{configured_model}'."
+            )
+        logger.warning(
+            f"EMBEDDING_MODEL_NAME ('{configured_model}') difere do modelo do índice ('{index_model}'); "
+            f"usando '{index_model}'."
+        )
+    return index_model, manifest
@@ -0,0 +1,116 @@
+"""
+Versões do índice para troca sem reinício.
+
+Layout versionado: FAISS_INDEX_PATH contém uma pasta por versão (cada uma com o
+index.faiss, o chunk store, o BM25 e o manifest.json) e o arquivo CURRENT com o nome
+da versão ativa. Uma versão nova é construída na sua própria pasta e publicada
+trocando o CURRENT de forma atômica (arquivo temporário + rename); os workers
+percebem a troca e carregam a versão nova sem parar de responder (ver
+rag_service.reload_index).
+
+Sem CURRENT, FAISS_INDEX_PATH é o próprio índice (layout antigo, sem versões) e a
+versão é derivada de mtime/tamanho dos arquivos.
+"""
+import hashlib
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from app.services.vector_store import index_files_exist
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILENAME = "CURRENT"
+UNVERSIONED_PREFIX = "files-" # versões derivadas dos arquivos, no layout sem CURRENT
+
+
+def read_current_version(root: str) -> Optional[str]:
+    """Nome da versão ativa, ou None no layout sem versões."""
+    try:
+        with open(os.path.join(root, CURRENT_FILENAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def index_fingerprint(index_path: str) -> tuple:
+    """Identifica o conteúdo da pasta do índice (mtime + tamanho dos arquivos). Muda quando o índice é reconstruído."""
+    fingerprint = []
+    for filename in sorted(os.listdir(index_path)) if os.path.isdir(index_path) else []:
+        try:
+            stat = os.stat(os.path.join(index_path, filename))
+        except OSError:
+            continue
+        fingerprint.append((filename, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+def active_index(root: str) -> Tuple[str, str]:
+    """
+    (versão, pasta) do índice ativo. Com CURRENT, a versão é o nome da pasta; sem ele,
+    a pasta é o próprio root e a versão é um hash de mtime/tamanho dos arquivos.
+    """
+    version = read_current_version(root)
+    if version:
+        return version, os.path.join(root, version)
+    return UNVERSIONED_PREFIX + hashlib.sha1(repr(index_fingerprint(root)).encode("utf-8")).hexdigest()[:12], root
+
+
+def index_version_id(root: str) -> str:
+    return active_index(root)[0]
+
+
+def new_version_name() -> str:
+    return "v" + datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+
+
+def publish_index_version(root: str, version: str) -> None:
+    """Aponta o CURRENT para a versão (troca atômica). A pasta precisa conter um índice completo."""
+    if not index_files_exist(os.path.join(root, version)):
+        raise FileNotFoundError(f"A versão '{version}' não contém um índice completo em '{root}'.")
+    path = os.path.join(root, CURRENT_FILENAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    logger.info(f"Versão '{version}' do índice publicada em '{root}'.")
+
+
+def list_index_versions(root: str) -> List[str]:
+    """Pastas de versão com índice completo, da mais antiga para a mais nova (data de modificação da pasta)."""
+    if not os.path.isdir(root):
+        return []
+    versions = [
+        name for name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, name)) and index_files_exist(os.path.join(root, name))
+    ]
+    return sorted(versions, key=lambda name: os.path.getmtime(os.path.join(root, name)))
+
+
+def prune_index_versions(root: str, keep: int) -> List[str]:
+    """
+    Remove as versões mais antigas, mantendo as `keep` mais novas e sempre a ativa.
+    Workers que ainda não trocaram de versão continuam lendo os arquivos abertos (mmap)
+    mesmo depois de removidos; manter ao menos 2 dá margem para um rollback.
+    """
+    current = read_current_version(root)
+    versions = list_index_versions(root)
+    removed = []
+    for name in versions[:max(0, len(versions) - keep)]:
+        if name == current:
+            continue
+        shutil.rmtree(os.path.join(root, name))
+        removed.append(name)
+    return removed
+
+
+def copy_index_files(source: str, destination: str) -> None:
+    """Copia os arquivos de um índice (não as subpastas de versão) para uma pasta nova."""
+    os.makedirs(destination, exist_ok=True)
+    for name in os.listdir(source):
+        path = os.path.join(source, name)
+        if os.path.isfile(path) and name != CURRENT_FILENAME:
+            shutil.copy2(path, os.path.join(destination, name))
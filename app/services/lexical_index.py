@@ -0,0 +1,148 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Arquivos do índice lexical (BM25), ao lado do index.faiss. Postings em formato CSR:
+# os chunks do termo t são docs[offsets[t]:offsets[t + 1]], com os pesos BM25 já calculados.
+VOCAB_FILENAME = "lexical.vocab.json"
+OFFSETS_FILENAME = "lexical.offsets.npy"
+DOCS_FILENAME = "lexical.docs.npy"
+WEIGHTS_FILENAME = "lexical.weights.npy"
+LEXICAL_INDEX_FILES = (VOCAB_FILENAME, OFFSETS_FILENAME, DOCS_FILENAME, WEIGHTS_FILENAME)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+# Palavras muito frequentes (pt/en): têm idf baixo e postings enormes
+STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e ela ele eles em entre era essa esse esta este eu foi ha isso
+isto ja mais mas me mesmo muito na nao nas no nos o os ou para pela pelo por quando que se sem ser
+seu sua sao so tambem tem um uma voce
+an and are as at be but by for from has have he her his i if in into is it its me my not of on or our
+she so that the their them there they this to was we were what when which who will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sem acentos, palavras com 2+ caracteres e sem stopwords."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token for token in _TOKEN_RE.findall(text) if len(token) > 1 and token not in STOPWORDS]
+
+
+def document_tokens(text: str, metadata: Optional[dict] = None) -> List[str]:
+    """Tokens indexados de um chunk: autor e título do livro (quando houver) e o texto."""
+    fields = [metadata.get("author"), metadata.get("book_title")] if metadata else []
+    return tokenize(" ".join(field for field in fields if field)) + tokenize(text)
+
+
+def lexical_index_exists(index_path: str) -> bool:
+    return all(os.path.exists(os.path.join(index_path, filename)) for filename in LEXICAL_INDEX_FILES)
+
+
+class LexicalIndex:
+    """
+    Índice invertido BM25 em arrays numpy (mapeados em memória). A pontuação de uma
+    query é a soma dos pesos pré-calculados das postings dos seus termos, feita com
+    np.bincount: custo proporcional ao tamanho das postings, sem laço Python por chunk.
+    """
+
+    def __init__(self, index_path: str):
+        with open(os.path.join(index_path, VOCAB_FILENAME), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        self.num_docs = vocab["num_docs"]
+        self._term_ids: Dict[str, int] = {term: term_id for term_id, term in enumerate(vocab["terms"])}
+        self._offsets = np.load(os.path.join(index_path, OFFSETS_FILENAME), mmap_mode="r")
+        self._docs = np.load(os.path.join(index_path, DOCS_FILENAME), mmap_mode="r")
+        self._weights = np.load(os.path.join(index_path, WEIGHTS_FILENAME), mmap_mode="r")
+
+    def search(self, query: str, k: int, allowed_rows: np.ndarray = None):
+        """
+        Retorna (pontuações, linhas) dos k chunks com maior BM25, em ordem decrescente.
+        Com allowed_rows, só essas linhas concorrem.
+        """
+        term_ids = {self._term_ids[token] for token in tokenize(query) if token in self._term_ids}
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        docs = np.concatenate([self._docs[self._offsets[t]:self._offsets[t + 1]] for t in term_ids])
+        weights = np.concatenate([self._weights[self._offsets[t]:self._offsets[t + 1]] for t in term_ids])
+        scores = np.bincount(docs, weights=weights, minlength=self.num_docs)
+        if allowed_rows is not None:
+            candidates = allowed_rows[scores[allowed_rows] > 0]
+        else:
+            candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = np.argsort(-scores[candidates], kind="stable")
+        rows = candidates[order]
+        return scores[rows].astype(np.float32), rows.astype(np.int64)
+
+    @staticmethod
+    def build(index_path: str, texts: Sequence[str], metadatas: Optional[Sequence[dict]] = None) -> None:
+        """
+        Tokeniza os chunks (linha i = chunk i) e grava as postings com os pesos BM25.
+        Com metadatas, o autor e o título de cada chunk entram no documento: uma busca
+        pelo nome do livro ou do autor encontra os chunks dele mesmo sem a palavra no texto.
+        """
+        term_ids: Dict[str, int] = {}
+        postings_docs: List[List[int]] = []
+        postings_tfs: List[List[int]] = []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = document_tokens(text, metadatas[row] if metadatas is not None else None)
+            doc_lengths[row] = len(tokens)
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                term_id = term_ids.setdefault(token, len(term_ids))
+                if term_id == len(postings_docs):
+                    postings_docs.append([])
+                    postings_tfs.append([])
+                counts[term_id] = counts.get(term_id, 0) + 1
+            for term_id, tf in counts.items():
+                postings_docs[term_id].append(row)
+                postings_tfs[term_id].append(tf)
+
+        num_docs = len(texts)
+        avg_length = float(doc_lengths.mean()) if num_docs else 0.0
+        offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        for term_id, docs in enumerate(postings_docs):
+            offsets[term_id + 1] = offsets[term_id] + len(docs)
+        docs_array = np.zeros(int(offsets[-1]), dtype=np.int32)
+        weights_array = np.zeros(int(offsets[-1]), dtype=np.float32)
+        for term_id, (docs, tfs) in enumerate(zip(postings_docs, postings_tfs)):
+            docs = np.asarray(docs, dtype=np.int32)
+            tfs = np.asarray(tfs, dtype=np.float32)
+            idf = math.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[docs] / max(avg_length, 1e-9))
+            start, end = offsets[term_id], offsets[term_id + 1]
+            docs_array[start:end] = docs
+            weights_array[start:end] = idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+
+        terms = [None] * len(term_ids)
+        for term, term_id in term_ids.items():
+            terms[term_id] = term
+        for filename, array in ((OFFSETS_FILENAME, offsets), (DOCS_FILENAME, docs_array), (WEIGHTS_FILENAME, weights_array)):
+            tmp_path = os.path.join(index_path, filename + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(index_path, filename))
+        tmp_path = os.path.join(index_path, VOCAB_FILENAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"num_docs": num_docs, "terms": terms}, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(index_path, VOCAB_FILENAME))
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int, rrf_k: int = 60) -> List[int]:
+    """Funde listas ordenadas de linhas: pontuação = soma de 1 / (rrf_k + posição). Retorna as k melhores."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            row = int(row)
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=lambda row: scores[row], reverse=True)[:k]
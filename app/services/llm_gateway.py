@@ -0,0 +1,329 @@
+import asyncio
+import contextlib
+import logging
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+import httpx
+import openai
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+# Erros transitórios do provedor: vale tentar de novo (429, 5xx, timeout, conexão)
+_RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APITimeoutError, openai.APIConnectionError)
+
+
+class CircuitOpenError(Exception):
+    """O circuito do modelo está aberto: a chamada nem é feita, e a próxima opção da lista é usada."""
+
+
+class LLMTimeoutError(TimeoutError):
+    """O prazo total da resposta (todas as tentativas e modelos) se esgotou."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por modelo. Depois de `failure_threshold` falhas seguidas o circuito
+    abre e as chamadas falham na hora durante `reset_seconds`; então uma única chamada
+    de teste é liberada (meio-aberto): sucesso fecha o circuito, falha o reabre.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock=time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self) -> str:
+        if self._opened_at is None:
+            return CIRCUIT_CLOSED
+        if self._clock() - self._opened_at >= self.reset_seconds:
+            return CIRCUIT_HALF_OPEN
+        return CIRCUIT_OPEN
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._state_locked()
+            if state == CIRCUIT_CLOSED:
+                return True
+            if state == CIRCUIT_HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Libera a chamada de teste sem registrar resultado (cancelamento, cliente desconectou)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, _RETRYABLE_ERRORS)
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Backoff exponencial com jitter completo: uniforme entre 0 e min(max, base * 2^tentativa)."""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+
+class ResilientChatModel(Runnable):
+    """
+    Envolve um chat model com retentativas (backoff com jitter, só para erros
+    transitórios) e um circuit breaker. No streaming, só tenta de novo se nenhum
+    trecho tiver sido entregue ainda.
+    """
+
+    def __init__(self, model, model_name: str, breaker: CircuitBreaker, max_retries: int,
+                 backoff_base_seconds: float, backoff_max_seconds: float):
+        self.model = model
+        self.model_name = model_name
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+    def _before_attempt(self) -> None:
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuito aberto para o modelo '{self.model_name}'.")
+
+    def _after_failure(self, error: Exception, attempt: int, started: bool = False) -> Optional[float]:
+        """Registra a falha; retorna a espera até a próxima tentativa ou None se não há nova tentativa."""
+        if not is_retryable(error):
+            # Erro do cliente (400/401/422, prompt inválido): o modelo está de pé, o circuito não muda
+            self.breaker.release_trial()
+            logger.warning(f"Erro não transitório no modelo '{self.model_name}': {error}")
+            return None
+        self.breaker.record_failure()
+        if started or attempt >= self.max_retries:
+            logger.warning(f"Falha no modelo '{self.model_name}' (tentativa {attempt + 1}): {error}")
+            return None
+        delay = backoff_delay(attempt, self.backoff_base_seconds, self.backoff_max_seconds)
+        logger.warning(f"Falha transitória no modelo '{self.model_name}' ({error}); nova tentativa em {delay:.2f}s.")
+        return delay
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        attempt = 0
+        while True:
+            self._before_attempt()
+            try:
+                result = self.model.invoke(input, config, **kwargs)
+            except Exception as e:
+                delay = self._after_failure(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        attempt = 0
+        while True:
+            self._before_attempt()
+            try:
+                result = await self.model.ainvoke(input, config, **kwargs)
+            except Exception as e:
+                delay = self._after_failure(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # CancelledError: sem sucesso nem falha, mas a chamada de teste não pode ficar presa
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator:
+        attempt = 0
+        while True:
+            self._before_attempt()
+            started = False
+            try:
+                for chunk in self.model.stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                delay = self._after_failure(e, attempt, started)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator:
+        attempt = 0
+        while True:
+            self._before_attempt()
+            started = False
+            try:
+                async for chunk in self.model.astream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                delay = self._after_failure(e, attempt, started)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # GeneratorExit (aclose quando o cliente desconecta) ou CancelledError
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return
+
+
+class _WithDeadline(Runnable):
+    """
+    Prazo total de uma resposta do LLM, somando retentativas, esperas e modelos de
+    reserva (o timeout do httpx vale para cada leitura, não para o conjunto). No
+    streaming o prazo vale até o primeiro trecho: depois dele não há nova tentativa
+    nem troca de modelo, e o timeout de leitura cobre as pausas. Só as chamadas
+    assíncronas, as usadas pelo servidor, têm prazo; invoke/stream repassam direto.
+    """
+
+    def __init__(self, runnable: Runnable, total_timeout: float):
+        self.runnable = runnable
+        self.total_timeout = total_timeout
+
+    def _timeout_error(self) -> LLMTimeoutError:
+        return LLMTimeoutError(f"O LLM não respondeu em {self.total_timeout:g}s (retentativas e modelos de reserva incluídos).")
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        return self.runnable.invoke(input, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator:
+        yield from self.runnable.stream(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        deadline = asyncio.timeout(self.total_timeout)
+        try:
+            async with deadline:
+                return await self.runnable.ainvoke(input, config, **kwargs)
+        except TimeoutError as e:
+            if deadline.expired():
+                raise self._timeout_error() from e
+            raise
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator:
+        async with contextlib.aclosing(self.runnable.astream(input, config, **kwargs)) as stream:
+            deadline = asyncio.timeout(self.total_timeout)
+            try:
+                async with deadline:
+                    first = await anext(stream)
+            except StopAsyncIteration:
+                return
+            except TimeoutError as e:
+                if deadline.expired():
+                    raise self._timeout_error() from e
+                raise
+            yield first
+            async for chunk in stream:
+                yield chunk
+
+
+class LLMGateway:
+    """
+    Acesso ao LLM (API compatível com OpenAI, ex.: OpenRouter). Todos os modelos
+    compartilham um pool de conexões HTTP keep-alive; cada modelo tem retentativas e
+    circuit breaker, e a lista de modelos é tentada em ordem de prioridade, dentro do
+    prazo total `total_timeout` (None = sem prazo além do de cada chamada).
+    `runnable` entra na chain LCEL no lugar do ChatOpenAI.
+    """
+
+    def __init__(self, models: List[ResilientChatModel], http_client: httpx.Client, http_async_client: httpx.AsyncClient,
+                 total_timeout: Optional[float] = None):
+        if not models:
+            raise ValueError("É preciso pelo menos um modelo de LLM.")
+        self.models = models
+        self.http_client = http_client
+        self.http_async_client = http_async_client
+        runnable = models[0].with_fallbacks(models[1:]) if len(models) > 1 else models[0]
+        self.runnable = _WithDeadline(runnable, total_timeout) if total_timeout else runnable
+
+    def status(self) -> List[dict]:
+        return [{"model": model.model_name, "circuit": model.breaker.state} for model in self.models]
+
+    async def aclose(self) -> None:
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+
+def create_llm_gateway(model_names: Sequence[str], base_url: str, api_key: str, *,
+                       temperature: float, max_tokens: int,
+                       request_timeout: float, connect_timeout: float,
+                       max_connections: int, max_keepalive_connections: int,
+                       max_retries: int, backoff_base_seconds: float, backoff_max_seconds: float,
+                       circuit_failure_threshold: int, circuit_reset_seconds: float,
+                       total_timeout: Optional[float] = None,
+                       transport: Optional[httpx.BaseTransport] = None) -> LLMGateway:
+    """
+    Monta o gateway. `transport` permite testar contra um servidor falso
+    (httpx.MockTransport) sem rede.
+    """
+    timeout = httpx.Timeout(request_timeout, connect=connect_timeout)
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+    http_client = httpx.Client(timeout=timeout, limits=limits, transport=transport)
+    http_async_client = httpx.AsyncClient(timeout=timeout, limits=limits, transport=transport)
+
+    models = []
+    for model_name in model_names:
+        chat_model = ChatOpenAI(
+            model_name=model_name,
+            openai_api_base=base_url,
+            openai_api_key=api_key,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            request_timeout=timeout,
+            max_retries=0, # as retentativas são feitas aqui, visíveis ao circuit breaker
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+        models.append(ResilientChatModel(
+            chat_model, model_name,
+            CircuitBreaker(circuit_failure_threshold, circuit_reset_seconds),
+            max_retries, backoff_base_seconds, backoff_max_seconds,
+        ))
+    return LLMGateway(models, http_client, http_async_client, total_timeout)
@@ -0,0 +1,103 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Etapas medidas no pipeline (label "stage")
+STAGE_CACHE_LOOKUP = "cache_lookup"
+STAGE_QUEUE_WAIT = "queue_wait" # espera por uma vaga no limitador
+STAGE_EMBEDDING = "embedding"
+STAGE_SEARCH = "search" # FAISS + BM25 + fusão
+STAGE_CONTEXT = "context" # MMR, leitura dos chunks, junção e orçamento de tokens
+STAGE_LLM_FIRST_TOKEN = "llm_first_token" # só no streaming
+STAGE_LLM = "llm"
+STAGE_TOTAL = "total"
+
+_LLM_STAGES = (STAGE_LLM_FIRST_TOKEN, STAGE_LLM)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds", "Duração de cada etapa do pipeline RAG.", ["endpoint", "stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80),
+)
+REQUESTS = Counter(
+    "rag_requests_total", "Perguntas processadas, por resultado (answered, cache_exact, cache_semantic, error).",
+    ["endpoint", "outcome"],
+)
+ERRORS = Counter(
+    "rag_errors_total", "Erros por tipo (not_initialized, filter_no_match, overloaded, llm, internal).",
+    ["endpoint", "type"],
+)
+IN_FLIGHT = Gauge("rag_requests_in_flight", "Perguntas ocupando uma vaga do limitador.", multiprocess_mode="livesum")
+QUEUED = Gauge("rag_requests_queued", "Perguntas esperando uma vaga do limitador.", multiprocess_mode="livesum")
+TOKENS = Counter("rag_tokens_total", "Tokens enviados ao LLM e recebidos (kind=prompt|completion).", ["kind"])
+
+
+class RequestTimings:
+    """
+    Spans de tempo de uma requisição. Os spans de uma mesma etapa são somados (ex.: a
+    busca FAISS e a BM25 + fusão entram em "search") e guardados em milissegundos para o
+    bloco `timings` da resposta; o histograma recebe uma única observação por etapa, em
+    finish(). Se uma exceção sai de um span, a etapa fica em `failed_stage` (usada para
+    classificar o erro).
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.failed_stage: Optional[str] = None
+        self.finished = False
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.failed_stage = self.failed_stage or stage
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def finish(self, outcome: str) -> None:
+        """Registra o tempo total, observa cada etapa no histograma e conta o resultado. Só a primeira chamada vale."""
+        if self.finished:
+            return
+        self.finished = True
+        self.record(STAGE_TOTAL, time.perf_counter() - self.started_at)
+        for stage, ms in self.stages.items():
+            STAGE_SECONDS.labels(self.endpoint, stage).observe(ms / 1000)
+        REQUESTS.labels(self.endpoint, outcome).inc()
+
+    def fail(self, error_type: Optional[str] = None) -> None:
+        """Registra um erro; sem tipo explícito, é 'llm' se falhou numa etapa do LLM e 'internal' nos demais casos."""
+        if error_type is None:
+            error_type = "llm" if self.failed_stage in _LLM_STAGES else "internal"
+        ERRORS.labels(self.endpoint, error_type).inc()
+        self.finish("error")
+
+    def as_dict(self) -> Dict[str, float]:
+        return {stage: round(ms, 3) for stage, ms in self.stages.items()}
+
+
+def record_tokens(prompt_tokens: int, completion_tokens: int) -> None:
+    TOKENS.labels("prompt").inc(prompt_tokens)
+    TOKENS.labels("completion").inc(completion_tokens)
+
+
+def render_metrics():
+    """
+    Texto no formato do Prometheus. Com vários workers do gunicorn, definir
+    PROMETHEUS_MULTIPROC_DIR agrega as métricas de todos os processos.
+    Retorna (conteúdo, content type).
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,11 +1,26 @@
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_openai import ChatOpenAI
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
+# langchain_huggingface (torch, sentence-transformers; ver embeddings.create_embeddings), langchain_openai e o prompt da
+# chain são importados só na inicialização: importar este módulo fica barato e o
+# servidor abre a porta antes do trabalho pesado (ver start_background_initialization).
 from app.core.config import settings # Importar settings
 from app.models_pydantic.chat import SourceDocument # Importar o modelo pydantic
+from app.services.concurrency import RAGOverloadedError, RequestLimiter, create_executor, run_in_executor
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.embeddings import create_embeddings
+from app.services.index_manifest import MISMATCH_POLICY_REFUSE, IndexManifestError, resolve_embedding_model
+from app.services.index_versions import UNVERSIONED_PREFIX, active_index, index_version_id
+from app.services.vector_store import INDEX_FILENAME, ChunkVectorStore, index_files_exist
+from app.services.lexical_index import reciprocal_rank_fusion
+from app.services import metrics
+from app.services.metrics import RequestTimings
+from app.services.context_builder import TokenCounter, fit_to_budget, merge_adjacent_chunks, mmr_select
+import asyncio
 import os
+import threading
+import time
+from contextlib import aclosing, asynccontextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Optional
+import numpy as np
 import logging # Adicionado para melhor logging
 
 # Configurar logging
@@ -16,47 +31,173 @@ logging.basicConfig(level=logging.INFO)
 # Estas variáveis serão inicializadas no startup do FastAPI
 embeddings_model_global = None
 vector_store_global = None
-qa_chain_global = None
+qa_chain_global = None # prompt | llm | parser; a recuperação é feita à parte (ver _retrieve_documents)
+qa_prompt_global = None # prompt da chain, usado também para contar os tokens enviados
+llm_gateway_global = None # pool HTTP + retentativas + fallback de modelos (ver llm_gateway)
+_embedding_model_name = None # modelo carregado; versões novas do índice precisam usar o mesmo
+
+RETRIEVAL_K = 5
+
+# Criados sob demanda no primeiro uso (precisam existir dentro do event loop)
+_request_limiter = None
+_retrieval_executor = None
+_answer_cache = None
+_token_counter = None
+
+# Estado da inicialização, exposto em get_rag_status (/health/ready)
+INIT_NOT_STARTED = "not_started"
+INIT_RUNNING = "initializing"
+INIT_WARMING_UP = "warming_up"
+INIT_READY = "ready"
+INIT_FAILED = "failed"
+_init_status = {"state": INIT_NOT_STARTED, "error": None, "init_seconds": None, "warmup_seconds": None}
+_init_task = None
+
+# Troca de versão do índice sem reinício (ver reload_index)
+_reload_lock = threading.Lock()
+_reload_status = {"reloads": 0, "last_reload_at": None, "last_reload_seconds": None, "last_error": None}
+_index_watch_task = None
+
+def _resolve_active_index(model_name: str, mismatch_policy: str):
+    """
+    Versão e pasta do índice ativo (ver index_versions) e o modelo de embedding que ele
+    exige. Barato: valida só os arquivos e o manifesto, antes de carregar qualquer coisa.
+    Levanta FileNotFoundError ou IndexManifestError.
+    """
+    version, index_path = active_index(settings.FAISS_INDEX_PATH)
+    if not index_files_exist(index_path):
+        raise FileNotFoundError(f"Índice FAISS não encontrado em '{index_path}'.")
+    # Um índice construído com outro modelo teria vetores incompatíveis com as queries
+    embedding_model_name, manifest = resolve_embedding_model(
+        index_path, os.path.join(index_path, INDEX_FILENAME), model_name, mismatch_policy
+    )
+    return version, index_path, embedding_model_name, manifest
+
+def _open_vector_store(version: str, index_path: str, manifest) -> ChunkVectorStore:
+    logger.info(f"Carregando Vector Store de: {index_path} (versão {version}, mmap={settings.FAISS_MMAP})")
+    # Vetores (mmap) e textos/metadados (chunk store) ficam no page cache, compartilhados entre workers
+    store = ChunkVectorStore.load(
+        index_path,
+        embeddings_model_global,
+        mmap=settings.FAISS_MMAP,
+        nprobe=settings.FAISS_NPROBE,
+        ef_search=settings.FAISS_EF_SEARCH,
+    )
+    store.version = version
+    store.manifest = manifest
+    index_spec = manifest.get("index_spec", "Flat") if manifest else "Flat"
+    logger.info(f"Vector store carregado com sucesso do disco ({index_spec}, {store.index.ntotal} vetores).")
+    return store
+
+def _load_index_components() -> bool:
+    """
+    Valida o manifesto, carrega o modelo de embedding e abre o índice (mmap).
+    Não cria threads nem conexões, então pode rodar no processo mestre antes do fork
+    dos workers (ver preload_shared_components).
+    """
+    global embeddings_model_global, vector_store_global, _embedding_model_name
+    try:
+        version, index_path, embedding_model_name, manifest = _resolve_active_index(
+            settings.EMBEDDING_MODEL_NAME, settings.EMBEDDING_MODEL_MISMATCH_POLICY
+        )
+    except FileNotFoundError as e:
+        logger.error(f"ERRO CRÍTICO: {e}")
+        logger.error(f"Verifique se a pasta existe e contém 'index.faiss' e o chunk store (chunks.*).")
+        logger.error("Índices antigos com 'index.pkl' podem ser convertidos com: python preprocess_and_create_index.py --migrate-legacy")
+        logger.error("A aplicação pode não funcionar corretamente sem o índice.")
+        vector_store_global = None # Garante que está None se não carregar
+        _init_status["error"] = str(e)
+        return False
+    except IndexManifestError as e:
+        logger.error(f"ERRO CRÍTICO: Índice incompatível com a configuração: {e}")
+        logger.error("Reconstrua o índice com preprocess_and_create_index.py ou ajuste EMBEDDING_MODEL_NAME.")
+        vector_store_global = None
+        _init_status["error"] = f"Índice incompatível com a configuração: {e}"
+        return False
+
+    normalize_embeddings = manifest.get("normalize_embeddings", False) if manifest else False
+    logger.info(f"Carregando modelo de embedding: {embedding_model_name} (backend {settings.EMBEDDING_BACKEND})")
+    embeddings_model_global = create_embeddings(
+        embedding_model_name,
+        normalize_embeddings=normalize_embeddings,
+        backend=settings.EMBEDDING_BACKEND,
+        model_file=settings.EMBEDDING_MODEL_FILE,
+    )
+    _embedding_model_name = embedding_model_name
+    vector_store_global = _open_vector_store(version, index_path, manifest)
+    return True
+
+def _embedding_dimension_error(manifest) -> Optional[str]:
+    # Roda uma inferência do modelo; fica fora do preload para não criar as
+    # threads do PyTorch antes do fork.
+    if not manifest:
+        return None
+    model_dimension = len(embeddings_model_global.embed_query("verificação de dimensão"))
+    if model_dimension != manifest["dimension"]:
+        return f"O modelo de embedding gera vetores de {model_dimension} dims, mas o índice tem {manifest['dimension']}."
+    return None
+
+def preload_shared_components():
+    """
+    Carrega modelo de embedding e índice no processo mestre do gunicorn (preload_app),
+    antes do fork: os workers herdam essas páginas (copy-on-write) em vez de cada um
+    carregar a sua cópia. initialize_rag_components, no worker, reaproveita o que já
+    estiver carregado.
+    """
+    logger.info("RAG Service: Pré-carregando modelo de embedding e índice antes do fork dos workers...")
+    try:
+        _load_index_components()
+    except Exception as e:
+        logger.error(f"Erro no pré-carregamento dos componentes RAG: {e}", exc_info=True)
+
+def initialize_rag_components() -> bool:
+    """
+    Carrega modelo de embedding, índice e gateway do LLM e monta a chain; com
+    RAG_WARMUP_ENABLED, roda em seguida a pergunta de aquecimento. Bloqueante: no
+    servidor roda numa thread (start_background_initialization). Retorna True se o
+    sistema ficou pronto; o motivo da falha fica em get_rag_status()["error"].
+    """
+    global vector_store_global, qa_chain_global, qa_prompt_global, llm_gateway_global
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    from app.services.llm_gateway import create_llm_gateway
 
-def initialize_rag_components():
-    global embeddings_model_global, vector_store_global, qa_chain_global
     logger.info("RAG Service: Inicializando componentes...")
+    _init_status.update(state=INIT_RUNNING, error=None, init_seconds=None, warmup_seconds=None)
+    started_at = time.perf_counter()
     try:
-        logger.info(f"Carregando modelo de embedding: {settings.EMBEDDING_MODEL_NAME}")
-        embeddings_model_global = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL_NAME)
-        
-        # Verificar se o caminho do índice e os arquivos existem
-        index_file_faiss = os.path.join(settings.FAISS_INDEX_PATH, "index.faiss")
-        index_file_pkl = os.path.join(settings.FAISS_INDEX_PATH, "index.pkl")
-
-        if os.path.exists(settings.FAISS_INDEX_PATH) and \
-           os.path.exists(index_file_faiss) and \
-           os.path.exists(index_file_pkl):
-            logger.info(f"Carregando Vector Store de: {settings.FAISS_INDEX_PATH}")
-            vector_store_global = FAISS.load_local(
-                settings.FAISS_INDEX_PATH,
-                embeddings_model_global,
-                allow_dangerous_deserialization=True # Necessário para FAISS com embeddings customizados
-            )
-            logger.info("Vector store carregado com sucesso do disco.")
+        if vector_store_global is not None and embeddings_model_global is not None:
+            logger.info("Modelo de embedding e vector store já pré-carregados; reaproveitando.")
         else:
-            logger.error(f"ERRO CRÍTICO: Índice FAISS não encontrado em '{settings.FAISS_INDEX_PATH}'.")
-            logger.error(f"Verifique se a pasta existe e contém 'index.faiss' e 'index.pkl'.")
-            logger.error("A aplicação pode não funcionar corretamente sem o índice.")
-            # Em um app de produção, você poderia levantar uma exceção aqui para impedir o startup.
-            # Por agora, apenas logamos o erro. qa_chain_global não será criada.
-            vector_store_global = None # Garante que está None se não carregar
+            _load_index_components()
 
+        dimension_error = _embedding_dimension_error(vector_store_global.manifest) if vector_store_global else None
+        if dimension_error:
+            logger.error(f"ERRO CRÍTICO: {dimension_error}")
+            _init_status["error"] = dimension_error
+            vector_store_global = None
 
         if vector_store_global:
-            logger.info(f"Configurando LLM: {settings.LLM_MODEL_NAME}")
-            llm = ChatOpenAI(
-                model_name=settings.LLM_MODEL_NAME,
-                openai_api_base="https://openrouter.ai/api/v1",
-                openai_api_key=settings.OPENROUTER_API_KEY,
+            model_names = [settings.LLM_MODEL_NAME] + [
+                name.strip() for name in settings.LLM_FALLBACK_MODELS.split(",") if name.strip()
+            ]
+            logger.info(f"Configurando LLM: {', '.join(model_names)} via {settings.LLM_BASE_URL}")
+            llm_gateway_global = create_llm_gateway(
+                model_names,
+                base_url=settings.LLM_BASE_URL,
+                api_key=settings.OPENROUTER_API_KEY,
                 temperature=0.5,
                 max_tokens=1500,
-                # request_timeout=30, # Adicionar timeout é uma boa prática
+                request_timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS,
+                connect_timeout=settings.LLM_CONNECT_TIMEOUT_SECONDS,
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                max_retries=settings.LLM_MAX_RETRIES,
+                backoff_base_seconds=settings.LLM_RETRY_BACKOFF_SECONDS,
+                backoff_max_seconds=settings.LLM_RETRY_MAX_BACKOFF_SECONDS,
+                circuit_failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                circuit_reset_seconds=settings.LLM_CIRCUIT_RESET_SECONDS,
+                total_timeout=settings.LLM_TOTAL_TIMEOUT_SECONDS or None,
             )
 
             style_guidance_text = """Você é um mentor digital experiente e consolidado, com acesso ao conhecimento profundo de diversos grandes autores sobre desenvolvimento pessoal, negócios, liderança e outras áreas da sabedoria humana.
@@ -67,9 +208,7 @@ Baseie sua resposta FUNDAMENTALMENTE no CONTEXTO fornecido abaixo, que são trec
 Se o contexto não for suficiente para responder à pergunta de forma completa e precisa, admita isso honestamente. Se possível, ofereça um conselho geral curto, indicando claramente que é uma perspectiva geral não diretamente extraída dos trechos fornecidos para esta pergunta específica.
 Evite frases como "Com base no contexto fornecido..." ou "Os documentos recuperados indicam...". Integre o conhecimento do contexto naturalmente na sua resposta como se fosse seu conhecimento consolidado."""
 
-            template_com_style_embutido = style_guidance_text + """
-
-Abaixo estão trechos relevantes dos livros dos autores que você deve usar para embasar sua resposta:
+            template_contexto_e_pergunta = """Abaixo estão trechos relevantes dos livros dos autores que você deve usar para embasar sua resposta:
 CONTEXTO:
 {context}
 
@@ -79,53 +218,653 @@ PERGUNTA DO USUÁRIO:
 
 RESPOSTA (como um mentor sábio, citando autores/livros do contexto quando apropriado):
 """
-            PROMPT_PARA_CHAIN = PromptTemplate(
-                template=template_com_style_embutido,
-                input_variables=["context", "question"]
-            )
+            # A orientação de estilo vai como mensagem de sistema fixa, antes de tudo:
+            # o início do prompt é idêntico em toda chamada, o que permite ao provedor
+            # reaproveitar o cache de prefixo quando ele oferece esse recurso.
+            PROMPT_PARA_CHAIN = ChatPromptTemplate.from_messages([
+                ("system", style_guidance_text),
+                ("human", template_contexto_e_pergunta),
+            ])
+            qa_prompt_global = PROMPT_PARA_CHAIN
 
-            qa_chain_global = RetrievalQA.from_chain_type(
-                llm=llm,
-                chain_type="stuff",
-                retriever=vector_store_global.as_retriever(search_kwargs={"k": 5}), # k=5
-                return_source_documents=True,
-                chain_type_kwargs={"prompt": PROMPT_PARA_CHAIN}
-            )
+            # Equivale ao chain_type="stuff" do RetrievalQA, mas sem a etapa de recuperação
+            # embutida: assim o embedding + busca FAISS (CPU) rodam no pool de threads e
+            # só a chamada ao LLM usa o ainvoke assíncrono.
+            qa_chain_global = PROMPT_PARA_CHAIN | llm_gateway_global.runnable | StrOutputParser()
             logger.info("Chain de QA configurada com sucesso.")
         else:
             logger.warning("Vector store não carregado, chain de QA não pode ser configurada.")
 
     except Exception as e:
         logger.error(f"Erro Crítico ao inicializar componentes RAG: {e}", exc_info=True)
-        # Em um app de produção, você pode querer que o app não inicie se isso falhar.
+        _init_status["error"] = f"Erro ao inicializar componentes RAG: {e}"
+        qa_chain_global = None
 
-def get_answer(query: str) -> dict:
-    if not qa_chain_global:
-        logger.error("Tentativa de obter resposta, mas a chain de QA não está inicializada.")
-        return {"error": "Sistema RAG não inicializado corretamente. Verifique os logs do servidor."}
-    if not vector_store_global: # Adicionar verificação extra
-        logger.error("Tentativa de obter resposta, mas o vector store não está inicializado.")
-        return {"error": "Vector store não inicializado. Verifique os logs do servidor."}
-    try:
-        logger.info(f"Processando query: {query[:100]}...") # Logar início da query
-        response = qa_chain_global.invoke({"query": query})
-        
-        source_documents_data = []
-        if response.get("source_documents"):
-            for doc in response["source_documents"]:
-                source_documents_data.append(
-                    SourceDocument( # Usar o modelo Pydantic
-                        content=doc.page_content,
-                        page=doc.metadata.get("page"),
-                        author=doc.metadata.get("author"),
-                        book_title=doc.metadata.get("book_title")
-                    )
-                )
-        
+    _init_status["init_seconds"] = round(time.perf_counter() - started_at, 3)
+    if qa_chain_global is None:
+        _init_status["error"] = _init_status["error"] or "Vector store não carregado."
+        _init_status["state"] = INIT_FAILED
+        return False
+    logger.info(f"Componentes RAG inicializados em {_init_status['init_seconds']:.1f}s.")
+
+    if settings.RAG_WARMUP_ENABLED:
+        _init_status["state"] = INIT_WARMING_UP
+        try:
+            _warm_up()
+        except Exception as e:
+            logger.error(f"Falha na pergunta de aquecimento: {e}", exc_info=True)
+            _init_status.update(state=INIT_FAILED, error=f"Falha na pergunta de aquecimento: {e}")
+            return False
+    _init_status["state"] = INIT_READY
+    return True
+
+def _warm_up():
+    """
+    Pergunta de aquecimento, sem chamar o LLM: embedding (primeira inferência), busca
+    vetorial e BM25, leitura dos chunks e contagem de tokens. Traz para a memória as
+    páginas do modelo e do índice antes de o pod receber tráfego.
+    """
+    started_at = time.perf_counter()
+    num_docs = _warm_up_store(vector_store_global)
+    _init_status["warmup_seconds"] = round(time.perf_counter() - started_at, 3)
+    logger.info(f"Aquecimento concluído em {_init_status['warmup_seconds']:.2f}s ({num_docs} trechos).")
+
+def _warm_up_store(store) -> int:
+    """Roda a pergunta de aquecimento contra `store`; retorna quantos trechos vieram."""
+    query = settings.RAG_WARMUP_QUERY
+    embedding = embeddings_model_global.embed_query(query)
+    docs = _search_documents(store, query, embedding, RETRIEVAL_K)
+    _chain_input(docs, query)
+    return len(docs)
+
+def start_background_initialization() -> asyncio.Task:
+    """
+    Agenda initialize_rag_components numa thread e retorna a task. Chamado no lifespan:
+    o servidor abre a porta (e responde /health/live) enquanto o modelo e o índice
+    carregam; /health/ready só responde 200 quando tudo estiver pronto.
+    """
+    global _init_task, _index_watch_task
+    if _init_task is None:
+        _init_status["state"] = INIT_RUNNING
+        _init_task = asyncio.create_task(asyncio.to_thread(initialize_rag_components))
+    if _index_watch_task is None and settings.INDEX_WATCH_INTERVAL_SECONDS > 0:
+        _index_watch_task = asyncio.create_task(_watch_index_versions(settings.INDEX_WATCH_INTERVAL_SECONDS))
+    return _init_task
+
+def reload_index(force: bool = False) -> dict:
+    """
+    Carrega a versão ativa do índice (ver index_versions) e troca vector_store_global
+    por ela, sem reiniciar. Bloqueante: o watcher e o endpoint de admin chamam numa thread.
+
+    A versão nova é aberta e aquecida antes da troca, que é uma única atribuição:
+    requisições novas já usam a versão nova e as em andamento terminam na antiga (cada
+    uma guarda a referência no início). A versão antiga é liberada (mmaps fechados)
+    quando a última delas termina. O cache de respostas é esvaziado na troca.
+
+    Só aceita versões construídas com o modelo de embedding já carregado; trocar de
+    modelo exige reiniciar. Retorna {"reloaded": bool, "version": ...} ou, se a versão
+    nova não puder ser usada, {"error": ..., "status_code": ...} e a atual continua.
+    """
+    global vector_store_global
+    with _reload_lock:
+        current = vector_store_global
+        if current is None or not is_ready():
+            return {"error": "Sistema RAG não inicializado; não há índice para trocar.", "status_code": 503}
+        started_at = time.perf_counter()
+        try:
+            version, index_path, _, manifest = _resolve_active_index(_embedding_model_name, MISMATCH_POLICY_REFUSE)
+            if version == current.version and not force:
+                return {"reloaded": False, "version": version}
+            dimension_error = _embedding_dimension_error(manifest)
+            if dimension_error:
+                raise IndexManifestError(dimension_error)
+            store = _open_vector_store(version, index_path, manifest)
+            _warm_up_store(store)
+        except Exception as e:
+            logger.error(f"Não foi possível carregar a nova versão do índice; mantendo a versão {current.version}: {e}", exc_info=True)
+            _reload_status["last_error"] = str(e)
+            return {"error": f"Não foi possível carregar a nova versão do índice: {e}", "status_code": 409}
+
+        vector_store_global = store
+        cache = _get_answer_cache()
+        if cache is not None:
+            cache.invalidate()
+        seconds = round(time.perf_counter() - started_at, 3)
+        _reload_status.update(
+            reloads=_reload_status["reloads"] + 1,
+            last_reload_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            last_reload_seconds=seconds,
+            last_error=None,
+        )
+        logger.info(f"Índice trocado da versão {current.version} para {version} ({store.index.ntotal} vetores, {seconds:.2f}s).")
+        return {"reloaded": True, "version": version, "previous_version": current.version,
+                "vectors": int(store.index.ntotal), "seconds": seconds}
+
+async def _watch_index_versions(interval: float):
+    """
+    Verifica a versão ativa a cada `interval` segundos e chama reload_index quando ela
+    muda. Sem CURRENT (layout sem versões), espera a mesma versão aparecer em duas
+    verificações seguidas, porque os arquivos podem estar no meio da gravação. Uma
+    versão que falhou não é tentada de novo até mudar.
+    """
+    pending = None
+    failed_version = None
+    while True:
+        await asyncio.sleep(interval)
+        if not is_ready():
+            continue
+        try:
+            version = await asyncio.to_thread(index_version_id, settings.FAISS_INDEX_PATH)
+            if version in (vector_store_global.version, failed_version):
+                pending = None
+                continue
+            if version.startswith(UNVERSIONED_PREFIX) and version != pending:
+                pending = version
+                continue
+            pending = None
+            result = await asyncio.to_thread(reload_index)
+            failed_version = version if result.get("error") else None
+        except Exception as e:
+            logger.error(f"Erro ao verificar a versão do índice: {e}", exc_info=True)
+
+def is_ready() -> bool:
+    return _init_status["state"] == INIT_READY
+
+def get_rag_status() -> dict:
+    """Estado da inicialização e de cada componente, para /health/ready e a rota raiz."""
+    status = dict(_init_status)
+    status["ready"] = is_ready()
+    status["embedding_backend"] = settings.EMBEDDING_BACKEND
+    status["components"] = {
+        "embedding_model": embeddings_model_global is not None,
+        "vector_store": vector_store_global is not None,
+        "llm_gateway": llm_gateway_global is not None,
+        "qa_chain": qa_chain_global is not None,
+    }
+    store = vector_store_global
+    if store is not None:
+        status["index"] = {
+            "version": store.version,
+            "vectors": int(store.index.ntotal),
+            "index_spec": store.manifest.get("index_spec", "Flat") if store.manifest else "Flat",
+            **_reload_status,
+        }
+    status["llm_models"] = get_llm_status()
+    status["answer_cache"] = get_cache_stats()
+    return status
+
+async def shutdown_rag_components():
+    """Para o watcher do índice e fecha as conexões HTTP do gateway do LLM (chamado no encerramento da aplicação)."""
+    if _index_watch_task is not None:
+        _index_watch_task.cancel()
+    if llm_gateway_global is not None:
+        await llm_gateway_global.aclose()
+
+def get_llm_status() -> list:
+    """Estado do circuit breaker de cada modelo, na ordem de prioridade."""
+    return llm_gateway_global.status() if llm_gateway_global is not None else []
+
+def _get_request_limiter() -> RequestLimiter:
+    global _request_limiter
+    if _request_limiter is None:
+        _request_limiter = RequestLimiter(
+            max_concurrent=settings.RAG_MAX_CONCURRENT_REQUESTS,
+            max_queued=settings.RAG_MAX_QUEUED_REQUESTS,
+            queue_timeout=settings.RAG_QUEUE_TIMEOUT_SECONDS,
+            retry_after=settings.RAG_RETRY_AFTER_SECONDS,
+        )
+    return _request_limiter
+
+def _get_retrieval_executor():
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = create_executor(settings.RAG_RETRIEVAL_WORKERS, "rag-retrieval")
+    return _retrieval_executor
+
+def _get_answer_cache():
+    global _answer_cache
+    if _answer_cache is None and settings.ANSWER_CACHE_ENABLED:
+        _answer_cache = SemanticAnswerCache(
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        )
+    return _answer_cache
+
+def get_cache_stats() -> dict:
+    """Contadores do cache de respostas deste worker (vazio com o cache desligado)."""
+    cache = _get_answer_cache()
+    return cache.stats() if cache is not None else {}
+
+def _check_initialized():
+    """
+    Só atende quando o estado é "ready", o mesmo critério do /health/ready: se o
+    aquecimento falhou, a chain existe mas o pod não recebe perguntas.
+    """
+    if _init_status["state"] in (INIT_RUNNING, INIT_WARMING_UP):
         return {
-            "answer": response.get("result", ""), # Garantir que retorna string mesmo se result for None
-            "source_documents": source_documents_data,
+            "error": "Sistema RAG ainda inicializando. Tente novamente em instantes.",
+            "retry_after": settings.RAG_RETRY_AFTER_SECONDS,
         }
+    if not is_ready():
+        logger.error(f"Tentativa de obter resposta, mas o sistema RAG não está pronto (estado {_init_status['state']}): "
+                     f"{_init_status['error']}")
+        return {"error": "Sistema RAG não inicializado corretamente. Verifique os logs do servidor."}
+    return None
+
+def _filter_scope(author_filter: Optional[str], book_filter: Optional[str]) -> str:
+    """Escopo do cache para perguntas filtradas; vazio sem filtro."""
+    parts = []
+    if author_filter:
+        parts.append(f"autor={author_filter.casefold()}")
+    if book_filter:
+        parts.append(f"livro={book_filter.casefold()}")
+    return "|".join(parts)
+
+def _resolve_filter(store, author_filter: Optional[str], book_filter: Optional[str]):
+    """
+    Linhas permitidas pelos filtros de autor/livro (None = sem filtro), na versão do índice em `store`.
+    Retorna (linhas, erro); erro é um dict de resposta quando nenhum chunk corresponde.
+    """
+    chunk_store = store.chunk_store
+    allowed_rows = chunk_store.filter_rows(author=author_filter or None, book_title=book_filter or None)
+    if allowed_rows is not None and len(allowed_rows) == 0:
+        return None, {
+            "error": (
+                f"Nenhum trecho encontrado para o filtro (autor={author_filter!r}, livro={book_filter!r}). "
+                f"Autores disponíveis: {', '.join(chunk_store.authors())}. "
+                f"Livros disponíveis: {', '.join(chunk_store.book_titles())}."
+            ),
+            "status_code": 404,
+        }
+    return allowed_rows, None
+
+def _span(timings, stage: str):
+    """Span de tempo da etapa, ou nada quando a chamada não está sendo medida."""
+    return timings.span(stage) if timings is not None else nullcontext()
+
+@asynccontextmanager
+async def _limited_slot(timings: RequestTimings):
+    """Vaga do limitador, medindo a espera na fila e mantendo os gauges de fila/em andamento."""
+    queue_start = time.perf_counter()
+    metrics.QUEUED.inc()
+    entered = False
+    try:
+        async with _get_request_limiter().slot():
+            entered = True
+            metrics.QUEUED.dec()
+            timings.record(metrics.STAGE_QUEUE_WAIT, time.perf_counter() - queue_start)
+            metrics.IN_FLIGHT.inc()
+            try:
+                yield
+            finally:
+                metrics.IN_FLIGHT.dec()
+    finally:
+        if not entered:
+            metrics.QUEUED.dec()
+
+def _finish(timings: RequestTimings, outcome: str, response: dict) -> dict:
+    """Fecha as métricas da requisição e, com RAG_DEBUG_TIMINGS, anexa os tempos por etapa à resposta."""
+    timings.finish(outcome)
+    if settings.RAG_DEBUG_TIMINGS:
+        response["timings"] = timings.as_dict()
+    return response
+
+def _fail(timings: RequestTimings, response: dict, error_type: Optional[str] = None) -> dict:
+    timings.fail(error_type)
+    return response
+
+def _get_exact_cached_answer(query: str, scope: str = "", timings: RequestTimings = None):
+    """Acerto exato no cache (pergunta normalizada); não precisa de embedding."""
+    cache = _get_answer_cache()
+    if cache is None:
+        return None
+    with _span(timings, metrics.STAGE_CACHE_LOOKUP):
+        cached = cache.get_exact(query, scope)
+    return dict(cached) if cached is not None else None
+
+def _retrieve_documents(store, query: str, allowed_rows=None, timings: RequestTimings = None):
+    """
+    Embedding da query, consulta ao cache semântico e busca FAISS. Ligado a CPU: no
+    caminho assíncrono roda no pool de threads. Retorna (embedding, resposta_em_cache, docs);
+    quando há acerto no cache, docs é None. Com filtro (allowed_rows), o cache
+    semântico não é consultado: ele não distingue respostas por filtro.
+    """
+    with _span(timings, metrics.STAGE_EMBEDDING):
+        embedding = embeddings_model_global.embed_query(query)
+    cache = _get_answer_cache()
+    if cache is not None and allowed_rows is None:
+        with _span(timings, metrics.STAGE_CACHE_LOOKUP):
+            cached = cache.get_similar(embedding)
+        if cached is not None:
+            return embedding, dict(cached), None
+    docs = _search_documents(store, query, embedding, RETRIEVAL_K, allowed_rows, timings)
+    return embedding, None, docs
+
+def _uses_hybrid_search(store) -> bool:
+    return settings.HYBRID_SEARCH_ENABLED and store.lexical_index is not None
+
+def _uses_mmr(store) -> bool:
+    return settings.CONTEXT_MMR_ENABLED and store.raw_vectors is not None
+
+def _fetch_k(store, k: int) -> int:
+    """Candidatos antes do MMR (k quando o MMR está desligado)."""
+    return max(k, settings.CONTEXT_MMR_FETCH_K) if _uses_mmr(store) else k
+
+def _dense_candidates(store, k: int) -> int:
+    """Quantos vizinhos pedir ao FAISS: os candidatos do MMR e, na busca híbrida, os da fusão."""
+    fetch_k = _fetch_k(store, k)
+    return max(fetch_k, settings.HYBRID_CANDIDATES) if _uses_hybrid_search(store) else fetch_k
+
+def _documents_from_dense_rows(store, query: str, embedding, dense_rows, k: int, allowed_rows=None,
+                               timings: RequestTimings = None):
+    """
+    Funde as linhas da busca vetorial com as da BM25 (se houver) por RRF, escolhe k
+    delas por MMR e monta o contexto (chunks vizinhos unidos, orçamento de tokens).
+    """
+    fetch_k = _fetch_k(store, k)
+    with _span(timings, metrics.STAGE_SEARCH):
+        if _uses_hybrid_search(store):
+            _, lexical_rows = store.lexical_index.search(query, _dense_candidates(store, k), allowed_rows)
+            rows = reciprocal_rank_fusion([dense_rows, lexical_rows], fetch_k, settings.RRF_K)
+        else:
+            rows = [int(row) for row in dense_rows[:fetch_k]]
+    with _span(timings, metrics.STAGE_CONTEXT):
+        if _uses_mmr(store) and len(rows) > k:
+            # Vetores já gravados no índice: o MMR não precisa calcular embeddings de novo
+            selected = mmr_select(embedding, store.raw_vectors[np.asarray(rows)], k, settings.CONTEXT_MMR_LAMBDA)
+            rows = [rows[position] for position in selected]
+        return _assemble_context(store, store.chunk_store.get_documents(rows[:k]))
+
+def _assemble_context(store, docs):
+    """Une chunks vizinhos que se sobrepõem e corta o que passar de CONTEXT_MAX_TOKENS."""
+    max_overlap = (store.manifest or {}).get("chunk_overlap", 200)
+    docs = merge_adjacent_chunks(docs, max_overlap)
+    return fit_to_budget(docs, _get_token_counter(), settings.CONTEXT_MAX_TOKENS)
+
+def _search_documents(store, query: str, embedding, k: int, allowed_rows=None, timings: RequestTimings = None):
+    """
+    Busca vetorial e, se houver índice lexical, BM25; as duas listas são fundidas por RRF.
+    allowed_rows restringe as duas buscas às linhas do autor/livro filtrado.
+    """
+    with _span(timings, metrics.STAGE_SEARCH):
+        _, dense_rows = store.search_rows(embedding, _dense_candidates(store, k), allowed_rows)
+    return _documents_from_dense_rows(store, query, embedding, dense_rows, k, allowed_rows, timings)
+
+def _retrieve_documents_batch(store, queries: list, allowed_rows_list: list, timings: RequestTimings = None):
+    """
+    Recuperação de um lote: um único embed_documents para todas as perguntas e uma
+    única busca FAISS multi-query para as que não têm filtro (as filtradas fazem a
+    busca restrita de cada uma). Retorna uma tupla (embedding, resposta_em_cache, docs)
+    por pergunta, como _retrieve_documents.
+    """
+    with _span(timings, metrics.STAGE_EMBEDDING):
+        embeddings = embeddings_model_global.embed_documents(queries)
+    cache = _get_answer_cache()
+    results = [None] * len(queries)
+    unfiltered = []
+    for i, (embedding, allowed_rows) in enumerate(zip(embeddings, allowed_rows_list)):
+        if allowed_rows is not None:
+            results[i] = (embedding, None, _search_documents(store, queries[i], embedding, RETRIEVAL_K, allowed_rows, timings))
+            continue
+        cached = cache.get_similar(embedding) if cache is not None else None
+        if cached is not None:
+            results[i] = (embedding, dict(cached), None)
+        else:
+            unfiltered.append(i)
+    if unfiltered:
+        with _span(timings, metrics.STAGE_SEARCH):
+            dense_results = store.search_rows_batch([embeddings[i] for i in unfiltered], _dense_candidates(store, RETRIEVAL_K))
+        for i, (_, dense_rows) in zip(unfiltered, dense_results):
+            docs = _documents_from_dense_rows(store, queries[i], embeddings[i], dense_rows, RETRIEVAL_K, timings=timings)
+            results[i] = (embeddings[i], None, docs)
+    return results
+
+def _store_in_cache(store, query: str, embedding, response: dict, scope: str = ""):
+    cache = _get_answer_cache()
+    # Resposta de uma versão do índice que já foi trocada (ver reload_index): não entra no cache novo
+    if cache is not None and store is vector_store_global:
+        # Um acerto no cache não gasta tokens: a contagem e os tempos da chamada original não são guardados
+        value = {key: value for key, value in response.items() if key not in ("usage", "timings")}
+        # Respostas filtradas ficam só no cache exato, no escopo do filtro
+        cache.put(query, embedding if not scope else None, value, scope)
+
+def _get_token_counter() -> TokenCounter:
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = TokenCounter(settings.TOKENIZER_ENCODING)
+    return _token_counter
+
+def _format_context(docs) -> str:
+    # Mesmo formato do chain "stuff": conteúdo das páginas separado por linha em branco
+    return "\n\n".join(doc.page_content for doc in docs)
+
+def _chain_input(docs, query: str) -> dict:
+    return {"context": _format_context(docs), "question": query}
+
+def _token_usage(chain_input: dict, answer: str) -> dict:
+    """Tokens do prompt completo (sistema + contexto + pergunta) e da resposta, contados localmente."""
+    counter = _get_token_counter()
+    prompt_tokens = sum(counter.count(message.content) for message in qa_prompt_global.format_messages(**chain_input))
+    completion_tokens = counter.count(answer)
+    metrics.record_tokens(prompt_tokens, completion_tokens)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+def _prepare_query(store, query: str, author_filter: Optional[str], book_filter: Optional[str],
+                   timings: RequestTimings = None):
+    """
+    Etapas antes da recuperação, comuns a todos os endpoints: filtro de autor/livro e
+    acerto exato no cache. Retorna (linhas permitidas, escopo do cache, resposta_em_cache, erro);
+    erro é o dict de resposta quando nenhum chunk corresponde ao filtro.
+    """
+    allowed_rows, filter_error = _resolve_filter(store, author_filter, book_filter)
+    if filter_error:
+        return None, None, None, filter_error
+    scope = _filter_scope(author_filter, book_filter)
+    return allowed_rows, scope, _get_exact_cached_answer(query, scope, timings), None
+
+def _answer_response(docs, chain_input: dict, answer: Optional[str]) -> dict:
+    answer = answer or "" # Garantir que retorna string mesmo se result for None
+    return {
+        "answer": answer,
+        "source_documents": _to_source_documents(docs),
+        "usage": _token_usage(chain_input, answer),
+    }
+
+def _to_source_documents(docs) -> list:
+    source_documents_data = []
+    for doc in docs:
+        source_documents_data.append(
+            SourceDocument( # Usar o modelo Pydantic
+                content=doc.page_content,
+                page=doc.metadata.get("page"),
+                author=doc.metadata.get("author"),
+                book_title=doc.metadata.get("book_title")
+            )
+        )
+    return source_documents_data
+
+async def get_answer_async(query: str, author_filter: Optional[str] = None, book_filter: Optional[str] = None) -> dict:
+    """
+    Responde uma pergunta sem bloquear o event loop: a recuperação roda no pool de
+    threads e a chamada ao LLM usa ainvoke, respeitando o limite de requisições simultâneas.
+    """
+    timings = RequestTimings("ask")
+    not_ready = _check_initialized()
+    if not_ready:
+        return _fail(timings, not_ready, "not_initialized")
+    store = vector_store_global # a requisição inteira usa esta versão do índice, mesmo se houver troca no meio
+    try:
+        allowed_rows, scope, cached, filter_error = _prepare_query(store, query, author_filter, book_filter, timings)
+        if filter_error:
+            return _fail(timings, filter_error, "filter_no_match")
+        if cached is not None:
+            return _finish(timings, "cache_exact", cached)
+        async with _limited_slot(timings):
+            logger.info(f"Processando query: {query[:100]}...")
+            embedding, cached, docs = await run_in_executor(
+                _get_retrieval_executor(), _retrieve_documents, store, query, allowed_rows, timings
+            )
+            if cached is not None:
+                return _finish(timings, "cache_semantic", cached)
+            chain_input = _chain_input(docs, query)
+            with timings.span(metrics.STAGE_LLM):
+                answer = await qa_chain_global.ainvoke(chain_input)
+
+        response = _answer_response(docs, chain_input, answer)
+        _store_in_cache(store, query, embedding, response, scope)
+        return _finish(timings, "answered", response)
+    except RAGOverloadedError as e:
+        logger.warning(f"Requisição rejeitada por sobrecarga: {e}")
+        return _fail(timings, {"error": str(e), "retry_after": e.retry_after}, "overloaded")
     except Exception as e:
         logger.error(f"Erro ao obter resposta da chain para query '{query[:50]}...': {e}", exc_info=True)
-        return {"error": f"Ocorreu um erro interno ao processar sua solicitação: {str(e)}"}
\ No newline at end of file
+        return _fail(timings, {"error": f"Ocorreu um erro interno ao processar sua solicitação: {str(e)}"})
+
+async def _answer_batch_item(chain_input: dict, llm_slots: asyncio.Semaphore, timings: RequestTimings):
+    """Uma chamada ao LLM de um lote. Ocupa uma vaga do limitador, como uma pergunta avulsa."""
+    async with llm_slots:
+        async with _limited_slot(timings):
+            with timings.span(metrics.STAGE_LLM):
+                return await qa_chain_global.ainvoke(chain_input)
+
+async def get_answers_batch(items: list) -> dict:
+    """
+    Responde um lote de perguntas. items: dicts com query e, opcionalmente,
+    author_filter/book_filter. Acertos exatos do cache são resolvidos antes; o resto
+    passa por _retrieve_documents_batch, que ocupa uma vaga do limitador. Depois, as
+    chamadas ao LLM rodam em paralelo, até RAG_BATCH_LLM_CONCURRENCY, e cada uma ocupa
+    a sua vaga: um lote nunca passa de RAG_MAX_CONCURRENT_REQUESTS chamadas simultâneas.
+    Retorna {"results": [...]} na ordem de entrada, cada item com answer/source_documents
+    ou error; falhas do lote inteiro (não inicializado, sobrecarga) retornam {"error": ...}.
+    As métricas contam o lote como uma requisição, com os tempos somados das etapas.
+    """
+    timings = RequestTimings("batch")
+    not_ready = _check_initialized()
+    if not_ready:
+        return _fail(timings, not_ready, "not_initialized")
+    store = vector_store_global
+    try:
+        results = [None] * len(items)
+        pending = [] # (posição, query, linhas permitidas, escopo do cache)
+        for i, item in enumerate(items):
+            query = item["query"]
+            allowed_rows, scope, cached, filter_error = _prepare_query(
+                store, query, item.get("author_filter"), item.get("book_filter"), timings
+            )
+            if filter_error:
+                results[i] = {"error": filter_error["error"]}
+            elif cached is not None:
+                results[i] = cached
+            else:
+                pending.append((i, query, allowed_rows, scope))
+
+        if pending:
+            async with _limited_slot(timings):
+                logger.info(f"Processando lote de {len(pending)} perguntas ({len(items) - len(pending)} resolvidas pelo cache).")
+                retrieved = await run_in_executor(
+                    _get_retrieval_executor(), _retrieve_documents_batch, store,
+                    [query for _, query, _, _ in pending], [allowed_rows for _, _, allowed_rows, _ in pending], timings,
+                )
+            to_answer = []
+            for (i, query, _, scope), (embedding, cached, docs) in zip(pending, retrieved):
+                if cached is not None:
+                    results[i] = cached
+                else:
+                    to_answer.append((i, query, scope, embedding, docs))
+            chain_inputs = [_chain_input(docs, query) for _, query, _, _, docs in to_answer]
+            llm_slots = asyncio.Semaphore(settings.RAG_BATCH_LLM_CONCURRENCY)
+            answers = await asyncio.gather(
+                *(_answer_batch_item(chain_input, llm_slots, timings) for chain_input in chain_inputs),
+                return_exceptions=True,
+            )
+
+            for (i, query, scope, embedding, docs), chain_input, answer in zip(to_answer, chain_inputs, answers):
+                if isinstance(answer, RAGOverloadedError):
+                    logger.warning(f"Pergunta do lote rejeitada por sobrecarga: {answer}")
+                    metrics.ERRORS.labels("batch", "overloaded").inc()
+                    results[i] = {"error": str(answer)}
+                    continue
+                if isinstance(answer, Exception):
+                    logger.error(f"Erro ao obter resposta do lote para query '{query[:50]}...': {answer}")
+                    metrics.ERRORS.labels("batch", "llm").inc()
+                    results[i] = {"error": f"Ocorreu um erro interno ao processar esta pergunta: {str(answer)}"}
+                    continue
+                results[i] = _answer_response(docs, chain_input, answer)
+                _store_in_cache(store, query, embedding, results[i], scope)
+        return _finish(timings, "answered", {"results": results})
+    except RAGOverloadedError as e:
+        logger.warning(f"Lote rejeitado por sobrecarga: {e}")
+        return _fail(timings, {"error": str(e), "retry_after": e.retry_after}, "overloaded")
+    except Exception as e:
+        logger.error(f"Erro ao processar lote de {len(items)} perguntas: {e}", exc_info=True)
+        return _fail(timings, {"error": f"Ocorreu um erro interno ao processar sua solicitação: {str(e)}"})
+
+
+async def stream_answer(query: str, author_filter: Optional[str] = None, book_filter: Optional[str] = None):
+    """
+    Versão em streaming: gera tuplas (evento, dados) para o endpoint SSE.
+    Primeiro 'sources' (documentos recuperados), depois um 'token' por trecho
+    produzido pelo LLM e por fim 'done'. Falhas viram um evento 'error'.
+    Se o consumidor fechar o gerador (cliente desconectou), o astream do LLM é
+    encerrado junto, cancelando a chamada upstream.
+    """
+    timings = RequestTimings("stream")
+    not_ready = _check_initialized()
+    if not_ready:
+        yield ("error", _fail(timings, not_ready, "not_initialized"))
+        return
+    store = vector_store_global
+    try:
+        allowed_rows, scope, cached, filter_error = _prepare_query(store, query, author_filter, book_filter, timings)
+        if filter_error:
+            yield ("error", _fail(timings, filter_error, "filter_no_match"))
+            return
+        outcome = "cache_exact"
+        done_data = {}
+        if cached is None:
+            async with _limited_slot(timings):
+                logger.info(f"Processando query (stream): {query[:100]}...")
+                embedding, cached, docs = await run_in_executor(
+                    _get_retrieval_executor(), _retrieve_documents, store, query, allowed_rows, timings
+                )
+                outcome = "cache_semantic"
+                if cached is None:
+                    source_documents = _to_source_documents(docs)
+                    yield ("sources", [doc.model_dump() for doc in source_documents])
+
+                    answer_parts = []
+                    chain_input = _chain_input(docs, query)
+                    llm_start = time.perf_counter()
+                    # aclosing: se este gerador for fechado, o astream do LLM é fechado na hora,
+                    # não só quando o coletor de lixo finalizar o gerador
+                    with timings.span(metrics.STAGE_LLM):
+                        async with aclosing(qa_chain_global.astream(chain_input)) as llm_stream:
+                            async for chunk in llm_stream:
+                                if chunk:
+                                    if not answer_parts:
+                                        timings.record(metrics.STAGE_LLM_FIRST_TOKEN, time.perf_counter() - llm_start)
+                                    answer_parts.append(chunk)
+                                    yield ("token", chunk)
+                    # Só chega aqui se o stream terminou sem desconexão: resposta completa
+                    answer = "".join(answer_parts)
+                    _store_in_cache(store, query, embedding, {"answer": answer, "source_documents": source_documents}, scope)
+                    done_data = {"usage": _token_usage(chain_input, answer)}
+                    outcome = "answered"
+
+        if cached is not None:
+            # Acerto no cache: mesma sequência de eventos, com a resposta num único token
+            yield ("sources", [doc.model_dump() for doc in cached["source_documents"]])
+            yield ("token", cached["answer"])
+        yield ("done", _finish(timings, outcome, done_data))
+    except GeneratorExit:
+        # Cliente desconectou no meio do stream
+        timings.finish("cancelled")
+        raise
+    except RAGOverloadedError as e:
+        logger.warning(f"Requisição (stream) rejeitada por sobrecarga: {e}")
+        yield ("error", _fail(timings, {"error": str(e), "retry_after": e.retry_after}, "overloaded"))
+    except Exception as e:
+        logger.error(f"Erro no streaming da resposta para query '{query[:50]}...': {e}", exc_info=True)
+        yield ("error", _fail(timings, {"error": f"Ocorreu um erro interno ao processar sua solicitação: {str(e)}"}))
@@ -0,0 +1,179 @@
+import logging
+import os
+from typing import List, Sequence
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.chunk_store import ChunkStore, chunk_store_exists
+from app.services.lexical_index import LexicalIndex, lexical_index_exists
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.faiss"
+# Vetores originais (float32), gravados pelo construtor quando o índice não é Flat:
+# o IVF-PQ, por exemplo, não permite reconstruí-los sem perda.
+VECTORS_FILENAME = "vectors.npy"
+
+# Leitura somente leitura com os vetores mapeados do arquivo (IndexFlat/HNSW/IVF):
+# as páginas ficam no page cache e são compartilhadas por todos os workers.
+MMAP_READ_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def index_files_exist(index_path: str) -> bool:
+    return os.path.exists(os.path.join(index_path, INDEX_FILENAME)) and chunk_store_exists(index_path)
+
+
+def read_index(index_file: str, mmap: bool = True):
+    if mmap:
+        try:
+            return faiss.read_index(index_file, MMAP_READ_FLAGS)
+        except RuntimeError as e:
+            # Alguns tipos de índice não suportam mmap; carrega em memória
+            logger.warning(f"Não foi possível mapear '{index_file}' em memória ({e}); carregando cópia privada.")
+    return faiss.read_index(index_file)
+
+
+def _raw_vectors_view(index, index_path: str):
+    """vectors.npy (mmap) se existir; para índices Flat, uma visão direta dos vetores do próprio índice."""
+    vectors_file = os.path.join(index_path, VECTORS_FILENAME)
+    if os.path.exists(vectors_file):
+        return np.load(vectors_file, mmap_mode="r")
+    if isinstance(index, faiss.IndexFlat):
+        return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+    return None
+
+
+def _ivf_index(index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None # não é IVF
+
+
+def _hnsw(index):
+    return getattr(faiss.downcast_index(index), "hnsw", None)
+
+
+def apply_search_parameters(index, nprobe: int = None, ef_search: int = None) -> None:
+    """Ajusta os parâmetros de busca que existirem no tipo do índice (nprobe p/ IVF, efSearch p/ HNSW)."""
+    ivf_index = _ivf_index(index)
+    if ivf_index is not None and nprobe:
+        ivf_index.nprobe = min(nprobe, ivf_index.nlist)
+    hnsw = _hnsw(index)
+    if hnsw is not None and ef_search:
+        hnsw.efSearch = ef_search
+
+
+def search_cost(index) -> int:
+    """
+    Quantos vetores, por alto, uma busca sem filtro compara: todos no Flat, os centróides
+    e as nprobe listas no IVF, efSearch x vizinhos por nó no HNSW.
+    """
+    ivf_index = _ivf_index(index)
+    if ivf_index is not None:
+        return ivf_index.nlist + index.ntotal * ivf_index.nprobe // max(ivf_index.nlist, 1)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        return hnsw.efSearch * hnsw.nb_neighbors(0)
+    return index.ntotal
+
+
+def selector_search_parameters(index, selector):
+    """SearchParameters com o seletor, mantendo o nprobe/efSearch do índice (os parâmetros da chamada substituem os dele)."""
+    ivf_index = _ivf_index(index)
+    if ivf_index is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf_index.nprobe)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+class ChunkVectorStore:
+    """
+    Índice FAISS + ChunkStore. Substitui o FAISS do langchain (index.pkl): a linha i
+    do índice é o chunk i do store, então não há mapeamento id -> documento para
+    desserializar e só os k documentos retornados são lidos do disco. O índice
+    lexical (BM25), quando existe, usa a mesma numeração de linhas.
+    """
+
+    def __init__(self, index, chunk_store: ChunkStore, embedding_function, lexical_index: LexicalIndex = None):
+        if index.ntotal != len(chunk_store):
+            raise ValueError(f"Índice FAISS tem {index.ntotal} vetores, mas o chunk store tem {len(chunk_store)} chunks.")
+        if lexical_index is not None and lexical_index.num_docs != len(chunk_store):
+            raise ValueError(f"Índice lexical tem {lexical_index.num_docs} chunks, mas o chunk store tem {len(chunk_store)}.")
+        self.index = index
+        self.chunk_store = chunk_store
+        self.embedding_function = embedding_function
+        self.lexical_index = lexical_index
+        self.raw_vectors = None # vetores exatos por linha, usados na busca filtrada (ver load)
+        # Preenchidos por quem carrega o índice (rag_service): versão em disco e manifest.json dela
+        self.version = None
+        self.manifest = None
+
+    @classmethod
+    def load(cls, index_path: str, embedding_function, mmap: bool = True,
+             nprobe: int = None, ef_search: int = None) -> "ChunkVectorStore":
+        index = read_index(os.path.join(index_path, INDEX_FILENAME), mmap)
+        apply_search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+        lexical_index = None
+        if lexical_index_exists(index_path):
+            lexical_index = LexicalIndex(index_path)
+        else:
+            logger.warning(f"Índice lexical não encontrado em '{index_path}'; a busca será apenas vetorial.")
+        store = cls(index, ChunkStore(index_path), embedding_function, lexical_index)
+        store.raw_vectors = _raw_vectors_view(index, index_path)
+        return store
+
+    def search_rows(self, embedding: Sequence[float], k: int, allowed_rows: np.ndarray = None):
+        """
+        Retorna (distâncias, linhas) dos k vizinhos mais próximos, sem ler os documentos.
+        Com allowed_rows (ex.: chunks de um autor), só essas linhas concorrem e sempre
+        vêm min(k, len(allowed_rows)) resultados; a busca não custa mais que a sem
+        filtro (ver _search_subset).
+        """
+        query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        if allowed_rows is not None:
+            return self._search_subset(query, k, allowed_rows)
+        distances, rows = self.index.search(query, k)
+        valid = rows[0] != -1
+        return distances[0][valid], rows[0][valid]
+
+    def search_rows_batch(self, embeddings: Sequence[Sequence[float]], k: int):
+        """Várias queries numa única chamada ao FAISS. Retorna uma lista de (distâncias, linhas) por query."""
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        distances, rows = self.index.search(queries, k)
+        valid = rows != -1
+        return [(distances[i][valid[i]], rows[i][valid[i]]) for i in range(len(queries))]
+
+    def _search_subset(self, query: np.ndarray, k: int, allowed_rows: np.ndarray):
+        """
+        Subconjunto menor que o que uma busca sem filtro compara (search_cost): busca exata
+        só sobre os vetores dele. Maior: o próprio índice busca, com um seletor que descarta
+        as demais linhas. Se o índice aproximado (IVF/HNSW) não achar k linhas do
+        subconjunto, a busca exata completa o resultado.
+        """
+        if len(allowed_rows) == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        k = min(k, len(allowed_rows))
+        if len(allowed_rows) > search_cost(self.index):
+            selector = faiss.IDSelectorBatch(np.ascontiguousarray(allowed_rows, dtype=np.int64))
+            distances, rows = self.index.search(query, k, params=selector_search_parameters(self.index, selector))
+            valid = rows[0] != -1
+            if valid.sum() == k:
+                return distances[0], rows[0]
+        if self.raw_vectors is not None:
+            candidates = np.ascontiguousarray(self.raw_vectors[allowed_rows], dtype=np.float32)
+        else:
+            candidates = self.index.reconstruct_batch(allowed_rows)
+        distances, positions = faiss.knn(query, candidates, k)
+        return distances[0], allowed_rows[positions[0]]
+
+    def similarity_search_by_vector(self, embedding: Sequence[float], k: int = 4) -> List[Document]:
+        _, rows = self.search_rows(embedding, k)
+        return self.chunk_store.get_documents(rows)
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k)
@@ -0,0 +1,148 @@
+"""
+Benchmark de tipos de índice FAISS: recall@k em relação à busca exata (Flat) e
+latência p50/p99 de uma busca (uma query por vez, como no servidor).
+
+Usa os vetores da versão ativa do índice distribuído (faiss_index_multi_author).
+Como consultas, sorteia chunks do próprio índice e soma um ruído gaussiano, para
+que o vizinho mais próximo não seja trivialmente o próprio vetor.
+
+Uso:
+    python benchmarks/ann_benchmark.py
+    python benchmarks/ann_benchmark.py --specs "HNSW32" "IVF64,Flat" --k 5 --output resultados.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import settings
+from app.services.vector_store import INDEX_FILENAME, VECTORS_FILENAME, apply_search_parameters
+from benchmarks.bench_utils import active_index_path
+
+# (spec do index_factory, parâmetro de busca, valores testados)
+DEFAULT_CONFIGS = [
+    ("Flat", None, [None]),
+    ("HNSW32", "ef_search", [16, 32, 64, 128]),
+    ("IVF{nlist},Flat", "nprobe", [1, 4, 8, 16, 32]),
+    ("IVF{nlist},PQ{m}x{nbits}", "nprobe", [4, 8, 16, 32]),
+]
+
+
+def config_for_spec(spec):
+    for template, param, values in DEFAULT_CONFIGS:
+        if param == "ef_search" and spec.startswith("HNSW") or param == "nprobe" and spec.startswith("IVF"):
+            return (spec, param, values)
+    return (spec, None, [None])
+
+
+def load_vectors(index_root):
+    index_path = active_index_path(index_root)
+    vectors_file = os.path.join(index_path, VECTORS_FILENAME)
+    if os.path.exists(vectors_file):
+        return np.load(vectors_file)
+    index = faiss.read_index(os.path.join(index_path, INDEX_FILENAME))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def make_queries(vectors, num_queries, noise, seed):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    scale = noise * float(np.linalg.norm(vectors, axis=1).mean()) / np.sqrt(vectors.shape[1])
+    return (vectors[rows] + rng.normal(0, scale, size=(len(rows), vectors.shape[1]))).astype(np.float32)
+
+
+def expand_spec(spec, num_vectors, dimension):
+    # nlist ~ 4*sqrt(n) e 2^nbits centróides por sub-quantizador do PQ, ambos
+    # limitados para haver >= 39 vetores de treino por centróide
+    nlist = max(1, min(int(4 * np.sqrt(num_vectors)), num_vectors // 39))
+    m = next(m for m in (24, 16, 12, 8, 4, 2, 1) if dimension % m == 0)
+    nbits = int(max(4, min(8, np.log2(max(2, num_vectors // 39)))))
+    return spec.format(nlist=nlist, m=m, nbits=nbits)
+
+
+def build(spec, vectors):
+    start = time.perf_counter()
+    index = faiss.index_factory(vectors.shape[1], spec)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index, time.perf_counter() - start
+
+
+def measure(index, queries, ground_truth, k):
+    latencies = []
+    found = 0
+    for query, expected in zip(queries, ground_truth):
+        start = time.perf_counter()
+        _, rows = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found += len(set(rows[0].tolist()) & set(expected.tolist()))
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "recall_at_k": found / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def run(index_root, configs, k, num_queries, noise, seed, threads):
+    faiss.omp_set_num_threads(threads)
+    vectors = load_vectors(index_root)
+    queries = make_queries(vectors, num_queries, noise, seed)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, k)
+    print(f"{len(vectors)} vetores de {vectors.shape[1]} dims; {len(queries)} queries; k={k}\n")
+
+    results = []
+    print(f"{'índice':<18} {'parâmetro':<14} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'MB':>7}")
+    for spec_template, param, values in configs:
+        spec = expand_spec(spec_template, len(vectors), vectors.shape[1])
+        try:
+            index, build_seconds = build(spec, vectors)
+        except RuntimeError as e:
+            print(f"{spec:<18} ERRO: {e}")
+            continue
+        size_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+        for value in values:
+            if param:
+                apply_search_parameters(index, **{param: value})
+            result = {"index_spec": spec, "param": param, "value": value, "build_seconds": build_seconds,
+                      "size_mb": size_mb, **measure(index, queries, ground_truth, k)}
+            results.append(result)
+            label = f"{param}={value}" if param else "-"
+            print(f"{spec:<18} {label:<14} {result['recall_at_k']:9.3f} {result['p50_ms']:8.3f} "
+                  f"{result['p99_ms']:8.3f} {build_seconds:8.2f} {size_mb:7.2f}")
+    return {"num_vectors": int(len(vectors)), "dimension": int(vectors.shape[1]), "k": k,
+            "num_queries": int(len(queries)), "noise": noise, "threads": threads, "results": results}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recall@k e latência de tipos de índice FAISS sobre o índice distribuído.")
+    parser.add_argument("--index-path", default=settings.FAISS_INDEX_PATH)
+    parser.add_argument("--specs", nargs="*", help='Specs do index_factory (ex.: "HNSW32" "IVF64,PQ16"); padrão: Flat, HNSW, IVF-Flat e IVF-PQ.')
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.3, help="Desvio do ruído somado às queries, relativo à norma média dos vetores.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=1, help="Threads do FAISS (o servidor faz uma busca por thread).")
+    parser.add_argument("--output", help="Grava os resultados em JSON.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    configs = DEFAULT_CONFIGS
+    if args.specs:
+        configs = [config_for_spec(spec) for spec in args.specs]
+    report = run(args.index_path, configs, args.k, args.queries, args.noise, args.seed, args.threads)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em '{args.output}'.")
@@ -0,0 +1,79 @@
+"""Funções comuns aos benchmarks: pasta do índice ativo, resumo de latências, metadados da execução e gravação em JSON."""
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.services.index_versions import active_index
+
+# Perguntas usadas pelos benchmarks (cobrem os três livros do índice distribuído)
+SAMPLE_QUESTIONS = [
+    "Qual o segredo para uma vida plena?",
+    "Como construir uma tribo de superfãs?",
+    "O que é marketing segundo Seth Godin?",
+    "Como planejar o lançamento de um produto?",
+    "Como criar uma sequência de pré-lançamento?",
+    "Por que devo focar no menor mercado viável?",
+    "Como transformar clientes em fãs?",
+    "Qual a diferença entre vender e servir?",
+    "Como usar gatilhos mentais num lançamento?",
+    "O que é permissão no marketing?",
+    "Como lidar com críticas ao meu trabalho?",
+    "Como escrever uma boa carta de vendas?",
+    "What is the smallest viable audience?",
+    "How do I turn an audience into superfans?",
+    "What is a product launch formula?",
+    "Como construir confiança com o público?",
+    "Qual o papel da tensão no marketing?",
+    "Como criar uma comunidade em torno da marca?",
+    "Como definir o posicionamento do meu produto?",
+    "O que fazer depois do lançamento?",
+]
+
+
+def active_index_path(root):
+    """
+    Pasta do índice ativo sob FAISS_INDEX_PATH, como no servidor: a versão apontada pelo
+    CURRENT ou, no layout sem versões, o próprio root.
+    """
+    version, index_path = active_index(root)
+    print(f"Índice: '{index_path}' (versão {version})")
+    return index_path
+
+
+def summarize(values):
+    """p50/p95/p99, média e máximo de uma lista de latências (mesma unidade da entrada)."""
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(len(array)),
+        "mean": float(array.mean()),
+        "p50": float(np.percentile(array, 50)),
+        "p95": float(np.percentile(array, 95)),
+        "p99": float(np.percentile(array, 99)),
+        "max": float(array.max()),
+    }
+
+
+def run_metadata():
+    """Quando e onde a execução rodou, para comparar resultados entre commits/máquinas."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or None,
+    }
+
+
+def write_results(path, report):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em '{path}'.")
@@ -0,0 +1,186 @@
+"""
+Compara backends do modelo de embedding (EMBEDDING_BACKEND / EMBEDDING_MODEL_FILE)
+no nosso corpus:
+
+- precisão: cosseno entre os vetores de uma amostra de chunks gerados pelo backend e
+  os vetores gravados no índice (construído em PyTorch), e sobreposição top-k da busca
+  das perguntas de exemplo em relação ao backend torch;
+- latência: embedding de uma pergunta por vez (p50/p95/p99, como no servidor) e
+  throughput em lote (chunks/s);
+- memória: RSS depois de carregar o modelo e pico durante o encode.
+
+Cada backend roda num processo novo, para que a memória de um não conte no outro.
+Um backend é "nome" ou "nome:arquivo" (arquivo do modelo dentro do repositório do
+modelo, como em EMBEDDING_MODEL_FILE).
+
+Uso:
+    python benchmarks/embedding_backend_benchmark.py
+    python benchmarks/embedding_backend_benchmark.py --backends torch onnx "onnx:onnx/model_qint8_avx512_vnni.onnx" --output embeddings.json
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import settings
+from app.services.index_manifest import read_manifest
+from app.services.vector_store import ChunkVectorStore
+from benchmarks.bench_utils import SAMPLE_QUESTIONS, active_index_path, run_metadata, summarize, write_results
+
+DEFAULT_BACKENDS = ["torch", "onnx", "onnx:onnx/model_qint8_avx512_vnni.onnx"]
+
+
+def parse_backend(spec):
+    backend, _, model_file = spec.partition(":")
+    return backend, model_file or None
+
+
+def rss_mb():
+    """RSS atual do processo (Linux: /proc; nos demais, o pico via getrusage)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_backend(spec, model_name, normalize, questions, texts, rounds, batch_size):
+    """Roda num processo novo: carrega o backend, mede latência/memória e devolve os vetores."""
+    from app.services.embeddings import create_embeddings
+
+    backend, model_file = parse_backend(spec)
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    model = create_embeddings(model_name, normalize_embeddings=normalize, backend=backend, model_file=model_file)
+    model.embed_query(questions[0]) # primeira inferência (inicialização preguiçosa do runtime)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    query_ms = []
+    for _ in range(rounds):
+        for question in questions:
+            start = time.perf_counter()
+            model.embed_query(question)
+            query_ms.append((time.perf_counter() - start) * 1000)
+    query_vectors = np.asarray([model.embed_query(q) for q in questions], dtype=np.float32)
+
+    start = time.perf_counter()
+    chunk_vectors = []
+    for i in range(0, len(texts), batch_size):
+        chunk_vectors.extend(model.embed_documents(texts[i:i + batch_size]))
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "load_seconds": load_seconds,
+        "rss_model_mb": rss_loaded - rss_before,
+        "rss_loaded_mb": rss_loaded,
+        "peak_rss_mb": peak_rss_mb(),
+        "query_ms": summarize(query_ms),
+        "batch_chunks_per_second": len(texts) / batch_seconds if batch_seconds else None,
+        "query_vectors": query_vectors,
+        "chunk_vectors": np.asarray(chunk_vectors, dtype=np.float32),
+    }
+
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def topk_overlap(store, reference_vectors, candidate_vectors, k):
+    overlaps = []
+    for reference, candidate in zip(reference_vectors, candidate_vectors):
+        _, reference_rows = store.search_rows(reference, k)
+        _, candidate_rows = store.search_rows(candidate, k)
+        overlaps.append(len(set(reference_rows.tolist()) & set(candidate_rows.tolist())) / k)
+    return float(np.mean(overlaps))
+
+
+def load_index(index_root):
+    """manifest.json e vetores da versão ativa do índice (a referência da comparação)."""
+    index_path = active_index_path(index_root)
+    return read_manifest(index_path) or {}, ChunkVectorStore.load(index_path, None)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Precisão, latência e memória dos backends do modelo de embedding.")
+    parser.add_argument("--index-path", default=settings.FAISS_INDEX_PATH)
+    parser.add_argument("--backends", nargs="*", default=DEFAULT_BACKENDS)
+    parser.add_argument("--sample-chunks", type=int, default=500, help="Chunks do índice usados na comparação de vetores.")
+    parser.add_argument("--rounds", type=int, default=5, help="Passadas pelas perguntas de exemplo na medida de latência.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Grava os resultados em JSON.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    manifest, store = load_index(args.index_path)
+    model_name = manifest.get("embedding_model", settings.EMBEDDING_MODEL_NAME)
+    normalize = manifest.get("normalize_embeddings", False)
+    if store.raw_vectors is None:
+        sys.exit("Não foi possível ler os vetores do índice; não há com o que comparar.")
+
+    rng = np.random.default_rng(args.seed)
+    num_chunks = len(store.chunk_store)
+    rows = np.sort(rng.choice(num_chunks, size=min(args.sample_chunks, num_chunks), replace=False))
+    texts = [store.chunk_store.text(int(row)) for row in rows]
+    index_vectors = np.asarray(store.raw_vectors[rows], dtype=np.float32)
+
+    print(f"Modelo: {model_name} | {len(texts)} chunks de {num_chunks} | {len(SAMPLE_QUESTIONS)} perguntas x {args.rounds}")
+    measured = {}
+    for spec in args.backends:
+        print(f"Medindo backend '{spec}'...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            try:
+                measured[spec] = pool.submit(measure_backend, spec, model_name, normalize, SAMPLE_QUESTIONS,
+                                             texts, args.rounds, args.batch_size).result()
+            except Exception as e:
+                print(f"  falhou: {e}")
+                measured[spec] = {"error": str(e)}
+
+    reference = measured.get("torch", {})
+    reference_queries = reference.get("query_vectors")
+    report = {"run": run_metadata(), "model": model_name, "sample_chunks": len(texts), "k": args.k, "backends": {}}
+    for spec, result in measured.items():
+        if "error" in result:
+            report["backends"][spec] = result
+            continue
+        cosines = cosine_rows(result.pop("chunk_vectors"), index_vectors)
+        query_vectors = result.pop("query_vectors")
+        result["chunk_cosine_vs_index"] = {"mean": float(cosines.mean()), "min": float(cosines.min())}
+        if reference_queries is not None:
+            result["query_topk_overlap_vs_torch"] = topk_overlap(store, reference_queries, query_vectors, args.k)
+        report["backends"][spec] = result
+
+    print(f"\n{'backend':<42} {'cos médio':>9} {'cos mín':>8} {'top-k':>6} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'chunks/s':>9} {'RSS MB':>8} {'carga s':>8}")
+    for spec, result in report["backends"].items():
+        if "error" in result:
+            print(f"{spec:<42} erro: {result['error']}")
+            continue
+        overlap = result.get("query_topk_overlap_vs_torch")
+        print(f"{spec:<42} {result['chunk_cosine_vs_index']['mean']:9.5f} {result['chunk_cosine_vs_index']['min']:8.5f} "
+              f"{overlap if overlap is not None else float('nan'):6.2f} {result['query_ms']['p50']:8.2f} "
+              f"{result['query_ms']['p95']:8.2f} {result['batch_chunks_per_second']:9.1f} "
+              f"{result['rss_model_mb']:8.0f} {result['load_seconds']:8.1f}")
+    if args.output:
+        write_results(args.output, report)
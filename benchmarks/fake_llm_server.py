@@ -0,0 +1,88 @@
+"""
+LLM falso, compatível com a API de chat completions da OpenAI (o que o gateway usa),
+para benchmarks sem rede e sem custo. A resposta é determinística (derivada do
+prompt) e a latência é configurável: tempo até o primeiro token e intervalo entre
+tokens, com ou sem streaming.
+
+Uso:
+    python benchmarks/fake_llm_server.py --port 8100 --ttft-ms 300 --token-ms 20 --tokens 60
+    LLM_BASE_URL=http://127.0.0.1:8100/v1 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = ("marketing", "tribo", "lançamento", "cliente", "valor", "confiança", "história", "produto",
+         "comunidade", "mudança", "generosidade", "fã", "mensagem", "público", "promessa", "prática")
+
+
+def fake_answer_tokens(prompt: str, num_tokens: int):
+    """Sequência determinística de palavras a partir do hash do prompt."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    return [("" if i == 0 else " ") + WORDS[digest[i % len(digest)] % len(WORDS)] for i in range(num_tokens)]
+
+
+def create_app(ttft_ms: float, token_ms: float, num_tokens: int) -> FastAPI:
+    app = FastAPI(title="LLM falso para benchmarks")
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        model = body.get("model", "fake")
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        tokens = fake_answer_tokens(prompt, num_tokens)
+        created = int(time.time())
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(tokens),
+                 "total_tokens": len(prompt) // 4 + len(tokens)}
+
+        if not body.get("stream"):
+            await asyncio.sleep((ttft_ms + token_ms * max(0, len(tokens) - 1)) / 1000)
+            return JSONResponse({
+                "id": "fake-1", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        async def events():
+            await asyncio.sleep(ttft_ms / 1000)
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(token_ms / 1000)
+                chunk = {"id": "fake-1", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            final = {"id": "fake-1", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Servidor de LLM falso (API OpenAI) com latência configurável.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="Tempo até o primeiro token.")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="Intervalo entre tokens.")
+    parser.add_argument("--tokens", type=int, default=60, help="Tokens por resposta.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(create_app(args.ttft_ms, args.token_ms, args.tokens), host=args.host, port=args.port, log_level="warning")
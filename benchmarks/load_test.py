@@ -0,0 +1,218 @@
+"""
+Teste de carga do /api/v1/chat/ask/ (ou /ask/stream) com a aplicação real: índice
+distribuído (faiss_index_multi_author), modelo de embedding real e o LLM falso de
+benchmarks/fake_llm_server.py, para que só o nosso código e a latência simulada do
+LLM entrem na medida.
+
+Por padrão sobe os dois servidores (LLM falso + uvicorn) em subprocessos, com o
+cache de respostas desligado e RAG_DEBUG_TIMINGS ligado: cada resposta traz os
+tempos por etapa, e o relatório mostra RPS e p50/p95/p99 do cliente e de cada etapa.
+
+Uso:
+    python benchmarks/load_test.py --concurrency 8 --requests 200 --output carga.json
+    python benchmarks/load_test.py --endpoint stream --llm-ttft-ms 500 --llm-token-ms 30
+    python benchmarks/load_test.py --url http://localhost:8000   # app já rodando
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_utils import SAMPLE_QUESTIONS, run_metadata, summarize, write_results
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ASK_PATH = "/api/v1/chat/ask/"
+STREAM_PATH = "/api/v1/chat/ask/stream"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_servers(args):
+    """Sobe o LLM falso e a aplicação; retorna (url da aplicação, processos)."""
+    llm_port, app_port = free_port(), free_port()
+    fake_llm = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, "benchmarks", "fake_llm_server.py"), "--port", str(llm_port),
+         "--ttft-ms", str(args.llm_ttft_ms), "--token-ms", str(args.llm_token_ms), "--tokens", str(args.llm_tokens)],
+        cwd=REPO_ROOT,
+    )
+    env = dict(os.environ)
+    env.update({
+        "LLM_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "OPENROUTER_API_KEY": env.get("OPENROUTER_API_KEY") or "benchmark",
+        "RAG_DEBUG_TIMINGS": "true",
+        "ANSWER_CACHE_ENABLED": "true" if args.cache else "false",
+    })
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+         "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+    return f"http://127.0.0.1:{app_port}", [app, fake_llm]
+
+
+def stop_servers(processes):
+    """Encerra os subprocessos; quem não sair em 30 s é morto (uma falha aqui não esconde o erro do teste)."""
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def wait_until_ready(url, timeout):
+    """Espera o servidor responder e uma pergunta de teste dar 200 (modelo e índice carregados)."""
+    deadline = time.monotonic() + timeout
+    with httpx.Client(timeout=60) as client:
+        while time.monotonic() < deadline:
+            try:
+                response = client.post(url + ASK_PATH, json={"query": SAMPLE_QUESTIONS[0]})
+            except httpx.TransportError:
+                time.sleep(0.5)
+                continue
+            if response.status_code == 200:
+                return
+            if response.status_code != 503:
+                raise RuntimeError(f"Pergunta de teste falhou: {response.status_code} {response.text[:300]}")
+            time.sleep(0.5)
+    raise RuntimeError(f"Aplicação não ficou pronta em {timeout}s.")
+
+
+async def ask_once(client, url, query):
+    start = time.perf_counter()
+    response = await client.post(url + ASK_PATH, json={"query": query})
+    latency = time.perf_counter() - start
+    timings = response.json().get("timings") if response.status_code == 200 else None
+    return {"status": response.status_code, "latency_ms": latency * 1000, "first_token_ms": None, "timings": timings}
+
+
+async def stream_once(client, url, query):
+    start = time.perf_counter()
+    first_token = None
+    timings = None
+    event = None
+    async with client.stream("POST", url + STREAM_PATH, json={"query": query}) as response:
+        if response.status_code == 200:
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    if event == "token" and first_token is None:
+                        first_token = (time.perf_counter() - start) * 1000
+                    elif event == "done":
+                        timings = json.loads(line[len("data: "):]).get("timings")
+        else:
+            await response.aread()
+    latency = time.perf_counter() - start
+    return {"status": response.status_code, "latency_ms": latency * 1000, "first_token_ms": first_token, "timings": timings}
+
+
+async def drive(url, endpoint, num_requests, concurrency, warmup):
+    send = stream_once if endpoint == "stream" else ask_once
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        for i in range(warmup):
+            await send(client, url, SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)])
+
+        results = []
+        next_index = 0
+
+        async def worker():
+            nonlocal next_index
+            while next_index < num_requests:
+                index = next_index
+                next_index += 1
+                try:
+                    results.append(await send(client, url, SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)]))
+                except httpx.HTTPError as e:
+                    results.append({"status": type(e).__name__, "latency_ms": None, "first_token_ms": None, "timings": None})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results, time.perf_counter() - start
+
+
+def build_report(results, wall_seconds, args):
+    ok = [r for r in results if r["status"] == 200]
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    stages = {}
+    for r in ok:
+        for stage, ms in (r["timings"] or {}).items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "run": run_metadata(),
+        "config": {
+            "endpoint": args.endpoint, "requests": args.requests, "concurrency": args.concurrency,
+            "warmup": args.warmup, "cache": args.cache, "url": args.url,
+            "llm_ttft_ms": args.llm_ttft_ms, "llm_token_ms": args.llm_token_ms, "llm_tokens": args.llm_tokens,
+        },
+        "wall_seconds": wall_seconds,
+        "rps": len(ok) / wall_seconds if wall_seconds else 0.0,
+        "statuses": statuses,
+        "client_latency_ms": summarize([r["latency_ms"] for r in ok]),
+        "client_first_token_ms": summarize([r["first_token_ms"] for r in ok if r["first_token_ms"] is not None]),
+        "stages_ms": {stage: summarize(values) for stage, values in stages.items()},
+    }
+
+
+def print_report(report):
+    print(f"\n{report['config']['requests']} requisições, concorrência {report['config']['concurrency']}, "
+          f"{report['wall_seconds']:.1f}s -> {report['rps']:.2f} req/s; status: {report['statuses']}")
+    print(f"\n{'etapa (ms)':<18} {'p50':>9} {'p95':>9} {'p99':>9} {'n':>6}")
+    rows = [("cliente", report["client_latency_ms"]), ("cliente 1º token", report["client_first_token_ms"])]
+    rows += sorted(report["stages_ms"].items())
+    for name, summary in rows:
+        if summary.get("count"):
+            print(f"{name:<18} {summary['p50']:9.2f} {summary['p95']:9.2f} {summary['p99']:9.2f} {summary['count']:6d}")
+    if not report["stages_ms"]:
+        print("(sem tempos por etapa: a aplicação precisa de RAG_DEBUG_TIMINGS=true)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Teste de carga do /chat/ask com o índice real e um LLM falso.")
+    parser.add_argument("--url", help="Aplicação já rodando (ex.: http://localhost:8000); por padrão sobe uma com o LLM falso.")
+    parser.add_argument("--endpoint", choices=("ask", "stream"), default="ask")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5, help="Requisições iniciais fora da medida.")
+    parser.add_argument("--cache", action="store_true", help="Mantém o cache de respostas ligado (padrão: desligado).")
+    parser.add_argument("--llm-ttft-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-ms", type=float, default=20.0)
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Grava o relatório em JSON.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    processes = []
+    url = args.url
+    try:
+        if url is None:
+            url, processes = start_servers(args)
+        wait_until_ready(url, args.startup_timeout)
+        results, wall_seconds = asyncio.run(drive(url, args.endpoint, args.requests, args.concurrency, args.warmup))
+        # Só há relatório se a carga rodou até o fim; qualquer falha acima sai com o erro original
+        report = build_report(results, wall_seconds, args)
+        print_report(report)
+        if args.output:
+            write_results(args.output, report)
+    finally:
+        stop_servers(processes)
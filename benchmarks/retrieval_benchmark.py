@@ -0,0 +1,141 @@
+"""
+Microbenchmarks do lado de recuperação, com o índice distribuído e o modelo de
+embedding real (o registrado no manifest.json):
+
+- load: carga do índice (ChunkVectorStore.load, com e sem mmap) e do modelo de embedding;
+- query: embedding da pergunta e recuperação completa de uma pergunta (busca vetorial +
+  BM25 + fusão, MMR e montagem do contexto), com o tempo de cada etapa;
+- build: construção do índice FAISS (por spec), do chunk store e do índice lexical a
+  partir dos chunks e vetores já existentes (sem reprocessar PDFs); com --embed-corpus,
+  também o embedding de N chunks.
+
+Uso:
+    python benchmarks/retrieval_benchmark.py --output recuperacao.json
+    python benchmarks/retrieval_benchmark.py --only query --rounds 20
+    python benchmarks/retrieval_benchmark.py --only build --build-specs Flat HNSW32 "IVF64,Flat" --embed-corpus 256
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import settings
+from app.services import rag_service
+from app.services.chunk_store import ChunkStore
+from app.services.lexical_index import LexicalIndex
+from app.services.metrics import RequestTimings
+from app.services.vector_store import ChunkVectorStore
+from benchmarks.bench_utils import SAMPLE_QUESTIONS, active_index_path, run_metadata, summarize, write_results
+
+SECTIONS = ("load", "query", "build")
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def bench_load(index_root, repeat):
+    index_path = active_index_path(index_root)
+    results = {}
+    for mmap in (True, False):
+        samples = []
+        for _ in range(repeat):
+            store, ms = timed(ChunkVectorStore.load, index_path, None, mmap=mmap)
+            samples.append(ms)
+            store.chunk_store.close()
+        results[f"index_load_mmap_{str(mmap).lower()}_ms"] = summarize(samples)
+    # Modelo de embedding + índice, como no startup da aplicação
+    _, ms = timed(rag_service._load_index_components)
+    results["startup_components_ms"] = ms
+    return results
+
+
+def bench_query(rounds):
+    store = rag_service.vector_store_global
+    embeddings = rag_service.embeddings_model_global
+    embeddings.embed_query(SAMPLE_QUESTIONS[0]) # aquecimento (primeira inferência é mais lenta)
+    samples = {"embedding": [], "retrieval_total": []}
+    for _ in range(rounds):
+        for question in SAMPLE_QUESTIONS:
+            embedding, embed_ms = timed(embeddings.embed_query, question)
+            timings = RequestTimings("benchmark")
+            _, retrieval_ms = timed(rag_service._search_documents, store, question, embedding,
+                                    rag_service.RETRIEVAL_K, None, timings)
+            samples["embedding"].append(embed_ms)
+            samples["retrieval_total"].append(retrieval_ms)
+            for stage, ms in timings.as_dict().items():
+                samples.setdefault(stage, []).append(ms)
+    return {stage: summarize(values) for stage, values in samples.items()}
+
+
+def bench_build(specs, embed_corpus):
+    from preprocess_and_create_index import build_faiss_index, embed_in_batches
+
+    store = rag_service.vector_store_global
+    chunk_store = store.chunk_store
+    texts = [chunk_store.text(row) for row in range(len(chunk_store))]
+    metadatas = [chunk_store.metadata(row) for row in range(len(chunk_store))]
+    vectors = np.ascontiguousarray(store.raw_vectors if store.raw_vectors is not None
+                                   else store.index.reconstruct_n(0, store.index.ntotal), dtype=np.float32)
+    results = {"num_chunks": len(texts)}
+    for spec in specs:
+        _, ms = timed(build_faiss_index, vectors, vectors.shape[1], spec)
+        results[f"faiss_build_{spec}_ms"] = ms
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _, results["chunk_store_write_ms"] = timed(ChunkStore.write, tmp_dir, texts, metadatas)
+        _, results["lexical_build_ms"] = timed(LexicalIndex.build, tmp_dir, texts, metadatas)
+    if embed_corpus:
+        sample = texts[:embed_corpus]
+        _, ms = timed(embed_in_batches, rag_service.embeddings_model_global, sample, 64)
+        results["embed_corpus"] = {"chunks": len(sample), "ms": ms, "chunks_per_second": len(sample) / (ms / 1000)}
+    return results
+
+
+def print_section(name, results):
+    print(f"\n== {name} ==")
+    for key, value in results.items():
+        if isinstance(value, dict) and "p50" in value:
+            print(f"  {key:<28} p50 {value['p50']:9.3f}  p95 {value['p95']:9.3f}  p99 {value['p99']:9.3f} ms  (n={value['count']})")
+        elif isinstance(value, float):
+            print(f"  {key:<28} {value:9.2f} ms")
+        else:
+            print(f"  {key:<28} {value}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de carga do índice, recuperação e construção.")
+    parser.add_argument("--index-path", default=settings.FAISS_INDEX_PATH)
+    parser.add_argument("--only", choices=SECTIONS, nargs="*", help="Seções a rodar (padrão: todas).")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições da carga do índice.")
+    parser.add_argument("--rounds", type=int, default=10, help="Passadas pela lista de perguntas.")
+    parser.add_argument("--build-specs", nargs="*", default=["Flat", "HNSW32"])
+    parser.add_argument("--embed-corpus", type=int, default=0, help="Mede o embedding dos N primeiros chunks (0 = não mede).")
+    parser.add_argument("--output", help="Grava os resultados em JSON.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    settings.FAISS_INDEX_PATH = args.index_path
+    sections = args.only or SECTIONS
+    report = {"run": run_metadata(), "index_path": args.index_path}
+    if "load" in sections:
+        report["load"] = bench_load(args.index_path, args.repeat)
+    elif not rag_service._load_index_components():
+        sys.exit("Não foi possível carregar o índice/modelo de embedding.")
+    if "query" in sections:
+        report["query"] = bench_query(args.rounds)
+    if "build" in sections:
+        report["build"] = bench_build(args.build_specs, args.embed_corpus)
+    for name in SECTIONS:
+        if name in report:
+            print_section(name, report[name])
+    if args.output:
+        write_results(args.output, report)
@@ -0,0 +1,32 @@
+# Configuração do gunicorn para rodar a API com vários workers uvicorn.
+# Uso: gunicorn -c gunicorn.conf.py app.main:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# WEB_CONCURRENCY define o número de workers (padrão: 1). Use "auto" para um worker por núcleo.
+_web_concurrency = os.environ.get("WEB_CONCURRENCY", "1")
+workers = multiprocessing.cpu_count() if _web_concurrency == "auto" else int(_web_concurrency)
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# Divide os núcleos entre os workers para o PyTorch/OpenMP não criar N threads por worker.
+# Precisa estar no ambiente antes de o torch ser importado (no preload abaixo).
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, multiprocessing.cpu_count() // workers)))
+
+# Importa a aplicação no processo mestre, antes do fork.
+preload_app = True
+
+
+def on_starting(server):
+    # Modelo de embedding e índice (mmap) carregados uma vez no mestre; os workers
+    # herdam as páginas via copy-on-write em vez de cada um carregar sua cópia.
+    from app.services.rag_service import preload_shared_components
+    preload_shared_components()
+
+
+def child_exit(server, worker):
+    # Com PROMETHEUS_MULTIPROC_DIR, descarta os gauges do worker que saiu
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
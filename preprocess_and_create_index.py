@@ -1,20 +1,37 @@
 import os
 import json
+import argparse
+import hashlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter # Atualizado para o novo local
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+import faiss
+import numpy as np
+from app.services.chunk_store import ChunkStore, chunk_store_exists
+from app.services.embeddings import create_embeddings
+from app.services.index_manifest import build_manifest, read_manifest, write_manifest
+from app.services.index_versions import active_index, copy_index_files, new_version_name, prune_index_versions, publish_index_version
+from app.services.lexical_index import LexicalIndex
+from app.services.vector_store import INDEX_FILENAME, VECTORS_FILENAME
 import time # Para medir o tempo
 
 # --- CONFIGURAÇÕES ---
 PDF_SOURCES_DIR = "pdf_sources"
 PDF_METADATA_FILE = "pdf_metadata.json"
-# Modelo de embedding que planejamos usar no backend também
+# Modelo de embedding que planejamos usar no backend também.
+# Fica registrado no manifest.json do índice e o backend passa a usá-lo automaticamente.
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+NORMALIZE_EMBEDDINGS = False
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 # Nome da pasta onde o índice FAISS será salvo
-FAISS_INDEX_PATH = "faiss_index_multi_author" 
+FAISS_INDEX_PATH = "faiss_index_multi_author"
+EMBEDDING_BATCH_SIZE = 64
+# Tipo do índice FAISS (string do faiss.index_factory): "Flat" (busca exata), "HNSW32",
+# "IVF256,Flat", "IVF256,PQ32"... Os índices IVF/PQ são treinados com os próprios vetores.
+INDEX_SPEC = "Flat"
+PARSE_WORKERS = os.cpu_count() or 1
 
 def load_pdf_metadata():
     if os.path.exists(PDF_METADATA_FILE):
@@ -23,11 +40,175 @@ def load_pdf_metadata():
     print(f"AVISO: Arquivo de metadados '{PDF_METADATA_FILE}' não encontrado. Os metadados de autor/livro usarão padrões.")
     return {}
 
-def create_index():
+def manifest_allows_incremental(manifest, embedding_model_name):
+    """
+    O manifesto (hash, autor e título de cada PDF) só serve se o modelo e a divisão em chunks não mudaram.
+    Sem a lista de PDFs ("files" ausente ou null, como no índice de exemplo) não há com o que comparar.
+    """
+    if manifest is None or manifest.get("files") is None:
+        return False
+    return (manifest.get("embedding_model") == embedding_model_name
+            and manifest.get("normalize_embeddings") == NORMALIZE_EMBEDDINGS
+            and manifest.get("chunk_size") == CHUNK_SIZE
+            and manifest.get("chunk_overlap") == CHUNK_OVERLAP)
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_and_split_pdf(pdf_filename, file_path, author, book_title):
+    """Carrega um PDF e divide em chunks. Roda num processo do pool, por isso é uma função de módulo."""
+    loader = PyMuPDFLoader(file_path)
+    documents_from_pdf = loader.load() # Lista de Document, um por página
+
+    for doc_page in documents_from_pdf:
+        doc_page.metadata["author"] = author
+        doc_page.metadata["book_title"] = book_title
+        doc_page.metadata["source_pdf"] = pdf_filename # Usado para remover os chunks se o PDF mudar
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        is_separator_regex=False, # Default é False, bom para texto geral
+    )
+    return text_splitter.split_documents(documents_from_pdf)
+
+def scan_pdf_sources(pdf_metadata):
+    """Lista os PDFs com hash de conteúdo e autor/título (uma mudança nos metadados também conta como alteração)."""
+    sources = {}
+    for pdf_filename in sorted(os.listdir(PDF_SOURCES_DIR)):
+        if not pdf_filename.lower().endswith(".pdf"):
+            continue
+        file_path = os.path.join(PDF_SOURCES_DIR, pdf_filename)
+        # Se o nome do arquivo não estiver no JSON, usa valores padrão
+        metadata_for_file = pdf_metadata.get(pdf_filename, {})
+        sources[pdf_filename] = {
+            "path": file_path,
+            "sha256": file_sha256(file_path),
+            "author": metadata_for_file.get("author", "Autor Desconhecido"),
+            "book_title": metadata_for_file.get("book_title", pdf_filename.replace('.pdf', '').replace('_', ' ').title()),
+        }
+    return sources
+
+def parse_pdfs_in_parallel(pdfs_to_process, workers):
+    """Carrega e divide os PDFs num pool de processos. Retorna {nome_do_pdf: [chunks]}."""
+    chunks_by_file = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(load_and_split_pdf, name, info["path"], info["author"], info["book_title"]): name
+            for name, info in pdfs_to_process.items()
+        }
+        for future, pdf_filename in futures.items():
+            info = pdfs_to_process[pdf_filename]
+            try:
+                docs_split_from_file = future.result()
+            except Exception as e:
+                print(f"  ERRO ao processar '{pdf_filename}': {e}")
+                continue # Pula para o próximo arquivo se houver erro em um
+            chunks_by_file[pdf_filename] = docs_split_from_file
+            print(f"  '{pdf_filename}' ({info['author']} - {info['book_title']}) dividido em {len(docs_split_from_file)} chunks.")
+    return chunks_by_file
+
+def embed_in_batches(embeddings, texts, batch_size):
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+        print(f"  Embeddings: {min(start + batch_size, len(texts))}/{len(texts)}", end="\r")
+    if texts:
+        print()
+    return vectors
+
+def build_faiss_index(vectors, dimension, index_spec):
+    """Cria o índice descrito por index_spec (faiss.index_factory), treinando-o se for IVF/PQ."""
+    index = faiss.index_factory(dimension, index_spec)
+    if len(vectors) and not index.is_trained:
+        print(f"  Treinando índice '{index_spec}' com {len(vectors)} vetores...")
+        index.train(vectors)
+    if len(vectors):
+        index.add(vectors)
+    return index
+
+def build_derived_indexes(texts, metadatas):
+    """Índices auxiliares calculados a partir dos chunks: por enquanto, o lexical (BM25, com autor e título)."""
+    stage_start = time.time()
+    LexicalIndex.build(FAISS_INDEX_PATH, texts, metadatas)
+    print(f"  Índice lexical (BM25) criado em {time.time() - stage_start:.2f} s.")
+
+def rebuild_derived_indexes():
+    """Regera os índices auxiliares a partir do chunk store existente, sem reprocessar PDFs nem embeddings."""
+    store = ChunkStore(FAISS_INDEX_PATH)
+    texts = [store.text(row) for row in range(len(store))]
+    metadatas = [store.metadata(row) for row in range(len(store))]
+    store.close()
+    build_derived_indexes(texts, metadatas)
+
+def load_previous_vectors(old_index):
+    """Vetores do índice atual, na ordem das linhas: do vectors.npy ou, para Flat, reconstruídos sem perda."""
+    vectors_file = os.path.join(FAISS_INDEX_PATH, VECTORS_FILENAME)
+    if os.path.exists(vectors_file):
+        return np.load(vectors_file)
+    return old_index.reconstruct_n(0, old_index.ntotal)
+
+def save_index_files(index, texts, metadatas, raw_vectors=None):
+    """Grava index.faiss, o chunk store (textos + author/book_title/source_pdf/page) e, se houver, os vetores originais."""
+    tmp_index_file = os.path.join(FAISS_INDEX_PATH, INDEX_FILENAME + ".tmp")
+    faiss.write_index(index, tmp_index_file)
+    os.replace(tmp_index_file, os.path.join(FAISS_INDEX_PATH, INDEX_FILENAME))
+    ChunkStore.write(FAISS_INDEX_PATH, texts, metadatas)
+    build_derived_indexes(texts, metadatas)
+
+    vectors_file = os.path.join(FAISS_INDEX_PATH, VECTORS_FILENAME)
+    if raw_vectors is not None:
+        with open(vectors_file + ".tmp", "wb") as f:
+            np.save(f, raw_vectors)
+        os.replace(vectors_file + ".tmp", vectors_file)
+    elif os.path.exists(vectors_file):
+        os.remove(vectors_file) # Flat guarda os vetores exatos no próprio index.faiss
+
+def migrate_legacy_docstore():
+    """
+    Converte um índice antigo (index.pkl do langchain) para o chunk store e remove o
+    index.pkl. Único ponto que ainda desserializa o pickle; rode só com índices confiáveis.
+    """
+    import pickle
+    legacy_file = os.path.join(FAISS_INDEX_PATH, "index.pkl")
+    if not os.path.exists(legacy_file):
+        print(f"Nada a migrar: '{legacy_file}' não existe.")
+        return
+    with open(legacy_file, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    texts, metadatas = [], []
+    for row in range(len(index_to_docstore_id)):
+        doc = docstore.search(index_to_docstore_id[row])
+        source = doc.metadata.get("source_pdf") or doc.metadata.get("source")
+        texts.append(doc.page_content)
+        metadatas.append({
+            "author": doc.metadata.get("author"),
+            "book_title": doc.metadata.get("book_title"),
+            "source_pdf": os.path.basename(source.replace("\\", "/")) if source else None,
+            "page": doc.metadata.get("page"),
+        })
+    ChunkStore.write(FAISS_INDEX_PATH, texts, metadatas)
+    build_derived_indexes(texts, metadatas)
+    os.remove(legacy_file)
+    print(f"{len(texts)} chunks migrados para o chunk store em '{FAISS_INDEX_PATH}'; index.pkl removido.")
+
+def directory_size_mb(path):
+    total_size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for f in filenames:
+            total_size += os.path.getsize(os.path.join(dirpath, f))
+    return total_size / (1024 * 1024)
+
+def create_index(full_rebuild=False, workers=PARSE_WORKERS, batch_size=EMBEDDING_BATCH_SIZE,
+                 embedding_model_name=EMBEDDING_MODEL_NAME, index_spec=INDEX_SPEC):
     start_time = time.time()
+    timings = {}
     print("Iniciando processo de criação do índice FAISS...")
-    pdf_metadata = load_pdf_metadata()
-    all_docs_split = [] # Lista para guardar todos os chunks de todos os livros
 
     if not os.path.exists(PDF_SOURCES_DIR) or not os.listdir(PDF_SOURCES_DIR):
         print(f"ERRO: Diretório de PDFs '{PDF_SOURCES_DIR}' não encontrado ou está vazio.")
@@ -35,53 +216,104 @@ def create_index():
         return
 
     print(f"Procurando PDFs em: {os.path.abspath(PDF_SOURCES_DIR)}")
+    stage_start = time.time()
+    sources = scan_pdf_sources(load_pdf_metadata())
+    timings["hash"] = time.time() - stage_start
 
-    for pdf_filename in os.listdir(PDF_SOURCES_DIR):
-        if pdf_filename.lower().endswith(".pdf"):
-            file_path = os.path.join(PDF_SOURCES_DIR, pdf_filename)
-            print(f"\nProcessando PDF: {pdf_filename}...")
-            
-            try:
-                loader = PyMuPDFLoader(file_path)
-                documents_from_pdf = loader.load() # Lista de Document, um por página
-
-                # Adicionar metadados de autor e título
-                # Se o nome do arquivo não estiver no JSON, usa valores padrão
-                metadata_for_file = pdf_metadata.get(pdf_filename, {})
-                author = metadata_for_file.get("author", "Autor Desconhecido")
-                book_title = metadata_for_file.get("book_title", pdf_filename.replace('.pdf', '').replace('_', ' ').title())
-
-                print(f"  Autor: {author}, Título: {book_title}")
-
-                for doc_page in documents_from_pdf:
-                    doc_page.metadata["author"] = author
-                    doc_page.metadata["book_title"] = book_title
-                    # doc_page.metadata["source_pdf"] = pdf_filename # Adicionar nome do arquivo de origem também
-
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=CHUNK_SIZE,
-                    chunk_overlap=CHUNK_OVERLAP,
-                    length_function=len,
-                    is_separator_regex=False, # Default é False, bom para texto geral
-                )
-                docs_split_from_file = text_splitter.split_documents(documents_from_pdf)
-                all_docs_split.extend(docs_split_from_file)
-                print(f"  '{pdf_filename}' dividido em {len(docs_split_from_file)} chunks.")
-            except Exception as e:
-                print(f"  ERRO ao processar '{pdf_filename}': {e}")
-                continue # Pula para o próximo arquivo se houver erro em um
+    # --- Decide entre atualização incremental e reconstrução completa ---
+    manifest = None if full_rebuild else read_manifest(FAISS_INDEX_PATH)
+    index_exists = os.path.exists(os.path.join(FAISS_INDEX_PATH, INDEX_FILENAME)) and chunk_store_exists(FAISS_INDEX_PATH)
+    if index_exists and manifest_allows_incremental(manifest, embedding_model_name):
+        previous_files = manifest.get("files", {})
+        pdfs_to_process = {
+            name: info for name, info in sources.items()
+            if name not in previous_files
+            or previous_files[name]["sha256"] != info["sha256"]
+            or previous_files[name]["author"] != info["author"]
+            or previous_files[name]["book_title"] != info["book_title"]
+        }
+        # Os chunks desses PDFs saem do índice pela coluna source_pdf do chunk store
+        removed_or_changed = {name for name in previous_files if name not in sources or name in pdfs_to_process}
+        print(f"Modo incremental: {len(pdfs_to_process)} PDF(s) novo(s)/alterado(s), "
+              f"{len([n for n in previous_files if n not in sources])} removido(s), "
+              f"{len(sources) - len(pdfs_to_process)} sem alteração.")
+        if not pdfs_to_process and not removed_or_changed and manifest.get("index_spec", "Flat") == index_spec:
+            print("Índice já está atualizado. Nada a fazer.")
+            return False
+    else:
+        if not full_rebuild and index_exists:
+            print("AVISO: Índice existente sem manifesto compatível (modelo/chunks mudaram ou índice antigo); fazendo reconstrução completa.")
+        manifest = None
+        previous_files = {}
+        pdfs_to_process = dict(sources)
+        removed_or_changed = set()
 
-    if not all_docs_split:
+    # --- Etapa 1: leitura e divisão dos PDFs em paralelo ---
+    print(f"\nProcessando {len(pdfs_to_process)} PDF(s) com {workers} processo(s)...")
+    stage_start = time.time()
+    chunks_by_file = parse_pdfs_in_parallel(pdfs_to_process, workers) if pdfs_to_process else {}
+    timings["parse"] = time.time() - stage_start
+
+    texts, metadatas = [], []
+    files_manifest = {
+        # Manifestos antigos também guardavam os IDs dos chunks, que não são usados
+        name: {key: entry[key] for key in ("sha256", "author", "book_title")}
+        for name, entry in previous_files.items() if name in sources and name not in pdfs_to_process
+    }
+    for pdf_filename, docs_split_from_file in chunks_by_file.items():
+        info = sources[pdf_filename]
+        for doc in docs_split_from_file:
+            texts.append(doc.page_content)
+            metadatas.append(doc.metadata)
+        files_manifest[pdf_filename] = {
+            "sha256": info["sha256"],
+            "author": info["author"],
+            "book_title": info["book_title"],
+        }
+
+    if manifest is None and not texts:
         print("Nenhum documento foi processado com sucesso. O índice não será criado.")
-        return
+        return False
+
+    print(f"\nTotal de chunks novos a serem indexados: {len(texts)}")
 
-    print(f"\nTotal de chunks de todos os PDFs a serem indexados: {len(all_docs_split)}")
+    # --- Etapa 2: embeddings em lotes ---
+    stage_start = time.time()
+    print(f"Carregando modelo de embedding: {embedding_model_name}...")
+    embeddings = create_embeddings(embedding_model_name, normalize_embeddings=NORMALIZE_EMBEDDINGS)
+    timings["model_load"] = time.time() - stage_start
 
-    print(f"Carregando modelo de embedding: {EMBEDDING_MODEL_NAME}...")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    print(f"Gerando embeddings em lotes de {batch_size}... Isso pode levar vários minutos dependendo do número de chunks.")
+    stage_start = time.time()
+    vectors = embed_in_batches(embeddings, texts, batch_size)
+    timings["embed"] = time.time() - stage_start
 
-    print("Criando índice FAISS a partir dos documentos... Isso pode levar vários minutos dependendo do número de chunks.")
-    vector_store = FAISS.from_documents(all_docs_split, embeddings)
+    # --- Etapa 3: criação/atualização do índice ---
+    # A linha i do índice FAISS corresponde ao chunk i do chunk store: o índice é
+    # remontado com os vetores mantidos (na ordem antiga) seguidos dos novos.
+    stage_start = time.time()
+    new_vectors = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1) if texts else None
+    removed_chunks = 0
+    if manifest is not None:
+        print(f"Atualizando índice existente em '{FAISS_INDEX_PATH}'...")
+        old_index = faiss.read_index(os.path.join(FAISS_INDEX_PATH, INDEX_FILENAME))
+        old_store = ChunkStore(FAISS_INDEX_PATH)
+        kept_rows = [row for row in range(len(old_store)) if old_store.source(row) not in removed_or_changed]
+        kept_texts = [old_store.text(row) for row in kept_rows]
+        kept_metadatas = [old_store.metadata(row) for row in kept_rows]
+        kept_vectors = load_previous_vectors(old_index)[kept_rows]
+        removed_chunks = len(old_store) - len(kept_rows)
+        old_store.close()
+        print(f"  {removed_chunks} chunks removidos, {len(texts)} chunks adicionados.")
+        all_vectors = np.vstack([kept_vectors, new_vectors]) if new_vectors is not None else kept_vectors
+        texts, metadatas = kept_texts + texts, kept_metadatas + metadatas
+        dimension = old_index.d
+    else:
+        print("Criando índice FAISS a partir dos embeddings...")
+        all_vectors = new_vectors
+        dimension = new_vectors.shape[1]
+    index = build_faiss_index(all_vectors, dimension, index_spec)
+    timings["index"] = time.time() - stage_start
 
     # Criar a pasta do índice se não existir
     if not os.path.exists(FAISS_INDEX_PATH):
@@ -89,26 +321,87 @@ def create_index():
         print(f"Pasta do índice '{FAISS_INDEX_PATH}' criada.")
 
     print(f"Salvando índice FAISS em: {FAISS_INDEX_PATH}")
-    vector_store.save_local(FAISS_INDEX_PATH)
-    
+    stage_start = time.time()
+    save_index_files(index, texts, metadatas, all_vectors if index_spec != "Flat" else None)
+    write_manifest(FAISS_INDEX_PATH, build_manifest(
+        embedding_model=embedding_model_name,
+        dimension=index.d,
+        normalize_embeddings=NORMALIZE_EMBEDDINGS,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        files=files_manifest,
+        num_vectors=index.ntotal,
+        index_spec=index_spec,
+    ))
+    timings["save"] = time.time() - stage_start
+
     end_time = time.time()
     print("\n--- RESUMO DA CRIAÇÃO DO ÍNDICE ---")
-    print(f"Índice FAISS criado e salvo com sucesso em '{FAISS_INDEX_PATH}'.")
+    print(f"Índice FAISS {'atualizado' if manifest is not None else 'criado'} e salvo com sucesso em '{FAISS_INDEX_PATH}'.")
     print(f"Tempo total de processamento: {end_time - start_time:.2f} segundos.")
-    print(f"Número total de chunks indexados: {len(all_docs_split)}")
-    
+    for stage, seconds in timings.items():
+        print(f"  {stage:<11} {seconds:8.2f} s")
+    if timings["parse"] > 0 and new_vectors is not None:
+        print(f"Leitura/divisão: {len(new_vectors) / timings['parse']:.1f} chunks/s")
+    if timings["embed"] > 0 and new_vectors is not None:
+        print(f"Embeddings: {len(new_vectors) / timings['embed']:.1f} chunks/s")
+    print(f"Chunks novos indexados: {len(new_vectors) if new_vectors is not None else 0}; removidos: {removed_chunks}")
+    print(f"Número total de chunks no índice: {index.ntotal}")
+
     # Verificar o tamanho da pasta do índice (aproximado)
     try:
-        total_size = 0
-        for dirpath, dirnames, filenames in os.walk(FAISS_INDEX_PATH):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                total_size += os.path.getsize(fp)
-        print(f"Tamanho aproximado da pasta do índice: {total_size / (1024 * 1024):.2f} MB")
+        print(f"Tamanho aproximado da pasta do índice: {directory_size_mb(FAISS_INDEX_PATH):.2f} MB")
     except Exception as e:
         print(f"Não foi possível calcular o tamanho da pasta do índice: {e}")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cria ou atualiza o índice FAISS a partir dos PDFs em 'pdf_sources'.")
+    parser.add_argument("--full", action="store_true", help="Ignora o manifesto e reconstrói o índice do zero.")
+    parser.add_argument("--workers", type=int, default=PARSE_WORKERS, help="Processos para ler e dividir os PDFs.")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Chunks por lote de embeddings.")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME, help="Modelo de embedding (fica registrado no manifest.json).")
+    parser.add_argument("--index-spec", default=INDEX_SPEC,
+                        help='Tipo do índice FAISS (faiss.index_factory): "Flat", "HNSW32", "IVF256,Flat", "IVF256,PQ32"...')
+    parser.add_argument("--rebuild-derived", action="store_true", help="Regera os índices auxiliares (BM25) a partir do chunk store e sai.")
+    parser.add_argument("--migrate-legacy", action="store_true", help="Converte o index.pkl de um índice antigo para o chunk store e sai.")
+    parser.add_argument("--new-version", nargs="?", const="", metavar="NOME",
+                        help="Constrói numa pasta de versão nova dentro da pasta do índice e a publica (CURRENT) ao final; "
+                             "a API troca de versão sem reiniciar. Sem NOME, usa a data/hora.")
+    parser.add_argument("--keep-versions", type=int, default=2, help="Com --new-version: quantas versões manter em disco.")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    index_root = FAISS_INDEX_PATH
+    _, active_path = active_index(index_root)
+    new_version = None
+    if args.new_version is not None and not (args.migrate_legacy or args.rebuild_derived):
+        new_version = args.new_version or new_version_name()
+        FAISS_INDEX_PATH = os.path.join(index_root, new_version)
+        if os.path.exists(FAISS_INDEX_PATH):
+            raise SystemExit(f"A versão '{new_version}' já existe em '{index_root}'.")
+        if not args.full and os.path.exists(os.path.join(active_path, INDEX_FILENAME)):
+            # A versão nova parte de uma cópia da ativa, para a atualização continuar incremental
+            copy_index_files(active_path, FAISS_INDEX_PATH)
+    else:
+        # Com versões, as demais operações atuam na versão ativa
+        FAISS_INDEX_PATH = active_path
+    if args.migrate_legacy:
+        migrate_legacy_docstore()
+        raise SystemExit(0)
+    if args.rebuild_derived:
+        rebuild_derived_indexes()
+        raise SystemExit(0)
     print("Certifique-se de ter criado o arquivo 'pdf_metadata.json' e colocado os PDFs na pasta 'pdf_sources'.")
-    create_index()
\ No newline at end of file
+    built = create_index(full_rebuild=args.full, workers=args.workers, batch_size=args.batch_size,
+                         embedding_model_name=args.model, index_spec=args.index_spec)
+    if new_version is not None:
+        if not built:
+            shutil.rmtree(FAISS_INDEX_PATH, ignore_errors=True)
+            raise SystemExit("Nenhuma versão nova publicada.")
+        publish_index_version(index_root, new_version)
+        removed = prune_index_versions(index_root, args.keep_versions)
+        print(f"Versão '{new_version}' publicada em '{index_root}'. Versões removidas: {', '.join(removed) or 'nenhuma'}.")
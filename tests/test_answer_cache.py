@@ -0,0 +1,76 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import answer_cache
+from app.services.answer_cache import SemanticAnswerCache, normalize_query
+
+
+def _cache(**overrides):
+    params = {"max_entries": 2, "ttl_seconds": 60, "similarity_threshold": 0.9}
+    params.update(overrides)
+    return SemanticAnswerCache(**params)
+
+
+def test_normalize_query():
+    assert normalize_query("  Qual o SEGREDO   para uma vida plena?! ") == "qual o segredo para uma vida plena"
+
+
+def test_exact_and_semantic_hits():
+    cache = _cache()
+    cache.put("Qual o segredo para uma vida plena?", [1.0, 0.0, 0.0], {"answer": "A"})
+
+    assert cache.get_exact("qual o segredo para uma vida plena") == {"answer": "A"}
+    assert cache.get_exact("Qual é o segredo de uma vida plena?") is None
+    assert cache.get_similar([0.99, 0.05, 0.0]) == {"answer": "A"}
+    assert cache.get_exact("Como vender mais?") is None
+    assert cache.get_similar([0.0, 1.0, 0.0]) is None
+    stats = cache.stats()
+    assert (stats["lookups"], stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (3, 1, 1, 1)
+    assert stats["hit_rate"] == 2 / 3
+
+
+def test_lru_eviction_removes_vectors():
+    cache = _cache()
+    cache.put("a", [1.0, 0.0], {"answer": "a"})
+    cache.put("b", [0.0, 1.0], {"answer": "b"})
+    cache.get_exact("a")
+    cache.put("c", [-1.0, 0.0], {"answer": "c"})
+
+    assert len(cache) == 2
+    assert cache.get_exact("b") is None
+    assert cache.get_similar([0.0, 1.0]) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = _cache(ttl_seconds=10)
+    cache.put("a", [1.0, 0.0], {"answer": "a"})
+    now[0] += 11
+
+    assert cache.get_exact("a") is None
+    assert cache.get_similar([1.0, 0.0]) is None
+
+
+def test_invalidate_empties_both_levels():
+    cache = _cache()
+    cache.put("a", [1.0, 0.0], {"answer": "a"})
+    assert cache.get_exact("a") is not None
+
+    cache.invalidate()
+    assert cache.get_exact("a") is None
+    assert cache.get_similar([1.0, 0.0]) is None
+
+
+def test_scoped_entries_are_exact_only():
+    cache = _cache()
+    cache.put("Qual o segredo?", None, {"answer": "Godin"}, scope="autor=seth godin")
+
+    assert cache.get_exact("qual o segredo", scope="autor=seth godin") == {"answer": "Godin"}
+    assert cache.get_exact("qual o segredo") is None
+    # Consultas só no nível exato (perguntas filtradas) também contam os misses
+    assert cache.stats()["misses"] == 1 and cache.stats()["hit_rate"] == 0.5
+    assert cache.get_similar([1.0, 0.0]) is None
@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import types
@@ -20,9 +21,32 @@ fastapi.routing.APIRouter.include_router = _patched_include_router
 # Provide a dummy rag_service to avoid heavy dependencies
 fake_rag_service = types.ModuleType("app.services.rag_service")
 fake_rag_service.initialize_rag_components = lambda: None
-fake_rag_service.get_answer = (
-    lambda _q: {"error": "Sistema RAG não inicializado corretamente."}
-)
+fake_rag_service.start_background_initialization = lambda: None
+fake_rag_service.reload_index = lambda force=False: {"error": "Sistema RAG não inicializado.", "status_code": 503}
+
+
+def _rag_status(state):
+    return {"state": state, "ready": state == "ready", "error": None, "components": {}, "llm_models": []}
+
+fake_rag_service.get_rag_status = lambda: _rag_status("initializing")
+
+async def _shutdown_rag_components():
+    return None
+
+fake_rag_service.shutdown_rag_components = _shutdown_rag_components
+
+async def _uninitialized_answer_async(_q, **_filters):
+    return {"error": "Sistema RAG não inicializado corretamente."}
+
+async def _uninitialized_stream_answer(_q, **_filters):
+    yield ("error", {"error": "Sistema RAG não inicializado corretamente."})
+
+async def _uninitialized_answers_batch(_items):
+    return {"error": "Sistema RAG não inicializado corretamente."}
+
+fake_rag_service.get_answer_async = _uninitialized_answer_async
+fake_rag_service.get_answers_batch = _uninitialized_answers_batch
+fake_rag_service.stream_answer = _uninitialized_stream_answer
 sys.modules["app.services.rag_service"] = fake_rag_service
 
 # Stub pydantic_settings to avoid heavy dependency installation
@@ -48,7 +72,34 @@ def ready_rag_service(monkeypatch):
             "source_documents": [],
         }
 
-    monkeypatch.setattr(fake_rag_service, "get_answer", _ready_answer)
+    async def _ready_answer_async(query: str, author_filter=None, book_filter=None):
+        if author_filter == "Desconhecido":
+            return {"error": "Nenhum trecho encontrado para o filtro.", "status_code": 404}
+        return _ready_answer(query)
+
+    async def _ready_stream_answer(query: str, author_filter=None, book_filter=None):
+        yield ("sources", [{"content": "Trecho", "page": 1, "author": "Autor", "book_title": "Livro"}])
+        for token in ("Echo: ", query):
+            yield ("token", token)
+        yield ("done", {})
+
+    monkeypatch.setattr(fake_rag_service, "get_answer_async", _ready_answer_async)
+    async def _ready_answers_batch(items):
+        return {"results": [_ready_answer(item["query"]) for item in items]}
+
+    monkeypatch.setattr(fake_rag_service, "stream_answer", _ready_stream_answer)
+    monkeypatch.setattr(fake_rag_service, "get_answers_batch", _ready_answers_batch)
+    monkeypatch.setattr(fake_rag_service, "get_rag_status", lambda: _rag_status("ready"))
+    yield
+
+
+@pytest.fixture
+def overloaded_rag_service(monkeypatch):
+    """Simulate a rag_service whose request queue is full."""
+    async def _overloaded_answer_async(query: str, **_filters):
+        return {"error": "Servidor sobrecarregado.", "retry_after": 7}
+
+    monkeypatch.setattr(fake_rag_service, "get_answer_async", _overloaded_answer_async)
     yield
 
 from app.main import app
@@ -78,8 +129,95 @@ def test_chat_ready(ready_rag_service):
     assert data["source_documents"] == []
 
 
+def test_chat_stream_uninitialized():
+    response = client.post("/api/v1/chat/ask/stream", json={"query": "Oi"})
+    assert response.status_code == 503
+
+
+def test_chat_stream_ready(ready_rag_service):
+    """Sources should be the first SSE event, followed by the answer tokens."""
+    response = client.post("/api/v1/chat/ask/stream", json={"query": "Teste"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    names = [lines[0].removeprefix("event: ") for lines in events]
+    assert names == ["sources", "token", "token", "done"]
+    tokens = [json.loads(lines[1].removeprefix("data: ")) for lines in events if lines[0] == "event: token"]
+    assert "".join(tokens) == "Echo: Teste"
+
+
+def test_chat_overloaded(overloaded_rag_service):
+    """A full request queue should map to 503 with a Retry-After header."""
+    response = client.post("/api/v1/chat/ask/", json={"query": "Teste"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "7"
+
+
 def test_cors_blocked_origin():
     """Requests from unknown origins should not receive CORS headers."""
     response = client.get("/", headers={"Origin": "http://evil.com"})
     assert response.status_code == 200
     assert "access-control-allow-origin" not in response.headers
+
+
+def test_chat_filter_without_matches(ready_rag_service):
+    """An author/book filter that matches no chunk should map to 404."""
+    response = client.post("/api/v1/chat/ask/", json={"query": "Teste", "author_filter": "Desconhecido"})
+    assert response.status_code == 404
+
+
+def test_chat_batch(ready_rag_service):
+    """Batch results come back in the order of the queries."""
+    response = client.post("/api/v1/chat/ask/batch", json={"queries": [{"query": "A"}, {"query": "B"}]})
+    assert response.status_code == 200
+    assert [item["answer"] for item in response.json()["results"]] == ["Echo: A", "Echo: B"]
+
+
+def test_chat_batch_rejects_empty_query(ready_rag_service):
+    response = client.post("/api/v1/chat/ask/batch", json={"queries": [{"query": "A"}, {"query": " "}]})
+    assert response.status_code == 400
+
+
+def test_metrics_endpoint():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "rag_stage_duration_seconds" in response.text
+
+
+def test_health_live():
+    response = client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "alive"}
+
+
+def test_health_ready_while_initializing():
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["state"] == "initializing"
+    assert client.get("/").json()["rag_status"] == "initializing"
+
+
+def test_health_ready(ready_rag_service):
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+
+
+def test_admin_reload_disabled_without_key():
+    response = client.post("/api/v1/admin/index/reload")
+    assert response.status_code == 404
+
+
+def test_admin_reload(monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "segredo", raising=False)
+    monkeypatch.setattr(fake_rag_service, "reload_index", lambda force=False: {"reloaded": True, "version": "v2"})
+    assert client.post("/api/v1/admin/index/reload", headers={"X-Admin-Key": "errada"}).status_code == 401
+    response = client.post("/api/v1/admin/index/reload", headers={"X-Admin-Key": "segredo"})
+    assert response.status_code == 200
+    assert response.json()["version"] == "v2"
+
+    monkeypatch.setattr(fake_rag_service, "reload_index",
+                        lambda force=False: {"error": "Índice incompatível.", "status_code": 409})
+    assert client.post("/api/v1/admin/index/reload", headers={"X-Admin-Key": "segredo"}).status_code == 409
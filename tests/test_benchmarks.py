@@ -0,0 +1,91 @@
+import importlib
+import os
+import sys
+
+import faiss
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import app.services
+from app.services.chunk_store import ChunkStore
+from app.services.index_manifest import build_manifest, write_manifest
+from app.services.index_versions import publish_index_version
+from benchmarks import ann_benchmark, embedding_backend_benchmark
+
+
+def _import_retrieval_benchmark():
+    """
+    retrieval_benchmark importa app.services.rag_service; a troca por um módulo falso feita
+    por test_api.py (sys.modules) é preservada, como em test_rag_service.py.
+    """
+    previous_module = sys.modules.get("app.services.rag_service")
+    previous_attr = app.services.__dict__.get("rag_service")
+    try:
+        return importlib.import_module("benchmarks.retrieval_benchmark")
+    finally:
+        sys.modules.pop("app.services.rag_service", None)
+        if previous_module is not None:
+            sys.modules["app.services.rag_service"] = previous_module
+        if previous_attr is not None:
+            app.services.rag_service = previous_attr
+        else:
+            app.services.__dict__.pop("rag_service", None)
+
+
+retrieval_benchmark = _import_retrieval_benchmark()
+
+DIMENSION = 8
+
+
+def write_index(path, num_chunks, model_name):
+    os.makedirs(path, exist_ok=True)
+    vectors = np.random.default_rng(num_chunks).standard_normal((num_chunks, DIMENSION)).astype(np.float32)
+    index = faiss.IndexFlatL2(DIMENSION)
+    index.add(vectors)
+    faiss.write_index(index, os.path.join(path, "index.faiss"))
+    ChunkStore.write(path, [f"trecho {i}" for i in range(num_chunks)],
+                     [{"author": "Autor", "book_title": "Livro", "source_pdf": "livro.pdf", "page": i} for i in range(num_chunks)])
+    write_manifest(path, build_manifest(model_name, DIMENSION, True, 1000, 200, {}, num_chunks))
+    return vectors
+
+
+@pytest.fixture
+def versioned_root(tmp_path):
+    """Layout versionado com arquivos antigos (sem versão) ainda na raiz: os benchmarks devem ler só a versão ativa."""
+    root = str(tmp_path / "indice")
+    write_index(root, 3, "modelo-antigo")
+    vectors = write_index(os.path.join(root, "v2"), 5, "modelo-novo")
+    publish_index_version(root, "v2")
+    return root, vectors
+
+
+def test_ann_benchmark_reads_active_version(versioned_root):
+    root, vectors = versioned_root
+    np.testing.assert_array_equal(ann_benchmark.load_vectors(root), vectors)
+
+
+def test_embedding_benchmark_reads_active_version(versioned_root):
+    root, vectors = versioned_root
+    manifest, store = embedding_backend_benchmark.load_index(root)
+    assert manifest["embedding_model"] == "modelo-novo"
+    assert len(store.chunk_store) == 5
+    np.testing.assert_array_equal(np.asarray(store.raw_vectors), vectors)
+    store.chunk_store.close()
+
+
+def test_retrieval_benchmark_loads_active_version(versioned_root, monkeypatch):
+    root, _ = versioned_root
+    loaded = []
+    load = retrieval_benchmark.ChunkVectorStore.load
+
+    def spy_load(index_path, *args, **kwargs):
+        loaded.append(index_path)
+        return load(index_path, *args, **kwargs)
+
+    monkeypatch.setattr(retrieval_benchmark.ChunkVectorStore, "load", spy_load)
+    monkeypatch.setattr(retrieval_benchmark.rag_service, "_load_index_components", lambda: True, raising=False)
+    results = retrieval_benchmark.bench_load(root, repeat=1)
+    assert set(loaded) == {os.path.join(root, "v2")}
+    assert results["index_load_mmap_true_ms"]["count"] == 1
@@ -0,0 +1,113 @@
+import os
+import sys
+
+import faiss
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.chunk_store import ChunkStore
+from app.services.vector_store import ChunkVectorStore, search_cost
+
+
+def test_round_trip(tmp_path):
+    texts = ["Primeiro trecho", "Segundo trecho com acentuação", ""]
+    metadatas = [
+        {"author": "Seth Godin", "book_title": "This is Marketing", "source_pdf": "tim.pdf", "page": 3},
+        {"author": "Pat Flynn", "book_title": "Superfãs", "source_pdf": "superfans.pdf", "page": 0},
+        {"author": "Seth Godin", "book_title": "This is Marketing", "source_pdf": "tim.pdf", "page": None},
+    ]
+    ChunkStore.write(str(tmp_path), texts, metadatas)
+
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 3
+    assert [store.text(row) for row in range(3)] == texts
+    assert [store.metadata(row) for row in range(3)] == metadatas
+    doc = store.get_document(1)
+    assert doc.page_content == texts[1]
+    assert doc.metadata["book_title"] == "Superfãs"
+    assert doc.metadata["chunk_row"] == 1
+    store.close()
+
+
+def test_vector_store_maps_rows_to_chunks(tmp_path):
+    ChunkStore.write(str(tmp_path), ["a", "b"], [{"page": 1}, {"page": 2}])
+    index = faiss.IndexFlatL2(2)
+    index.add(np.array([[0.0, 0.0], [1.0, 1.0]], dtype=np.float32))
+
+    store = ChunkVectorStore(index, ChunkStore(str(tmp_path)), embedding_function=None)
+    docs = store.similarity_search_by_vector([0.9, 0.9], k=2)
+    assert [doc.page_content for doc in docs] == ["b", "a"]
+
+
+def test_vector_store_rejects_misaligned_files(tmp_path):
+    ChunkStore.write(str(tmp_path), ["a"], [{}])
+    with pytest.raises(ValueError):
+        ChunkVectorStore(faiss.IndexFlatL2(2), ChunkStore(str(tmp_path)), embedding_function=None)
+
+
+def test_filtered_search_returns_only_allowed_rows(tmp_path):
+    metadatas = [
+        {"author": "Seth Godin", "book_title": "This is Marketing"},
+        {"author": "Pat Flynn", "book_title": "Superfãs"},
+        {"author": "Seth Godin", "book_title": "This is Marketing"},
+        {"author": "Pat Flynn", "book_title": "Superfãs"},
+    ]
+    ChunkStore.write(str(tmp_path), ["a", "b", "c", "d"], metadatas)
+    index = faiss.IndexFlatL2(2)
+    index.add(np.array([[0.0, 0.0], [1.0, 1.0], [5.0, 5.0], [1.1, 1.1]], dtype=np.float32))
+    chunk_store = ChunkStore(str(tmp_path))
+    store = ChunkVectorStore(index, chunk_store, embedding_function=None)
+    store.raw_vectors = index.reconstruct_n(0, index.ntotal)
+
+    allowed = chunk_store.filter_rows(author="seth godin")
+    assert allowed.tolist() == [0, 2]
+    assert chunk_store.filter_rows() is None
+    assert len(chunk_store.filter_rows(author="Seth Godin", book_title="Superfãs")) == 0
+
+    # Os vizinhos mais próximos (linhas 1 e 3) são de outro autor; ainda assim vêm k resultados
+    _, rows = store.search_rows([1.0, 1.0], 2, allowed)
+    assert rows.tolist() == [0, 2]
+
+
+def _approximate_store(tmp_path, index_spec, vectors):
+    ChunkStore.write(str(tmp_path), [str(row) for row in range(len(vectors))], [{} for _ in range(len(vectors))])
+    index = faiss.index_factory(vectors.shape[1], index_spec)
+    index.train(vectors)
+    index.add(vectors)
+    store = ChunkVectorStore(index, ChunkStore(str(tmp_path)), embedding_function=None)
+    store.raw_vectors = vectors
+    return store
+
+
+def test_large_filter_searches_the_index_itself(tmp_path, monkeypatch):
+    vectors = np.random.default_rng(0).standard_normal((4000, 8)).astype(np.float32)
+    store = _approximate_store(tmp_path, "HNSW32", vectors)
+    store.index.hnsw.efSearch = 16
+    assert search_cost(store.index) < 2000 < store.index.ntotal
+
+    knn_calls = []
+    knn = faiss.knn
+    monkeypatch.setattr(faiss, "knn", lambda *args: knn_calls.append(len(args[1])) or knn(*args))
+    allowed = np.arange(0, 4000, 2) # metade das linhas: mais que uma busca sem filtro compara
+    _, rows = store.search_rows(vectors[1], 5, allowed)
+    assert len(rows) == 5 and set(rows.tolist()) <= set(allowed.tolist())
+    assert knn_calls == [] # nenhuma cópia dos vetores do subconjunto
+
+    small = np.arange(0, 100, 10) # subconjunto pequeno: busca exata só sobre ele
+    _, rows = store.search_rows(vectors[1], 5, small)
+    assert rows.tolist() == small[np.argsort(((vectors[small] - vectors[1]) ** 2).sum(axis=1))[:5]].tolist()
+    assert knn_calls == [10]
+
+
+def test_filtered_ivf_search_falls_back_to_exact_when_probed_lists_miss(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = np.array([[100.0, 0], [-100.0, 0], [0, 100.0], [0, -100.0]], dtype=np.float32)
+    vectors = (np.repeat(centers, 250, axis=0) + rng.standard_normal((1000, 2))).astype(np.float32)
+    store = _approximate_store(tmp_path, "IVF4,Flat", vectors)
+    store.index.nprobe = 1
+    allowed = np.arange(250, 1000) # tudo fora do cluster da query: a lista visitada não tem nenhuma linha permitida
+
+    _, rows = store.search_rows(centers[0], 3, allowed)
+    assert len(rows) == 3 and rows.min() >= 250
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.concurrency import RAGOverloadedError, RequestLimiter
+
+
+def test_limiter_rejects_when_queue_full():
+    async def scenario():
+        limiter = RequestLimiter(max_concurrent=1, max_queued=1, queue_timeout=5, retry_after=3)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        assert limiter.in_flight == 1
+        assert limiter.queued == 1
+
+        with pytest.raises(RAGOverloadedError) as exc_info:
+            async with limiter.slot():
+                pass
+        assert exc_info.value.retry_after == 3
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_queue_timeout():
+    async def scenario():
+        limiter = RequestLimiter(max_concurrent=1, max_queued=4, queue_timeout=0.05, retry_after=1)
+        async with limiter.slot():
+            with pytest.raises(RAGOverloadedError):
+                async with limiter.slot():
+                    pass
+        assert limiter.queued == 0
+
+    asyncio.run(scenario())
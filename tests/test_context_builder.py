@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+from langchain_core.documents import Document
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.context_builder import TokenCounter, fit_to_budget, merge_adjacent_chunks, mmr_select
+
+
+def _doc(text, row, page=1, source="livro.pdf"):
+    return Document(page_content=text, metadata={"chunk_row": row, "page": page, "source_pdf": source})
+
+
+def test_merge_adjacent_chunks_removes_overlap():
+    overlap = "trecho repetido pela sobreposição do splitter"
+    docs = [
+        _doc(overlap + " e a continuação do segundo chunk.", 8),
+        _doc("Outro livro.", 40, source="outro.pdf"),
+        _doc("Início do primeiro chunk, " + overlap, 7),
+        _doc("Outro livro.", 41, source="outro.pdf", page=2), # texto idêntico: descartado
+    ]
+    merged = merge_adjacent_chunks(docs, max_overlap=200)
+
+    assert [doc.metadata["chunk_row"] for doc in merged] == [7, 40]
+    assert merged[0].page_content == "Início do primeiro chunk, " + overlap + " e a continuação do segundo chunk."
+
+
+def test_mmr_prefers_diverse_candidates():
+    query = [1.0, 0.0]
+    candidates = np.array([[1.0, 0.1], [1.0, 0.11], [0.7, -0.7]], dtype=np.float32)
+    assert mmr_select(query, candidates, 2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(query, candidates, 2, lambda_mult=0.5) == [0, 2]
+
+
+def test_fit_to_budget_with_fallback_counter():
+    counter = TokenCounter("codificacao-inexistente") # cai na estimativa por caracteres
+    assert not counter.exact
+    docs = [_doc("a" * 400, 0), _doc("b" * 400, 1), _doc("c" * 400, 2)]
+
+    kept = fit_to_budget(docs, counter, max_tokens=160, min_partial_tokens=50)
+    assert [len(doc.page_content) for doc in kept] == [400, 240]
+    assert fit_to_budget(docs, counter, max_tokens=120, min_partial_tokens=50)[-1].page_content == "a" * 400
@@ -0,0 +1,123 @@
+import os
+import sys
+import zlib
+
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import preprocess_and_create_index as builder
+from app.services.chunk_store import ChunkStore
+from app.services.index_manifest import read_manifest
+from app.services.lexical_index import LexicalIndex
+from app.services.vector_store import INDEX_FILENAME, VECTORS_FILENAME
+
+DIMENSION = 8
+CHUNKS_PER_PDF = 2
+
+
+def _embed(text):
+    return np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIMENSION).astype(np.float32)
+
+
+class FakeEmbeddings:
+    def __init__(self, embedded):
+        self.embedded = embedded
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [_embed(text).tolist() for text in texts]
+
+
+@pytest.fixture
+def build(tmp_path, monkeypatch):
+    """create_index sobre PDFs falsos: a leitura dos PDFs e o modelo de embedding são substituídos."""
+    sources = tmp_path / "pdf_sources"
+    sources.mkdir()
+    monkeypatch.setattr(builder, "PDF_SOURCES_DIR", str(sources))
+    monkeypatch.setattr(builder, "PDF_METADATA_FILE", str(tmp_path / "pdf_metadata.json"))
+    monkeypatch.setattr(builder, "FAISS_INDEX_PATH", str(tmp_path / "indice"))
+    calls = {"parsed": [], "embedded": []}
+
+    def fake_parse(pdfs_to_process, workers):
+        calls["parsed"].append(sorted(pdfs_to_process))
+        chunks = {}
+        for name, info in pdfs_to_process.items():
+            with open(info["path"], encoding="utf-8") as f:
+                content = f.read()
+            chunks[name] = [
+                Document(page_content=f"{content} trecho {i}",
+                         metadata={"author": info["author"], "book_title": info["book_title"], "source_pdf": name, "page": i})
+                for i in range(CHUNKS_PER_PDF)
+            ]
+        return chunks
+
+    monkeypatch.setattr(builder, "parse_pdfs_in_parallel", fake_parse)
+    monkeypatch.setattr(builder, "create_embeddings", lambda *args, **kwargs: FakeEmbeddings(calls["embedded"]))
+
+    def write_pdf(name, content):
+        (sources / name).write_text(content, encoding="utf-8")
+
+    return write_pdf, sources, calls
+
+
+def _assert_rows_aligned(index_path, expected_sources):
+    """Linha i do FAISS, do vectors.npy (se houver), do chunk store e do BM25 são o mesmo chunk."""
+    store = ChunkStore(index_path)
+    index = faiss.read_index(os.path.join(index_path, INDEX_FILENAME))
+    texts = [store.text(row) for row in range(len(store))]
+    assert index.ntotal == len(store) == LexicalIndex(index_path).num_docs
+    assert sorted({store.source(row) for row in range(len(store))}) == sorted(expected_sources)
+    vectors_file = os.path.join(index_path, VECTORS_FILENAME)
+    vectors = np.load(vectors_file) if os.path.exists(vectors_file) else index.reconstruct_n(0, index.ntotal)
+    for row, text in enumerate(texts):
+        assert text.startswith(f"conteúdo de {store.source(row)}")
+        np.testing.assert_allclose(vectors[row], _embed(text), rtol=1e-6)
+    store.close()
+    return texts
+
+
+def test_incremental_update_diffs_manifest_and_keeps_rows_aligned(build):
+    write_pdf, sources, calls = build
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        write_pdf(name, f"conteúdo de {name}")
+    assert builder.create_index(workers=1) is True
+    _assert_rows_aligned(builder.FAISS_INDEX_PATH, ["a.pdf", "b.pdf", "c.pdf"])
+
+    # Nada mudou: nada é lido nem reconstruído
+    assert builder.create_index(workers=1) is False
+    assert calls["parsed"] == [["a.pdf", "b.pdf", "c.pdf"]]
+
+    # b alterado, c removido, d novo: só b e d são lidos e embedados
+    write_pdf("b.pdf", "conteúdo de b.pdf, segunda edição")
+    os.remove(sources / "c.pdf")
+    write_pdf("d.pdf", "conteúdo de d.pdf")
+    calls["embedded"].clear()
+    assert builder.create_index(workers=1) is True
+
+    assert calls["parsed"][-1] == ["b.pdf", "d.pdf"]
+    assert all(not text.startswith("conteúdo de a.pdf") for text in calls["embedded"])
+    texts = _assert_rows_aligned(builder.FAISS_INDEX_PATH, ["a.pdf", "b.pdf", "d.pdf"])
+    assert len(texts) == 3 * CHUNKS_PER_PDF
+    assert "conteúdo de b.pdf, segunda edição trecho 0" in texts
+    manifest = read_manifest(builder.FAISS_INDEX_PATH)
+    assert sorted(manifest["files"]) == ["a.pdf", "b.pdf", "d.pdf"]
+    assert manifest["num_vectors"] == 3 * CHUNKS_PER_PDF
+
+
+def test_index_spec_change_rebuilds_without_reembedding(build):
+    write_pdf, _, calls = build
+    for name in ("a.pdf", "b.pdf"):
+        write_pdf(name, f"conteúdo de {name}")
+    assert builder.create_index(workers=1) is True
+    calls["embedded"].clear()
+
+    assert builder.create_index(workers=1, index_spec="HNSW16") is True
+
+    assert calls["embedded"] == [] and len(calls["parsed"]) == 1
+    assert read_manifest(builder.FAISS_INDEX_PATH)["index_spec"] == "HNSW16"
+    assert os.path.exists(os.path.join(builder.FAISS_INDEX_PATH, VECTORS_FILENAME))
+    _assert_rows_aligned(builder.FAISS_INDEX_PATH, ["a.pdf", "b.pdf"])
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.embeddings import embedding_model_kwargs
+
+
+def test_backend_model_kwargs():
+    assert embedding_model_kwargs("torch") == {}
+    assert embedding_model_kwargs("ONNX") == {"backend": "onnx"}
+    assert embedding_model_kwargs("onnx", "onnx/model_qint8_avx512_vnni.onnx") == {
+        "backend": "onnx",
+        "model_kwargs": {"file_name": "onnx/model_qint8_avx512_vnni.onnx"},
+    }
+
+
+def test_invalid_backend_settings():
+    with pytest.raises(ValueError):
+        embedding_model_kwargs("tensorrt")
+    with pytest.raises(ValueError):
+        embedding_model_kwargs("torch", "onnx/model.onnx")
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import faiss
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.index_manifest import (
+    IndexManifestError,
+    build_manifest,
+    resolve_embedding_model,
+    write_manifest,
+)
+
+
+def _write_index(tmp_path, dimension, model="modelo-a"):
+    index_file = str(tmp_path / "index.faiss")
+    faiss.write_index(faiss.IndexFlatL2(dimension), index_file)
+    files = {"a.pdf": {"sha256": "0" * 64, "author": "Autor", "book_title": "Livro"}}
+    write_manifest(str(tmp_path), build_manifest(model, 8, False, 1000, 200, files, 0))
+    return index_file
+
+
+def test_auto_policy_selects_index_model(tmp_path):
+    index_file = _write_index(tmp_path, 8)
+    model, manifest = resolve_embedding_model(str(tmp_path), index_file, "modelo-b", "auto")
+    assert model == "modelo-a"
+    assert manifest["dimension"] == 8
+
+
+def test_refuse_policy_rejects_other_model(tmp_path):
+    index_file = _write_index(tmp_path, 8)
+    with pytest.raises(IndexManifestError):
+        resolve_embedding_model(str(tmp_path), index_file, "modelo-b", "refuse")
+
+
+def test_dimension_mismatch_with_index_file(tmp_path):
+    index_file = _write_index(tmp_path, 16)
+    with pytest.raises(IndexManifestError):
+        resolve_embedding_model(str(tmp_path), index_file, "modelo-a", "auto")
+
+
+def test_missing_manifest_keeps_configured_model(tmp_path):
+    index_file = str(tmp_path / "index.faiss")
+    faiss.write_index(faiss.IndexFlatL2(8), index_file)
+    assert resolve_embedding_model(str(tmp_path), index_file, "modelo-b", "refuse") == ("modelo-b", None)
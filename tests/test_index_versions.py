@@ -0,0 +1,57 @@
+import os
+import sys
+
+import faiss
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.chunk_store import ChunkStore
+from app.services.index_versions import (
+    CURRENT_FILENAME,
+    UNVERSIONED_PREFIX,
+    active_index,
+    list_index_versions,
+    prune_index_versions,
+    publish_index_version,
+)
+
+
+def _write_version(root, name, mtime):
+    path = os.path.join(str(root), name)
+    os.makedirs(path)
+    faiss.write_index(faiss.IndexFlatL2(4), os.path.join(path, "index.faiss"))
+    ChunkStore.write(path, [], [])
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_unversioned_layout_uses_root(tmp_path):
+    faiss.write_index(faiss.IndexFlatL2(4), str(tmp_path / "index.faiss"))
+    version, path = active_index(str(tmp_path))
+    assert path == str(tmp_path)
+    assert version.startswith(UNVERSIONED_PREFIX)
+
+
+def test_publish_switches_active_version(tmp_path):
+    v1 = _write_version(tmp_path, "v1", 1000)
+    v2 = _write_version(tmp_path, "v2", 2000)
+    publish_index_version(str(tmp_path), "v1")
+    assert active_index(str(tmp_path)) == ("v1", v1)
+    publish_index_version(str(tmp_path), "v2")
+    assert active_index(str(tmp_path)) == ("v2", v2)
+    assert not os.path.exists(str(tmp_path / CURRENT_FILENAME) + ".tmp")
+
+    os.makedirs(tmp_path / "incompleta")
+    with pytest.raises(FileNotFoundError):
+        publish_index_version(str(tmp_path), "incompleta")
+    assert active_index(str(tmp_path))[0] == "v2"
+
+
+def test_prune_keeps_newest_and_active(tmp_path):
+    for i, name in enumerate(["a", "b", "c", "d"]):
+        _write_version(tmp_path, name, 1000 + i)
+    publish_index_version(str(tmp_path), "a")
+    removed = prune_index_versions(str(tmp_path), keep=2)
+    assert removed == ["b"]
+    assert list_index_versions(str(tmp_path)) == ["a", "c", "d"]
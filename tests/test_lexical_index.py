@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_strips_accents_and_stopwords():
+    assert tokenize("Qual é o segredo da Vida plena?") == ["qual", "segredo", "vida", "plena"]
+
+
+def test_bm25_ranks_rare_terms(tmp_path):
+    texts = [
+        "Marketing is the generous act of helping someone solve a problem.",
+        "Seth Godin writes about marketing and tribes.",
+        "A product launch needs a sideways sales letter.",
+        "Marketing marketing marketing.",
+    ]
+    LexicalIndex.build(str(tmp_path), texts)
+    index = LexicalIndex(str(tmp_path))
+
+    scores, rows = index.search("Seth Godin", 2)
+    assert rows.tolist() == [1]
+
+    scores, rows = index.search("marketing launch", 4)
+    assert set(rows.tolist()) == {0, 1, 2, 3}
+    assert list(scores) == sorted(scores, reverse=True)
+
+    assert len(index.search("palavra inexistente", 3)[1]) == 0
+
+    _, rows = index.search("marketing", 4, allowed_rows=np.array([0, 2, 3]))
+    assert set(rows.tolist()) == {0, 3}
+
+
+def test_metadata_is_searchable(tmp_path):
+    texts = ["Crie um público que volta sempre.", "Negociar é ouvir com atenção."]
+    metadatas = [{"author": "Pat Flynn", "book_title": "Superfãs"}, {"author": "Chris Voss", "book_title": None}]
+    LexicalIndex.build(str(tmp_path), texts, metadatas)
+    index = LexicalIndex(str(tmp_path))
+
+    assert index.search("Superfãs", 2)[1].tolist() == [0]
+    assert index.search("o que Chris Voss diz?", 2)[1].tolist() == [1]
+    assert index.search("atenção", 2)[1].tolist() == [1]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]], k=3, rrf_k=60)
+    assert fused[:2] == [1, 3]
+    assert len(fused) == 3
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.llm_gateway import (CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, CircuitBreaker, LLMGateway,
+                                      LLMTimeoutError, ResilientChatModel, create_llm_gateway)
+
+
+def _completion(model, content):
+    return {
+        "id": "cmpl-1", "object": "chat.completion", "created": 0, "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+def _stream_body(model, parts):
+    chunks = [
+        {"id": "cmpl-1", "object": "chat.completion.chunk", "created": 0, "model": model,
+         "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}]}
+        for part in parts
+    ]
+    return "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+
+
+class StubServer:
+    """Servidor OpenAI falso: `failures[model]` respostas de erro antes de responder normalmente."""
+
+    def __init__(self, failures, status_code=429):
+        self.failures = dict(failures)
+        self.status_code = status_code
+        self.calls = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        model = body["model"]
+        self.calls.append(model)
+        if self.failures.get(model, 0) > 0:
+            self.failures[model] -= 1
+            return httpx.Response(self.status_code, json={"error": {"message": "falha simulada"}})
+        if body.get("stream"):
+            return httpx.Response(200, text=_stream_body(model, ["Olá", " mundo"]),
+                                  headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json=_completion(model, f"resposta de {model}"))
+
+
+def _gateway(server, models=("principal", "reserva"), **overrides):
+    params = dict(
+        base_url="http://llm.local/v1", api_key="x", temperature=0.5, max_tokens=100,
+        request_timeout=5, connect_timeout=1, max_connections=10, max_keepalive_connections=5,
+        max_retries=1, backoff_base_seconds=0, backoff_max_seconds=0,
+        circuit_failure_threshold=2, circuit_reset_seconds=60,
+    )
+    params.update(overrides)
+    return create_llm_gateway(list(models), transport=httpx.MockTransport(server), **params)
+
+
+def test_retries_then_falls_back_to_next_model():
+    server = StubServer({"principal": 10})
+    gateway = _gateway(server)
+
+    assert gateway.runnable.invoke("Oi").content == "resposta de reserva"
+    assert server.calls == ["principal", "principal", "reserva"]
+    # Duas falhas seguidas abriram o circuito: a próxima chamada nem tenta o principal
+    assert gateway.status()[0]["circuit"] == CIRCUIT_OPEN
+    assert gateway.runnable.invoke("Oi").content == "resposta de reserva"
+    assert server.calls[3:] == ["reserva"]
+
+
+def test_transient_failure_is_retried_on_same_model():
+    server = StubServer({"principal": 1}, status_code=503)
+    gateway = _gateway(server)
+
+    async def scenario():
+        result = await gateway.runnable.ainvoke("Oi")
+        chunks = [chunk.content async for chunk in gateway.runnable.astream("Oi")]
+        await gateway.aclose()
+        return result, chunks
+
+    result, chunks = asyncio.run(scenario())
+    assert result.content == "resposta de principal"
+    assert "".join(chunks) == "Olá mundo"
+    assert server.calls == ["principal", "principal", "principal"]
+
+
+def test_circuit_breaker_half_open_after_reset():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    now[0] = 11.0
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request() # só uma chamada de teste por vez
+    breaker.record_success()
+    assert breaker.allow_request()
+
+
+class _SlowModel:
+    """Modelo falso que entrega um trecho e depois fica esperando (cliente desconecta no meio)."""
+
+    async def astream(self, input, config=None, **kwargs):
+        yield "primeiro"
+        await asyncio.sleep(60)
+        yield "segundo"
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        await asyncio.sleep(60)
+
+
+def test_cancelled_half_open_trial_releases_breaker():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 11.0
+    model = ResilientChatModel(_SlowModel(), "lento", breaker, max_retries=0,
+                               backoff_base_seconds=0, backoff_max_seconds=0)
+
+    async def scenario():
+        stream = model.astream("Oi")
+        assert await stream.__anext__() == "primeiro"
+        assert not breaker.allow_request() # chamada de teste em andamento
+        await stream.aclose()
+        assert breaker.allow_request()
+        breaker.release_trial()
+
+        task = asyncio.create_task(model.ainvoke("Oi"))
+        await asyncio.sleep(0)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_client_errors_do_not_open_circuit():
+    # Um prompt inválido (400) não é retentado nem tira o modelo principal de serviço
+    server = StubServer({"principal": 3}, status_code=400)
+    gateway = _gateway(server)
+
+    for _ in range(3):
+        assert gateway.runnable.invoke("Oi").content == "resposta de reserva"
+    assert server.calls == ["principal", "reserva"] * 3
+    assert gateway.status()[0]["circuit"] == CIRCUIT_CLOSED
+    assert gateway.runnable.invoke("Oi").content == "resposta de principal"
+
+
+class _SilentModel:
+    """Modelo falso que não responde (nem o primeiro trecho)."""
+
+    async def astream(self, input, config=None, **kwargs):
+        await asyncio.sleep(60)
+        yield "tarde demais"
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        await asyncio.sleep(60)
+
+
+def test_total_deadline_covers_retries_and_fallbacks():
+    breakers = [CircuitBreaker(failure_threshold=5, reset_seconds=60) for _ in range(2)]
+    models = [ResilientChatModel(_SilentModel(), name, breaker, max_retries=2,
+                                 backoff_base_seconds=0, backoff_max_seconds=0)
+              for name, breaker in zip(("principal", "reserva"), breakers)]
+    gateway = LLMGateway(models, httpx.Client(), httpx.AsyncClient(), total_timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(LLMTimeoutError):
+            await gateway.runnable.ainvoke("Oi")
+        with pytest.raises(LLMTimeoutError):
+            async for _ in gateway.runnable.astream("Oi"):
+                pass
+        await gateway.aclose()
+
+    started = time.perf_counter()
+    asyncio.run(scenario())
+    assert time.perf_counter() - started < 5
+    # O prazo cancela a chamada em andamento: nem falha registrada nem chamada de teste presa
+    assert [breaker.state for breaker in breakers] == [CIRCUIT_CLOSED, CIRCUIT_CLOSED]
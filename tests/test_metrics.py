@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import metrics
+from app.services.metrics import RequestTimings
+
+
+def _sample(name, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_spans_feed_histogram_and_timings():
+    before = _sample("rag_stage_duration_seconds_count", endpoint="teste", stage="embedding")
+    timings = RequestTimings("teste")
+    with timings.span(metrics.STAGE_EMBEDDING):
+        pass
+    timings.finish("answered")
+
+    assert _sample("rag_stage_duration_seconds_count", endpoint="teste", stage="embedding") == before + 1
+    assert set(timings.as_dict()) == {"embedding", "total"}
+
+
+def test_repeated_spans_are_observed_once_per_request():
+    before = _sample("rag_stage_duration_seconds_count", endpoint="teste-repetido", stage="search")
+    before_sum = _sample("rag_stage_duration_seconds_sum", endpoint="teste-repetido", stage="search")
+    timings = RequestTimings("teste-repetido")
+    for _ in range(3): # ex.: busca FAISS, BM25 + fusão e a busca de outra pergunta do lote
+        timings.record(metrics.STAGE_SEARCH, 0.01)
+    timings.finish("answered")
+    timings.finish("cancelled") # segunda chamada (gerador fechado depois do 'done') não conta de novo
+
+    assert _sample("rag_stage_duration_seconds_count", endpoint="teste-repetido", stage="search") == before + 1
+    assert _sample("rag_stage_duration_seconds_sum", endpoint="teste-repetido", stage="search") == pytest.approx(before_sum + 0.03)
+    assert timings.as_dict()["search"] == pytest.approx(30.0)
+
+
+def test_failure_in_llm_stage_is_classified_as_llm_error():
+    before = _sample("rag_errors_total", endpoint="teste", type="llm")
+    timings = RequestTimings("teste")
+    with pytest.raises(TimeoutError):
+        with timings.span(metrics.STAGE_LLM):
+            raise TimeoutError()
+    timings.fail()
+
+    assert _sample("rag_errors_total", endpoint="teste", type="llm") == before + 1
+    assert _sample("rag_requests_total", endpoint="teste", outcome="error") >= 1
@@ -0,0 +1,377 @@
+import asyncio
+import importlib
+import os
+import sys
+import threading
+import zlib
+
+import faiss
+import numpy as np
+import pytest
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import app.services
+from app.core.config import settings
+from app.services.chunk_store import ChunkStore
+from app.services.index_manifest import build_manifest, write_manifest
+from app.services.index_versions import publish_index_version
+from app.services.lexical_index import LexicalIndex
+
+
+def _import_real_rag_service():
+    """
+    test_api.py troca app.services.rag_service por um módulo falso em sys.modules; aqui
+    o módulo real é importado sem desfazer essa troca (nem deixar o real no lugar dela).
+    """
+    previous_module = sys.modules.pop("app.services.rag_service", None)
+    previous_attr = app.services.__dict__.get("rag_service")
+    try:
+        return importlib.import_module("app.services.rag_service")
+    finally:
+        sys.modules.pop("app.services.rag_service", None)
+        if previous_module is not None:
+            sys.modules["app.services.rag_service"] = previous_module
+        if previous_attr is not None:
+            app.services.rag_service = previous_attr
+        else:
+            app.services.__dict__.pop("rag_service", None)
+
+
+rag_service = _import_real_rag_service()
+
+DIMENSION = 16
+EMBEDDING_MODEL = "modelo-falso"
+CORPUS = [
+    ("Pequenos hábitos se acumulam ao longo do tempo.", "James Clear", "Hábitos Atômicos"),
+    ("A identidade vem antes dos hábitos.", "James Clear", "Hábitos Atômicos"),
+    ("Negociar é entender o que o outro precisa.", "Chris Voss", "Negocie Como Se Sua Vida Dependesse Disso"),
+    ("Empatia tática ajuda em qualquer negociação.", "Chris Voss", "Negocie Como Se Sua Vida Dependesse Disso"),
+    ("Um criador vive de poucos fãs muito engajados.", "Pat Flynn", "Superfãs"),
+]
+
+
+class FakeEmbeddings:
+    """Embedding determinístico: soma de vetores aleatórios fixos por palavra, normalizada."""
+
+    def __init__(self):
+        self.query_calls = 0
+        self.document_calls = 0
+
+    def _embed(self, text):
+        vector = np.zeros(DIMENSION, dtype=np.float32)
+        for token in text.casefold().split():
+            vector += np.random.default_rng(zlib.crc32(token.encode("utf-8"))).standard_normal(DIMENSION)
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        self.document_calls += 1
+        return [self._embed(text) for text in texts]
+
+
+def write_index_version(root, version, corpus=CORPUS):
+    path = os.path.join(str(root), version)
+    os.makedirs(path)
+    texts = [text for text, _, _ in corpus]
+    metadatas = [{"author": author, "book_title": title, "source_pdf": f"{title}.pdf", "page": i}
+                 for i, (_, author, title) in enumerate(corpus)]
+    vectors = np.asarray(FakeEmbeddings().embed_documents(texts), dtype=np.float32)
+    index = faiss.IndexFlatL2(DIMENSION)
+    index.add(vectors)
+    faiss.write_index(index, os.path.join(path, "index.faiss"))
+    ChunkStore.write(path, texts, metadatas)
+    LexicalIndex.build(path, texts, metadatas)
+    write_manifest(path, build_manifest(EMBEDDING_MODEL, DIMENSION, True, 1000, 200, {}, len(texts)))
+    return path
+
+
+def _answer(chain_input):
+    if "falha" in chain_input["question"]:
+        raise RuntimeError("LLM indisponível")
+    return f"Resposta: {chain_input['question']}"
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    """rag_service pronto, com embedding falso, índice versionado em disco (v1) e uma chain sem LLM."""
+    root = tmp_path / "indice"
+    write_index_version(root, "v1")
+    publish_index_version(str(root), "v1")
+    monkeypatch.setattr(settings, "FAISS_INDEX_PATH", str(root))
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", True)
+
+    monkeypatch.setattr(rag_service, "embeddings_model_global", FakeEmbeddings())
+    monkeypatch.setattr(rag_service, "_embedding_model_name", EMBEDDING_MODEL)
+    monkeypatch.setattr(rag_service, "qa_chain_global", RunnableLambda(_answer))
+    monkeypatch.setattr(rag_service, "qa_prompt_global",
+                        ChatPromptTemplate.from_messages([("human", "{context}\n\n{question}")]))
+    monkeypatch.setattr(rag_service, "_answer_cache", None)
+    monkeypatch.setattr(rag_service, "_request_limiter", None)
+    monkeypatch.setattr(rag_service, "_init_status", dict(rag_service._init_status, state=rag_service.INIT_READY, error=None))
+    monkeypatch.setattr(rag_service, "_reload_status", dict(rag_service._reload_status, reloads=0, last_error=None))
+    version, index_path, _, manifest = rag_service._resolve_active_index(EMBEDDING_MODEL, "refuse")
+    monkeypatch.setattr(rag_service, "vector_store_global", rag_service._open_vector_store(version, index_path, manifest))
+    return rag_service
+
+
+def test_answer_uses_retrieved_context(rag):
+    response = asyncio.run(rag.get_answer_async("Como criar hábitos?"))
+    assert response["answer"] == "Resposta: Como criar hábitos?"
+    assert response["source_documents"]
+    assert response["usage"]["completion_tokens"] > 0
+
+
+def test_status_reports_answer_cache_counters(rag):
+    asyncio.run(rag.get_answer_async("Como negociar?", author_filter="Chris Voss"))
+    asyncio.run(rag.get_answer_async("Como negociar?", author_filter="Chris Voss"))
+    stats = rag.get_rag_status()["answer_cache"]
+    assert (stats["lookups"], stats["exact_hits"], stats["misses"], stats["entries"]) == (2, 1, 1, 1)
+
+
+def test_requests_refused_when_warm_up_failed(rag, monkeypatch):
+    # A chain existe, mas o aquecimento falhou: /health/ready responde 503 e as perguntas também são recusadas
+    monkeypatch.setitem(rag._init_status, "state", rag.INIT_FAILED)
+    monkeypatch.setitem(rag._init_status, "error", "Falha na pergunta de aquecimento: disco lento")
+    assert rag.qa_chain_global is not None
+    assert not rag.is_ready()
+    response = asyncio.run(rag.get_answer_async("Como criar hábitos?"))
+    assert "error" in response and "answer" not in response
+
+    monkeypatch.setitem(rag._init_status, "state", rag.INIT_WARMING_UP)
+    response = asyncio.run(rag.get_answer_async("Como criar hábitos?"))
+    assert response["retry_after"] == settings.RAG_RETRY_AFTER_SECONDS
+
+
+def test_batch_keeps_input_order_with_mixed_outcomes(rag):
+    rag._get_answer_cache().put("Pergunta já respondida", None, {"answer": "do cache", "source_documents": []})
+    items = [
+        {"query": "Como criar hábitos?"},
+        {"query": "Pergunta já respondida"},
+        {"query": "Como negociar?", "author_filter": "Autor Desconhecido"},
+        {"query": "Esta pergunta falha no LLM"},
+        {"query": "Como negociar?", "author_filter": "Chris Voss"},
+    ]
+    results = asyncio.run(rag.get_answers_batch(items))["results"]
+
+    assert results[0]["answer"] == "Resposta: Como criar hábitos?"
+    assert results[1]["answer"] == "do cache"
+    assert "Nenhum trecho encontrado" in results[2]["error"]
+    assert "LLM indisponível" in results[3]["error"]
+    assert results[4]["answer"] == "Resposta: Como negociar?"
+    assert {doc.author for doc in results[4]["source_documents"]} == {"Chris Voss"}
+
+
+def test_batch_unfiltered_queries_share_one_search(rag, monkeypatch):
+    store = rag.vector_store_global
+    batch_calls, single_calls = [], []
+    search_rows_batch, search_rows = store.search_rows_batch, store.search_rows
+
+    def spy_search_rows_batch(embeddings, k):
+        batch_calls.append(len(embeddings))
+        return search_rows_batch(embeddings, k)
+
+    def spy_search_rows(embedding, k, allowed_rows=None):
+        single_calls.append(allowed_rows is not None)
+        return search_rows(embedding, k, allowed_rows)
+
+    def search_observations():
+        labels = {"endpoint": "batch", "stage": "search"}
+        return rag.metrics.REGISTRY.get_sample_value("rag_stage_duration_seconds_count", labels) or 0.0
+
+    monkeypatch.setattr(store, "search_rows_batch", spy_search_rows_batch)
+    monkeypatch.setattr(store, "search_rows", spy_search_rows)
+    before = search_observations()
+
+    items = [{"query": "Como criar hábitos?"}, {"query": "O que é empatia tática?"},
+             {"query": "Como negociar?", "author_filter": "Chris Voss"}, {"query": "Quem são os superfãs?"}]
+    results = asyncio.run(rag.get_answers_batch(items))["results"]
+
+    assert all("answer" in result for result in results)
+    assert batch_calls == [3]
+    assert single_calls == [True] # só a pergunta filtrada faz a busca restrita
+    assert rag.embeddings_model_global.document_calls == 1
+    assert search_observations() == before + 1 # o lote observa a etapa de busca uma única vez
+
+
+def test_batch_llm_calls_take_limiter_slots(rag, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_MAX_CONCURRENT_REQUESTS", 2)
+    monkeypatch.setattr(settings, "RAG_BATCH_LLM_CONCURRENCY", 4)
+    running = {"now": 0, "max": 0}
+
+    async def slow_answer(chain_input):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return "ok"
+
+    monkeypatch.setattr(rag, "qa_chain_global", RunnableLambda(_answer, afunc=slow_answer))
+    items = [{"query": f"Pergunta número {i} sobre hábitos"} for i in range(6)]
+    results = asyncio.run(rag.get_answers_batch(items))["results"]
+
+    assert [result["answer"] for result in results] == ["ok"] * 6
+    assert running["max"] == 2
+
+
+async def _stream_events(stream):
+    return [event async for event in stream]
+
+
+def test_stream_sends_sources_then_tokens_then_usage(rag):
+    query = "Como criar hábitos?"
+    events = asyncio.run(_stream_events(rag.stream_answer(query)))
+
+    names = [name for name, _ in events]
+    assert names[0] == "sources" and names[-1] == "done" and set(names[1:-1]) == {"token"}
+    assert events[0][1] and all(source["author"] for source in events[0][1])
+    assert "".join(data for name, data in events if name == "token") == f"Resposta: {query}"
+    assert events[-1][1]["usage"]["completion_tokens"] > 0
+    assert rag._get_answer_cache().get_exact(query)["answer"] == f"Resposta: {query}"
+
+
+def test_stream_cache_hit_skips_llm(rag):
+    # A pergunta falharia no LLM: a resposta só pode vir do cache
+    rag._get_answer_cache().put("Esta pergunta falha no LLM", None, {"answer": "do cache", "source_documents": []})
+    events = asyncio.run(_stream_events(rag.stream_answer("Esta pergunta falha no LLM")))
+    assert events == [("sources", []), ("token", "do cache"), ("done", {})]
+
+
+class _EndlessChain:
+    """Chain falsa que entrega um trecho e fica esperando o resto; registra quando o astream é fechado."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def astream(self, chain_input):
+        try:
+            yield "primeiro"
+            await asyncio.sleep(60)
+            yield "segundo"
+        finally:
+            self.closed = True
+
+
+def test_stream_aclose_closes_upstream_and_releases_slot(rag, monkeypatch):
+    chain = _EndlessChain()
+    monkeypatch.setattr(rag, "qa_chain_global", chain)
+    query = "Como criar hábitos?"
+
+    async def scenario():
+        stream = rag.stream_answer(query)
+        assert (await anext(stream))[0] == "sources"
+        assert await anext(stream) == ("token", "primeiro")
+        assert rag._get_request_limiter().in_flight == 1
+        await stream.aclose() # cliente desconectou
+        assert chain.closed # fechado já no aclose, sem esperar o finalizador do gerador
+        assert rag._get_request_limiter().in_flight == 0
+
+    asyncio.run(scenario())
+    assert rag._get_answer_cache().get_exact(query) is None # resposta incompleta não entra no cache
+
+
+NEW_CHUNK = ("Versão dois do índice: a disciplina vence a motivação.", "James Clear", "Hábitos Atômicos")
+
+
+def test_reload_index_swaps_to_published_version(rag, tmp_path):
+    old_store = rag.vector_store_global
+    assert rag.reload_index() == {"reloaded": False, "version": "v1"}
+
+    write_index_version(tmp_path / "indice", "v2", CORPUS + [NEW_CHUNK])
+    publish_index_version(str(tmp_path / "indice"), "v2")
+    result = rag.reload_index()
+
+    assert result["reloaded"] and result["version"] == "v2" and result["previous_version"] == "v1"
+    assert rag.vector_store_global is not old_store
+    assert rag.vector_store_global.index.ntotal == len(CORPUS) + 1
+    assert rag.get_rag_status()["index"]["reloads"] == 1
+    # A versão antiga continua utilizável por quem ainda guarda a referência
+    assert len(old_store.search_rows(rag.embeddings_model_global.embed_query("hábitos"), 2)[1]) == 2
+
+
+def test_reload_index_keeps_current_version_on_incompatible_index(rag, tmp_path):
+    path = write_index_version(tmp_path / "indice", "v2")
+    write_manifest(path, build_manifest("outro-modelo", DIMENSION, True, 1000, 200, {}, len(CORPUS)))
+    publish_index_version(str(tmp_path / "indice"), "v2")
+    old_store = rag.vector_store_global
+
+    result = rag.reload_index()
+
+    assert result["status_code"] == 409
+    assert rag.vector_store_global is old_store
+    assert "outro-modelo" in rag.get_rag_status()["index"]["last_error"]
+
+
+def test_request_in_flight_keeps_old_version_and_skips_cache(rag, tmp_path, monkeypatch):
+    write_index_version(tmp_path / "indice", "v2", CORPUS + [NEW_CHUNK])
+    publish_index_version(str(tmp_path / "indice"), "v2")
+    query = "Versão dois disciplina motivação"
+
+    def answer_during_reload(chain_input):
+        # A troca acontece enquanto a pergunta espera o LLM, depois da recuperação
+        assert rag.reload_index()["reloaded"]
+        return _answer(chain_input)
+
+    monkeypatch.setattr(rag, "qa_chain_global", RunnableLambda(answer_during_reload))
+    response = asyncio.run(rag.get_answer_async(query))
+    assert response["answer"] == f"Resposta: {query}"
+    assert NEW_CHUNK[0] not in [doc.content for doc in response["source_documents"]] # recuperado da v1
+    # A resposta veio da versão antiga: não entra no cache, que agora é da v2
+    assert rag._get_answer_cache().get_exact(query) is None
+
+    monkeypatch.setattr(rag, "qa_chain_global", RunnableLambda(_answer))
+    response = asyncio.run(rag.get_answer_async(query))
+    assert NEW_CHUNK[0] in [doc.content for doc in response["source_documents"]]
+    assert rag._get_answer_cache().get_exact(query) is not None
+
+
+def _run_watcher(rag, monkeypatch, versions, reload_errors=()):
+    """
+    Roda o watcher sobre uma sequência de versões vistas em disco (a última deve ser a
+    versão carregada, "v1") e retorna as versões para as quais reload_index foi chamado.
+    """
+    remaining = list(versions)
+    errors = list(reload_errors)
+    seen = []
+    reloaded = []
+    exhausted = threading.Event()
+
+    def fake_index_version_id(root):
+        seen.append(remaining.pop(0) if len(remaining) > 1 else remaining[0])
+        if len(remaining) == 1 and seen[-1] == remaining[0]:
+            exhausted.set()
+        return seen[-1]
+
+    def fake_reload_index(force=False):
+        reloaded.append(seen[-1])
+        return {"error": "falhou", "status_code": 409} if errors and errors.pop(0) else {"reloaded": True}
+
+    monkeypatch.setattr(rag, "index_version_id", fake_index_version_id)
+    monkeypatch.setattr(rag, "reload_index", fake_reload_index)
+
+    async def scenario():
+        task = asyncio.create_task(rag._watch_index_versions(0))
+        while not exhausted.is_set():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    return reloaded
+
+
+def test_watcher_waits_for_stable_unversioned_index(rag, monkeypatch):
+    # Sem CURRENT, a versão precisa aparecer em duas verificações seguidas (arquivos podem estar sendo gravados)
+    versions = ["files-a", "files-b", "files-b", "v1"]
+    assert _run_watcher(rag, monkeypatch, versions) == ["files-b"]
+
+
+def test_watcher_skips_failed_version_until_it_changes(rag, monkeypatch):
+    versions = ["v2", "v2", "v2", "v3", "v1"]
+    assert _run_watcher(rag, monkeypatch, versions, reload_errors=[True, False]) == ["v2", "v3"]